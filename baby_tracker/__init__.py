@@ -1 +1 @@
-from .config import DEFAULT_N_LIST, SLACK_OAUTH_TOKEN, CHANNEL_ID, DB_FILE
+from .config import DEFAULT_N_LIST, LIST_MAX_MESSAGE_CHARS, SLACK_OAUTH_TOKEN, CHANNEL_ID, SLACK_API_URL, SLACK_CONNECT_TIMEOUT, SLACK_READ_TIMEOUT, SLACK_MAX_RETRIES, SLACK_ASYNC_UPLOADS, DB_FILE, DB_POOL_SIZE, DB_TIMESTAMP_STORAGE, JOB_WORKERS, JOB_QUEUE_SIZE, RENDER_WORKERS, PLOT_CACHE_DIR, PLOT_CACHE_MAX_BYTES, GROWTH_CURVES_DIR, BIRTH_DATE, BABY_SEX, PROFILE_DIR, PROFILE_ACTIONS, PROFILE_THRESHOLD_MS, PROFILE_MAX_FILES, PROFILE_SAMPLE_INTERVAL_MS, SNAPSHOT_DIR
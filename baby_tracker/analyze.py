@@ -1,8 +1,9 @@
 import datetime
 import io
+import numpy as np
 import pandas as pd
 import matplotlib
-from matplotlib import pyplot as plt
+from matplotlib.figure import Figure
 from datetime import timedelta, date
 import matplotlib.dates as mdates
 import matplotlib.patches as mpatches
@@ -10,54 +11,214 @@ from pandas.core.frame import DataFrame
 from labellines import labelLines
 
 from baby_tracker.utils import format_duration, format_timestamp
-from baby_tracker.db import to_iso
+from baby_tracker import db
+from baby_tracker import rollup
+from baby_tracker import growth
+from baby_tracker import metrics
+from baby_tracker import BIRTH_DATE
 import baby_tracker.utils as ut
 
 TIMESTAMP_COLUMNS = ["from_time", "to_time", "created_at", "updated_at", "timestamp"]
 START_OF_DAY = datetime.time.fromisoformat("06:00")
-BIRTH_DATE = datetime.date(2024, 1, 24)
+# Above this many segments only the longest segments of a timeline get a duration label.
+MAX_TIMELINE_LABELS = 200
+GROWTH_CURVE_PERCENTILES = [5, 25, 50, 75, 95]
+# Columns analysis windows are applied to, for tables without a from_time.
+WINDOW_COLUMNS = {"weight": "timestamp", "poop": "timestamp"}
+COLUMN_DTYPES = {"duration": "float64", "weight": "float64"}
 
 matplotlib.use('Agg')
 
-def total_duration_per_day(db_conn, table, offset="6Hours"):
-    df = df_from_db_table(db_conn, table)
-    agg = df.resample('D', on='from_time', offset=offset)[["duration"]].sum()
-    return agg
+def total_duration_per_day(db_conn, table, offset="6Hours", n_days=None, n_weeks=None, from_time=None, until=None):
+    from_time, until = time_window(n_days, n_weeks, from_time, until)
+    if not _is_rollup_window(offset, from_time, until):
+        return resample_duration_table(db_conn, table, "sum", offset=offset, from_time=from_time, until=until)
+    df = rollup_per_day(db_conn, table, from_time, until)
+    return df[["duration"]]
 
 def latest_daily_total_duration(db_conn, table):
-    df_agg_tot = total_duration_per_day(db_conn, table)
-    last_date = df_agg_tot.index[-1]
-    last_duration = timedelta(seconds=int(df_agg_tot.duration.iloc[-1]))
-    return last_date, last_duration
+    last_date, last_duration = rollup.latest_daily_total(db_conn, table)
+    return pd.Timestamp(last_date), last_duration
+
+def avg_duration_per_day(db_conn, table, offset="6Hours", n_days=None, n_weeks=None, from_time=None, until=None):
+    from_time, until = time_window(n_days, n_weeks, from_time, until)
+    if not _is_rollup_window(offset, from_time, until):
+        return resample_duration_table(db_conn, table, "mean", offset=offset, from_time=from_time, until=until)
+    df = rollup_per_day(db_conn, table, from_time, until)
+    df["duration"] = df.duration / df.n_durations.where(df.n_durations > 0)
+    return df[["duration"]]
+
+def count_per_day(db_conn, table, offset="6Hours", n_days=None, n_weeks=None, from_time=None, until=None):
+    from_time, until = time_window(n_days, n_weeks, from_time, until)
+    if not _is_rollup_window(offset, from_time, until):
+        return resample_duration_table(db_conn, table, "size", offset=offset, from_time=from_time, until=until)
+    df = rollup_per_day(db_conn, table, from_time, until)
+    return df.n_records.rename(None)
+
+
+def rollup_per_day(db_conn, table, from_time=None, until=None):
+    """Daily aggregates from the rollup table, indexed like the pandas resampling with every day present.
+
+    from_time and until must be at the start of a day, see _is_rollup_window.
+    """
+    from_day = rollup.rollup_day(from_time) if from_time is not None else None
+    until_day = rollup.rollup_day(until) if until is not None else None
+    rows = rollup.read_rollup(db_conn, table, from_day, until_day)
+    df = pd.DataFrame(rows, columns=["day", "duration", "n_records", "n_durations"])
+    df.index = pd.DatetimeIndex(pd.to_datetime(df.pop("day")) + rollup.DAY_OFFSET, name="from_time")
+    if not df.empty:
+        all_days = pd.date_range(df.index.min(), df.index.max(), freq="D", name="from_time")
+        df = df.reindex(all_days, fill_value=0)
+    return df
+
+
+def resample_duration_table(db_conn, table, how, offset="6Hours", from_time=None, until=None):
+    """Aggregate per day by resampling the raw records with pandas."""
+    df = df_from_db_table(db_conn, table, columns=["from_time", "duration"], from_time=from_time, until=until)
+    resampler = df.resample('D', on='from_time', offset=offset)[["duration"]]
+    return getattr(resampler, how)()
+
+
+def _is_rollup_offset(offset):
+    return pd.Timedelta(offset) == rollup.DAY_OFFSET
+
 
-def avg_duration_per_day(db_conn, table, offset="6Hours"):
-    df = df_from_db_table(db_conn, table)
-    agg = df.resample('D', on='from_time', offset=offset)[["duration"]].mean()
-    return agg
+def _is_rollup_window(offset, from_time, until):
+    """The rollup holds whole days, so it can only answer windows from the start of a day to the start of a day."""
+    return _is_rollup_offset(offset) and all(
+        timestamp is None or (timestamp - rollup.DAY_OFFSET).time() == datetime.time.min
+        for timestamp in (from_time, until)
+    )
 
-def count_per_day(db_conn, table, offset="6Hours"):
-    df = df_from_db_table(db_conn, table)
-    agg = df.resample('D', on='from_time', offset=offset)[["duration"]].size()
-    return agg
+
+def time_window(n_days=None, n_weeks=None, from_time=None, until=None):
+    """The (from_time, until) bounds of an analysis window, None for an open end.
+
+    n_days covers today and the n_days-1 days before it, n_weeks the current week
+    and the n_weeks weeks before it, both starting at START_OF_DAY. Without them
+    the explicit from_time and until are returned.
+    """
+    if n_weeks:
+        cutoff_date = date.today() - timedelta(days=date.today().weekday(), weeks=n_weeks)
+    elif n_days:
+        cutoff_date = date.today() - timedelta(days=n_days-1)
+    else:
+        return from_time, until
+    return datetime.datetime.combine(cutoff_date, START_OF_DAY), until
 
 
 def latest_n_intervals(db_conn, table, n=3):
-    df = df_from_db_table(db_conn, table, limit=n+1)
+    df = df_from_db_table(db_conn, table, limit=n+1, latest_first=True)
+    df = df.iloc[::-1]
     df["time_interval"] = df["from_time"].diff()
     return df
 
 
-def df_from_db_table(db_conn, table, cutoff_timestamp:datetime=None, limit:int=None):
-    if limit is not None:
-        limit = int(limit)
-        limit_sql = f"LIMIT {limit}"
+def df_from_db_table(db_conn, table, columns=None, from_time=None, until=None, limit:int=None, latest_first=False, snapshot_dir=None):
+    """Load records of a table, indexed by id.
+
+    :param columns: the columns to load, all columns when None.
+    :param from_time: only records starting at or after this time.
+    :param until: only records starting before this time.
+    :param latest_first: order by start time, latest first. With a window the records are ordered by start time.
+    :param snapshot_dir: load the months the columnar snapshot in this directory holds unchanged from it.
+    """
+    if snapshot_dir is not None and limit is None and not latest_first:
+        df = _df_from_snapshot_and_db(db_conn, table, columns, from_time, until, snapshot_dir)
+        if df is not None:
+            return df
+    # Duration tables are windowed on the start of the record, the others on their timestamp.
+    time_column = WINDOW_COLUMNS.get(table, "from_time")
+    select = ", ".join(["id", *columns]) if columns is not None else "*"
+    conditions, params = [], []
+    if from_time is not None:
+        # Compare the stored values directly, they sort chronologically and can use the index.
+        conditions.append(f"{time_column} >= ?")
+        params.append(db.to_db_timestamp(db_conn, from_time))
+    if until is not None:
+        conditions.append(f"{time_column} < ?")
+        params.append(db.to_db_timestamp(db_conn, until))
+    where_sql = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    if latest_first:
+        order_sql = f"ORDER BY {time_column} DESC"
+    elif conditions:
+        order_sql = f"ORDER BY {time_column}"
     else:
-        limit_sql = ""
+        order_sql = ""
+    limit_sql = f"LIMIT {int(limit)}" if limit is not None else ""
+
+    epoch_us = getattr(db_conn, "timestamp_storage", db.TEXT_STORAGE) == db.EPOCH_US_STORAGE
+    df = pd.read_sql_query(
+        f"SELECT {select} FROM {table} {where_sql} {order_sql} {limit_sql};", db_conn, params=params, index_col="id",
+        coerce_float=False
+    )
+    return _declare_dtypes(df, epoch_us)
+
+
+def _df_from_snapshot_and_db(db_conn, table, columns, from_time, until, snapshot_dir):
+    """The window from the snapshot for the months it holds unchanged and from the database for the others.
+
+    None when there is no snapshot of the table or the window holds records without a time.
+    """
+    from baby_tracker import snapshot
+    if snapshot.is_current(db_conn, snapshot_dir, table):
+        return df_from_snapshot(snapshot_dir, table, columns, from_time, until)
+    manifest = snapshot.read_manifest(snapshot_dir, table)
+    if manifest is None:
+        return None
+    # Only the months of the window are scanned, through the index of the time column.
+    fingerprints = snapshot.month_fingerprints(db_conn, table, from_time, until)
+    if snapshot.UNKNOWN_MONTH in fingerprints:
+        return None
+    if not fingerprints:
+        return df_from_db_table(db_conn, table, columns, from_time, until)
+    # Runs of unchanged months are read from the snapshot at once, the changed months one by one from the database.
+    dfs, unchanged = [], []
+    for month in sorted(fingerprints):
+        if manifest["months"].get(month) == fingerprints[month]:
+            unchanged.append(month)
+            continue
+        if unchanged:
+            dfs.append(df_from_snapshot(snapshot_dir, table, columns, from_time, until, months=unchanged))
+            unchanged = []
+        start, end = snapshot.month_bounds(month)
+        dfs.append(df_from_db_table(db_conn, table, columns, max(start, from_time or start), min(end, until or end)))
+    if unchanged:
+        dfs.append(df_from_snapshot(snapshot_dir, table, columns, from_time, until, months=unchanged))
+    return pd.concat(dfs)
+
+
+def df_from_snapshot(snapshot_dir, table, columns=None, from_time=None, until=None, months=None):
+    """Load records of a table from its snapshot, see baby_tracker.snapshot, like df_from_db_table.
+
+    Only the monthly partitions overlapping the window are read, memory-mapped.
+
+    :param months: only read these months, e.g. the ones the snapshot holds unchanged.
+    """
+    from baby_tracker import snapshot
+    df = snapshot.read_snapshot(snapshot_dir, table, columns, from_time, until, months).to_pandas().set_index("id")
+    for column in df.columns:
+        if column in TIMESTAMP_COLUMNS:
+            df[column] = df[column].astype("datetime64[ns]")
+        elif column == "duration":
+            # Seconds, as stored in the database.
+            df[column] = df[column].dt.total_seconds()
+        elif column in COLUMN_DTYPES:
+            df[column] = df[column].astype(COLUMN_DTYPES[column])
+    return df
 
-    if cutoff_timestamp is None:
-        return pd.read_sql_query(f"SELECT * FROM {table} {limit_sql};", db_conn, parse_dates=TIMESTAMP_COLUMNS, index_col="id")
-    else:
-        return pd.read_sql_query(f"SELECT * FROM {table} WHERE datetime(created_at) > datetime('{to_iso(cutoff_timestamp)}') {limit_sql};", db_conn, parse_dates=TIMESTAMP_COLUMNS, index_col="id")
+
+def _declare_dtypes(df, epoch_us):
+    """Give the columns their dtype, also when the result is empty or holds NULLs only."""
+    for column in df.columns:
+        if column in TIMESTAMP_COLUMNS:
+            if epoch_us:
+                df[column] = pd.to_datetime(df[column].astype("float64"), unit="us")
+            else:
+                df[column] = pd.to_datetime(df[column], format="ISO8601")
+        elif column in COLUMN_DTYPES:
+            df[column] = df[column].astype(COLUMN_DTYPES[column])
+    return df
 
 
 
@@ -69,93 +230,89 @@ def merge_duration_tables(db_conn, tables, n_days=3):
     return merged_df
 
 
-def get_duration_table(db_conn, table, n_days=3, n_weeks=None):
-    if n_weeks:
-        cutoff_date = date.today() - timedelta(days=date.today().weekday(), weeks=n_weeks)
-    else:
-        cutoff_date = datetime.date.today() - timedelta(days=n_days-1)
-    cutoff_timestamp = datetime.datetime.combine(cutoff_date, START_OF_DAY) 
-    return df_from_db_table(db_conn, table, cutoff_timestamp)
+def get_duration_table(db_conn, table, n_days=3, n_weeks=None, columns=("from_time", "to_time", "duration")):
+    from_time, until = time_window(n_days, n_weeks)
+    return df_from_db_table(db_conn, table, columns=list(columns), from_time=from_time, until=until)
 
 
 def duration_plot(df, title=None, scale=1/60, kind="bar", ylabel="Duration (minutes)"):
     if scale != 1:
         df.duration *= scale
-    fig, ax = plt.subplots()
+    fig = Figure()
+    ax = fig.subplots()
     df.plot(title=title, kind=kind, ax=ax)
     ax.set_ylabel(ylabel)
     ax.set_xticklabels([x.strftime("%a %d/%m") for x in df.index], rotation=90)
     ax.set_axisbelow(True)
     ax.grid(axis="y")
-    plt.tight_layout()
+    fig.tight_layout()
     return plot_to_buffer(fig)
 
 
-def timeline_plot(df: DataFrame, title=None, from_var="from_time", to_var="to_time", duration_var="duration", activity_var="activity"):
-    df.dropna(inplace=True, subset=[from_var, to_var, activity_var])
-    df.sort_values(by=duration_var, inplace=True, ascending=False)
-    colors = ('tab:blue', 'tab:orange', 'tab:green', 'tab:red')
-    unique_activities = list(df[activity_var].unique())
-    fig, ax = plt.subplots()
-    time_points = df[[from_var, to_var]].to_numpy() 
-    time_points = [(ft, tt-ft) for ft,tt in time_points]
-    facecolors = [colors[unique_activities.index(activity)] for activity in df[activity_var]] 
-    ax.broken_barh(time_points, (0, 10), facecolors=facecolors)
+def timeline_plot(df: DataFrame, title=None, from_var="from_time", to_var="to_time", duration_var="duration", activity_var="activity", max_labels=MAX_TIMELINE_LABELS):
+    df = df.dropna(subset=[from_var, to_var, activity_var]).sort_values(by=duration_var, ascending=False)
+    colors = np.array(['tab:blue', 'tab:orange', 'tab:green', 'tab:red'])
+    # Activities are numbered in order of appearance, like the colors of the legend.
+    activity_codes, unique_activities = pd.factorize(df[activity_var])
+    starts = mdates.date2num(df[from_var])
+    widths = mdates.date2num(df[to_var]) - starts
+    fig = Figure()
+    ax = fig.subplots()
+    ax.xaxis_date()
+    ax.broken_barh(np.column_stack([starts, widths]), (0, 10), facecolors=colors[activity_codes % len(colors)])
     ax.xaxis.set_major_formatter(mdates.DateFormatter("%a %d/%m %H:%M"))
     ax.xaxis.set_tick_params(rotation=90)
     ax.get_yaxis().set_visible(False)
-    for from_time, duration in time_points:
-        duration_sec = duration.astype('timedelta64[s]').item().total_seconds()
-        ax.text(from_time+duration/2, 5, format_duration(duration_sec), rotation="vertical", va="center",ha="center")
-    timestamps = numpydt_to_datetime([ft for ft, dur in  time_points])
-    min_timestamp = min(timestamps)
-    timestamps = numpydt_to_datetime([ft+dur for ft, dur in  time_points])
-    max_timestamp = max(timestamps)
-    min_timestamp = datetime.datetime.combine(min_timestamp.date(), START_OF_DAY) 
-    max_timestamp = datetime.datetime.combine(max_timestamp.date() + timedelta(days=1), START_OF_DAY)
+    # The segments are sorted by duration, so only the shortest ones lose their label.
+    durations_sec = (df[to_var] - df[from_var]).dt.total_seconds().to_numpy()
+    for center, duration_sec in zip(starts[:max_labels] + widths[:max_labels] / 2, durations_sec[:max_labels]):
+        ax.text(center, 5, format_duration(duration_sec), rotation="vertical", va="center", ha="center")
+    min_timestamp = datetime.datetime.combine(df[from_var].min().date(), START_OF_DAY)
+    max_timestamp = datetime.datetime.combine(df[to_var].max().date() + timedelta(days=1), START_OF_DAY)
     day_shifts = ut.datetime_range(start=min_timestamp, end=max_timestamp)
-    for day_shift in day_shifts: 
-        ax.vlines(day_shift, 0, 10,colors="black", linestyles='dashed')
+    ax.vlines(mdates.date2num(list(day_shifts)), 0, 10, colors="black", linestyles='dashed')
 
-    legend_handles = [ mpatches.Patch(color=colors[i], label=activity) for i, activity in enumerate(unique_activities)]
-    plt.legend(handles=legend_handles)
-    plt.tight_layout()
+    legend_handles = [ mpatches.Patch(color=colors[i % len(colors)], label=activity) for i, activity in enumerate(unique_activities)]
+    ax.legend(handles=legend_handles, loc="upper right")
+    fig.tight_layout()
     return plot_to_buffer(fig)
 
 def daily_duration_pattern_plot(df: DataFrame, title=None, from_var="from_time", to_var="to_time", duration_var="duration"):
     pass
 
 
-def weight_growth_df(db_conn, birth_date=BIRTH_DATE):
-    df = df_from_db_table(db_conn, "weight")
+def weight_growth_df(db_conn, birth_date=BIRTH_DATE, from_time=None, until=None):
+    df = df_from_db_table(db_conn, "weight", columns=["timestamp", "weight"], from_time=from_time, until=until)
     df["age"] = (df.timestamp - pd.to_datetime(birth_date)).dt.days
     return df
 
 
 def growth_curves_plot(df,  title=None, growth_variable="weight", sex="boy", baby_name="Oscar"):
-    basename = {"weight": "weianthro"}.get(growth_variable)
     x_var = "age"
     ylabel = {"weight": "weight (g)"}.get(growth_variable)
     xlabel = {"weight": "age (days)"}.get(growth_variable)
 
-
-    growth_curnves = pd.read_csv(f"./baby_tracker/growth-curves/{basename}_{sex}.csv")
-    x_max = int(max(df[x_var])*1.25)
-    growth_curnves = growth_curnves[growth_curnves[x_var] < x_max].copy()
-    fig, ax = plt.subplots()
+    reference = growth.get_reference(growth_variable, sex)
+    x_max = min(int(max(df[x_var])*1.25), int(reference.max_age))
+    ages = np.arange(x_max)
+    growth_curnves = pd.DataFrame(
+        {f"p{p}": reference.value_at_percentile(ages, p) for p in GROWTH_CURVE_PERCENTILES}, index=pd.Index(ages, name=x_var)
+    ).reset_index()
+    fig = Figure()
+    ax = fig.subplots()
     if growth_curnves.empty:
         ax = empty_plot(ax, "No growth curve data found")
     else:
         ax = growth_curnves.plot(
             x=x_var,
-            y=["p5", "p25", "p50", "p75", "p95"],
+            y=[f"p{p}" for p in GROWTH_CURVE_PERCENTILES],
             style=["--", "--", "-", "--", "--"],
             lw=1,
             color="black",
             title=f"WHO {growth_variable} curves: {sex}",
             ax = ax
         )
-        labelLines(fig.gca().get_lines(), zorder=2.5)
+        labelLines(ax.get_lines(), zorder=2.5)
         ax = df.plot(x=x_var, y=growth_variable, label=baby_name, ax=ax, style="-o")
         ax.set_xlabel(xlabel)
         ax.set_ylabel(ylabel)
@@ -165,13 +322,9 @@ def growth_curves_plot(df,  title=None, growth_variable="weight", sex="boy", bab
     fig.tight_layout()
     return plot_to_buffer(fig)
 
-def numpydt_to_datetime(np_datetime):
-    return [datetime.datetime.fromtimestamp(ts.astype('O')/1e9) for ts in np_datetime]
-
 def plot_to_buffer(fig):
     buf = io.BytesIO()
     fig.savefig(buf, format='png')
-    plt.close()
     buf.seek(0)
     return buf
 
@@ -180,4 +333,7 @@ def empty_plot(ax, text="No data found", color="red"):
     ax.set_ylim(0, 1)
     ax.axis('off')
     ax.text(0.5, 0.5, text, horizontalalignment='center', verticalalignment='center', fontsize=20, color=color)
-    return ax
\ No newline at end of file
+    return ax
+
+
+metrics.instrument_module(__name__, exclude=["time_window", "plot_to_buffer", "empty_plot"])
@@ -0,0 +1,231 @@
+"""Bulk import of CSV exports into the database.
+
+    python -m baby_tracker.bulk_import --db-file ./db.sqlite \\
+        feed=./data/feed_slack_records.csv feed=./data/feed.csv:75 weight=./data/weight.csv
+
+Each input is TABLE=PATH[:FIRST_ROW], where FIRST_ROW is the 1-based data row
+to start from. The header of a CSV names its columns: any subset of the table
+columns, so both full table dumps (id,from_time,...,updated_at) and the
+from_time,to_time,created_at records parsed from Slack can be loaded. Ids are
+not imported, rows get new ids in created_at order. Empty values and 'NULL'
+are stored as NULL. Files without a duration column get the duration between
+from_time and to_time as seconds within a day, so a to_time past midnight that
+was entered with the date of from_time still gives the right duration.
+
+Rows are streamed: the inputs of a table are expected to be sorted by
+created_at and are combined with a k-way merge, then inserted in batches in
+one transaction with the indexes of the table dropped until the load finishes.
+A load that fails leaves the table, its indexes and its rollup as they were.
+"""
+import argparse
+import csv
+import heapq
+import itertools
+import logging
+import sys
+import time
+from datetime import datetime
+
+from baby_tracker import db
+from baby_tracker import rollup
+from baby_tracker import DB_FILE, DB_TIMESTAMP_STORAGE
+
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 100_000
+NULL_VALUES = {"", "NULL"}
+TABLE_COLUMNS = {
+    "feed": ("from_time", "to_time", "duration", "created_at", "updated_at"),
+    "sleep": ("from_time", "to_time", "duration", "created_at", "updated_at"),
+    "weight": ("timestamp", "weight", "created_at", "updated_at"),
+    "poop": ("timestamp", "created_at", "updated_at"),
+}
+TIMESTAMP_COLUMNS = {"from_time", "to_time", "created_at", "updated_at", "timestamp"}
+INTEGER_COLUMNS = {"duration", "weight"}
+
+
+def parse_input_spec(spec):
+    """Split TABLE=PATH[:FIRST_ROW] into (table, path, first_row)."""
+    table, sep, path = spec.partition("=")
+    if not sep or table not in TABLE_COLUMNS:
+        raise ValueError(f"Input '{spec}' is not TABLE=PATH with TABLE one of {', '.join(TABLE_COLUMNS)}")
+    first_row = 1
+    head, sep, tail = path.rpartition(":")
+    if sep and tail.isdigit():
+        path, first_row = head, int(tail)
+    return table, path, first_row
+
+
+def _parse_timestamp(value):
+    return None if value in NULL_VALUES else datetime.fromisoformat(value)
+
+
+def _parse_integer(value):
+    return None if value in NULL_VALUES else int(float(value))
+
+
+def _parse_text(value):
+    return None if value in NULL_VALUES else value
+
+
+def _missing(value):
+    return None
+
+
+def _column_parser(column):
+    if column in TIMESTAMP_COLUMNS:
+        return _parse_timestamp
+    if column in INTEGER_COLUMNS:
+        return _parse_integer
+    return _parse_text
+
+
+def read_rows(path, table, first_row=1):
+    """Stream the rows of a CSV file as tuples of the table columns, without id."""
+    columns = TABLE_COLUMNS[table]
+    with open(path, newline="") as csv_file:
+        reader = csv.reader(csv_file)
+        header = next(reader)
+        unknown = set(header) - set(columns) - {"id"}
+        if unknown:
+            raise ValueError(f"{path}: columns {sorted(unknown)} are not in table '{table}'")
+        # (position in the CSV row, parser) of each table column.
+        fields = [(header.index(column), _column_parser(column)) if column in header else (0, _missing) for column in columns]
+        compute_duration = "duration" in columns and "duration" not in header
+        duration_pos = columns.index("duration") if compute_duration else None
+        for line_no, row in enumerate(itertools.islice(reader, first_row - 1, None), start=first_row + 1):
+            try:
+                record = [parse(row[position]) for position, parse in fields]
+            except (ValueError, IndexError) as e:
+                raise ValueError(f"{path}:{line_no}: {e}") from e
+            if duration_pos is not None and record[0] is not None and record[1] is not None:
+                record[duration_pos] = (record[1] - record[0]).seconds
+            yield tuple(record)
+
+
+def _created_at_key(columns):
+    created_at_pos = columns.index("created_at")
+    return lambda row: row[created_at_pos] or datetime.min
+
+
+def _count_out_of_order(rows, key, path, counts):
+    previous = None
+    for row in rows:
+        current = key(row)
+        if previous is not None and current < previous:
+            counts[path] = counts.get(path, 0) + 1
+        previous = current
+        yield row
+
+
+def merge_inputs(inputs, table):
+    """K-way merge of the rows of several created_at-sorted files.
+
+    Rows out of created_at order in an input are counted and logged, the merge
+    keeps them in their input order.
+    """
+    key = _created_at_key(TABLE_COLUMNS[table])
+    counts = {}
+    streams = [
+        _count_out_of_order(read_rows(path, table, first_row), key, path, counts)
+        for path, first_row in inputs
+    ]
+    yield from heapq.merge(*streams, key=key)
+    for path, n_out_of_order in counts.items():
+        logger.warning(f"{path}: {n_out_of_order} rows are out of created_at order")
+
+
+def _drop_indexes(conn, table):
+    cur = conn.cursor()
+    cur.execute("SELECT name, sql FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL", (table,))
+    indexes = cur.fetchall()
+    for name, _ in indexes:
+        cur.execute(f"DROP INDEX {name}")
+    return [sql for _, sql in indexes]
+
+
+def _timestamp_converter(conn):
+    if conn.timestamp_storage == db.EPOCH_US_STORAGE:
+        return db.to_epoch_us
+    # Same text as db.to_iso for naive datetimes, several times faster than strftime.
+    return lambda timestamp: timestamp.isoformat(" ", "microseconds")
+
+
+def load_table(conn, table, rows, batch_size=BATCH_SIZE, replace=False):
+    """Insert rows into a table in batches of batch_size rows, in one transaction.
+
+    The indexes of the table are dropped during the load and recreated after.
+    When reading or inserting a row fails, the transaction is rolled back.
+    :return: the number of rows inserted.
+    """
+    columns = TABLE_COLUMNS[table]
+    to_db_timestamp = _timestamp_converter(conn)
+    timestamp_positions = [i for i, column in enumerate(columns) if column in TIMESTAMP_COLUMNS]
+    sql = f"INSERT INTO {table}({','.join(columns)}) VALUES({','.join('?' * len(columns))})"
+    conn.commit()
+    cur = conn.cursor()
+    # The dropped indexes and a replaced table come back on a rollback, as DDL is transactional in SQLite.
+    cur.execute("BEGIN;")
+    try:
+        if replace:
+            cur.execute(f"DELETE FROM {table}")
+        index_sqls = _drop_indexes(conn, table)
+        n_rows = 0
+        rows = iter(rows)
+        while True:
+            batch = [list(row) for row in itertools.islice(rows, batch_size)]
+            if not batch:
+                break
+            for row in batch:
+                for i in timestamp_positions:
+                    if row[i] is not None:
+                        row[i] = to_db_timestamp(row[i])
+            cur.executemany(sql, batch)
+            n_rows += len(batch)
+        for index_sql in index_sqls:
+            cur.execute(index_sql)
+        db.bump_table_version(conn, table)
+        if table in rollup.DURATION_TABLES:
+            rollup.rebuild(conn, table)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return n_rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m baby_tracker.bulk_import", description="Load CSV files into the database.")
+    parser.add_argument("inputs", nargs="+", metavar="TABLE=PATH[:FIRST_ROW]")
+    parser.add_argument("--db-file", default=DB_FILE)
+    parser.add_argument("--timestamp-storage", default=DB_TIMESTAMP_STORAGE, choices=list(db.TIMESTAMP_COLUMN_TYPES))
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--replace", action="store_true", help="Delete the existing rows of the loaded tables first.")
+    cmd_args = parser.parse_args(argv)
+
+    try:
+        specs = [parse_input_spec(spec) for spec in cmd_args.inputs]
+    except ValueError as e:
+        parser.error(str(e))
+    inputs_by_table = {}
+    for table, path, first_row in specs:
+        inputs_by_table.setdefault(table, []).append((path, first_row))
+
+    conn = db.init_db(db_file=cmd_args.db_file, timestamp_storage=cmd_args.timestamp_storage)
+    total_rows, total_start = 0, time.perf_counter()
+    for table, inputs in inputs_by_table.items():
+        start = time.perf_counter()
+        n_rows = load_table(conn, table, merge_inputs(inputs, table), cmd_args.batch_size, cmd_args.replace)
+        seconds = time.perf_counter() - start
+        print(f"{table}: {n_rows} rows in {seconds:.2f}s ({n_rows / max(seconds, 1e-9):.0f} rows/s)")
+        total_rows += n_rows
+    seconds = time.perf_counter() - total_start
+    print(f"Total: {total_rows} rows in {seconds:.2f}s ({total_rows / max(seconds, 1e-9):.0f} rows/s)")
+    conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
@@ -1,6 +1,30 @@
 import os
+import tempfile
+from datetime import date
 
 DEFAULT_N_LIST = 5
+LIST_MAX_MESSAGE_CHARS = int(os.getenv("LIST_MAX_MESSAGE_CHARS", 3000))
 SLACK_OAUTH_TOKEN = os.getenv("SLACK_OAUTH_TOKEN")
 CHANNEL_ID = os.getenv("CHANNEL_ID")
+SLACK_API_URL = os.getenv("SLACK_API_URL", "https://slack.com/api")
+SLACK_CONNECT_TIMEOUT = float(os.getenv("SLACK_CONNECT_TIMEOUT", 3.05))
+SLACK_READ_TIMEOUT = float(os.getenv("SLACK_READ_TIMEOUT", 30))
+SLACK_MAX_RETRIES = int(os.getenv("SLACK_MAX_RETRIES", 3))
+SLACK_ASYNC_UPLOADS = os.getenv("SLACK_ASYNC_UPLOADS", "false").lower() in ("1", "true", "yes")
 DB_FILE = os.getenv("DB_FILE")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 4))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 2))
+JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", 20))
+DB_TIMESTAMP_STORAGE = os.getenv("DB_TIMESTAMP_STORAGE", "text")
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", 2))
+PLOT_CACHE_DIR = os.getenv("PLOT_CACHE_DIR", os.path.join(tempfile.gettempdir(), "baby-tracker-plots"))
+PLOT_CACHE_MAX_BYTES = int(os.getenv("PLOT_CACHE_MAX_BYTES", 50 * 1024 * 1024))
+GROWTH_CURVES_DIR = os.getenv("GROWTH_CURVES_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "growth-curves"))
+BIRTH_DATE = date.fromisoformat(os.getenv("BIRTH_DATE", "2024-01-24"))
+BABY_SEX = os.getenv("BABY_SEX", "boy")
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "baby-tracker-profiles"))
+PROFILE_ACTIONS = [entry.strip() for entry in os.getenv("PROFILE_ACTIONS", "").split(",") if entry.strip()]
+PROFILE_THRESHOLD_MS = float(os.getenv("PROFILE_THRESHOLD_MS", 0))
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", 50))
+PROFILE_SAMPLE_INTERVAL_MS = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", 5))
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", "snapshots")
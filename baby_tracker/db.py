@@ -1,25 +1,52 @@
 import sqlite3
 import tempfile
+import threading
+import queue
+import time
 from sqlite3 import Error
 import logging
 from datetime import datetime, timedelta
 import baby_tracker.utils as ut  
+from baby_tracker import rollup
+from baby_tracker import metrics
+from baby_tracker import DB_TIMESTAMP_STORAGE
 
 
 logger = logging.getLogger(__name__)
 
 ISO_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
 
+CACHE_SIZE_KIB = 16384
+MMAP_SIZE_BYTES = 256 * 1024 * 1024
+
+# Timestamps are stored either as ISO_FORMAT text or as integer microseconds
+# since 1970-01-01 of the naive local time.
+TEXT_STORAGE = "text"
+EPOCH_US_STORAGE = "epoch_us"
+TIMESTAMP_COLUMN_TYPES = {TEXT_STORAGE: "text", EPOCH_US_STORAGE: "integer"}
+EPOCH = datetime(1970, 1, 1)
+TIMESTAMP_TABLES = {
+    "feed": ["from_time", "to_time", "created_at", "updated_at"],
+    "sleep": ["from_time", "to_time", "created_at", "updated_at"],
+    "weight": ["timestamp", "created_at", "updated_at"],
+    "poop": ["timestamp", "created_at", "updated_at"],
+}
+
 
 class NoActiveDurationRecordError(ValueError):
     """Exception raised when an operation requires an active record but none is found."""
     pass
 
+
+class Connection(sqlite3.Connection):
+    """SQLite connection remembering how the database stores timestamps."""
+    timestamp_storage = TEXT_STORAGE
+
 def connection_factory():
     # This variable will be captured (closed over) by the create_connection function
     temp_db_file = None
 
-    def create_connection(db_file=":memory:"):
+    def create_connection(db_file=":memory:", check_same_thread=True):
         """Create a database connection to a SQLite database.
         
         If db_file is an empty string, a temporary file is used for the database,
@@ -37,7 +64,7 @@ def connection_factory():
             if temp_db_file is not None:
                 db_file = temp_db_file
 
-            conn = sqlite3.connect(db_file)
+            conn = sqlite3.connect(db_file, check_same_thread=check_same_thread, factory=Connection)
             logger.info(f"Connected to SQLite file: {db_file}")
         except sqlite3.Error as e:
             logger.error(e)
@@ -58,53 +85,277 @@ def create_table(conn, create_table_sql):
     c.execute(create_table_sql)
 
 
+# The table statements are formatted with the column type of the timestamp storage.
 SQL_CREATE_FEED_TABLE = """ CREATE TABLE IF NOT EXISTS feed (
                                     id integer PRIMARY KEY,
-                                    from_time text,
-                                    to_time text,
+                                    from_time {timestamp_type},
+                                    to_time {timestamp_type},
                                     duration int,
-                                    created_at text,
-                                    updated_at text
+                                    created_at {timestamp_type},
+                                    updated_at {timestamp_type}
                                 ); """
 
 SQL_CREATE_SLEEP_TABLE = """ CREATE TABLE IF NOT EXISTS sleep (
                                     id integer PRIMARY KEY,
-                                    from_time text,
-                                    to_time text,
+                                    from_time {timestamp_type},
+                                    to_time {timestamp_type},
                                     duration int,
-                                    created_at text,
-                                    updated_at text
+                                    created_at {timestamp_type},
+                                    updated_at {timestamp_type}
                                 ); """
 
 SQL_CREATE_WEIGHT_TABLE = """ CREATE TABLE IF NOT EXISTS weight (
                                     id integer PRIMARY KEY,
-                                    timestamp text NOT NULL,
+                                    timestamp {timestamp_type} NOT NULL,
                                     weight int NOT NULL,
-                                    created_at text,
-                                    updated_at text
+                                    created_at {timestamp_type},
+                                    updated_at {timestamp_type}
                                 ); """
 
 SQL_CREATE_POOP_TABLE = """ CREATE TABLE IF NOT EXISTS poop (
                                     id integer PRIMARY KEY,
-                                    timestamp text NOT NULL,
-                                    created_at text,
-                                    updated_at text
+                                    timestamp {timestamp_type} NOT NULL,
+                                    created_at {timestamp_type},
+                                    updated_at {timestamp_type}
                                 ); """
 
 
-def init_db(db_file: str):
-    conn = create_connection(db_file)
-    create_table(conn, SQL_CREATE_FEED_TABLE)
-    create_table(conn, SQL_CREATE_SLEEP_TABLE)
-    create_table(conn, SQL_CREATE_WEIGHT_TABLE)
-    create_table(conn, SQL_CREATE_POOP_TABLE)
+# Each entry upgrades the schema by one version, tracked in PRAGMA user_version.
+SCHEMA_MIGRATIONS = [
+    # 1: Indexes for the latest/open record lookups and time range scans.
+    [
+        "CREATE INDEX IF NOT EXISTS feed_created_at_idx ON feed(created_at);",
+        "CREATE INDEX IF NOT EXISTS sleep_created_at_idx ON sleep(created_at);",
+        "CREATE INDEX IF NOT EXISTS feed_open_created_at_idx ON feed(created_at) WHERE to_time IS NULL;",
+        "CREATE INDEX IF NOT EXISTS sleep_open_created_at_idx ON sleep(created_at) WHERE to_time IS NULL;",
+        "CREATE INDEX IF NOT EXISTS feed_from_time_idx ON feed(from_time);",
+        "CREATE INDEX IF NOT EXISTS sleep_from_time_idx ON sleep(from_time);",
+        "CREATE INDEX IF NOT EXISTS weight_timestamp_idx ON weight(timestamp);",
+        "CREATE INDEX IF NOT EXISTS poop_timestamp_idx ON poop(timestamp);",
+    ],
+    # 2: Change counter per table, bumped by every write.
+    [
+        """CREATE TABLE IF NOT EXISTS table_version (
+                table_name text PRIMARY KEY,
+                version int NOT NULL,
+                updated_at text
+            );""",
+    ],
+    # 3: Random id of the database, so caches keyed on table versions tell databases apart.
+    [
+        "CREATE TABLE IF NOT EXISTS database_info (key text PRIMARY KEY, value text NOT NULL);",
+        "INSERT OR IGNORE INTO database_info(key, value) VALUES('id', lower(hex(randomblob(16))));",
+    ],
+]
+
+
+def get_schema_version(conn):
+    cur = conn.cursor()
+    cur.execute("PRAGMA user_version;")
+    return cur.fetchone()[0]
+
+
+def migrate_schema(conn):
+    """Apply the schema migrations newer than the version stored in the database."""
+    version = get_schema_version(conn)
+    cur = conn.cursor()
+    for new_version, statements in enumerate(SCHEMA_MIGRATIONS[version:], start=version + 1):
+        for statement in statements:
+            cur.execute(statement)
+        cur.execute(f"PRAGMA user_version = {new_version};")
+        conn.commit()
+        logger.info(f"Migrated database schema to version {new_version}")
+    return get_schema_version(conn)
+
+
+def create_indexes(conn):
+    """Create the indexes of schema version 1 that are missing, e.g. dropped by an interrupted bulk import."""
+    cur = conn.cursor()
+    for statement in SCHEMA_MIGRATIONS[0]:
+        cur.execute(statement)
+    conn.commit()
+
+
+def init_db(db_file: str, check_same_thread=True, timestamp_storage=DB_TIMESTAMP_STORAGE):
+    conn = create_connection(db_file, check_same_thread=check_same_thread)
+    timestamp_type = TIMESTAMP_COLUMN_TYPES[timestamp_storage]
+    create_table(conn, SQL_CREATE_FEED_TABLE.format(timestamp_type=timestamp_type))
+    create_table(conn, SQL_CREATE_SLEEP_TABLE.format(timestamp_type=timestamp_type))
+    create_table(conn, SQL_CREATE_WEIGHT_TABLE.format(timestamp_type=timestamp_type))
+    create_table(conn, SQL_CREATE_POOP_TABLE.format(timestamp_type=timestamp_type))
+    has_rollup = rollup.rollup_exists(conn)
+    create_table(conn, rollup.SQL_CREATE_ROLLUP_TABLE)
+    if not has_rollup:
+        for table in rollup.DURATION_TABLES:
+            rollup.rebuild(conn, table)
+    migrate_schema(conn)
+    create_indexes(conn)
+    if timestamp_storage == EPOCH_US_STORAGE and get_timestamp_storage(conn) == TEXT_STORAGE:
+        migrate_timestamps_to_epoch(conn)
+    conn.timestamp_storage = get_timestamp_storage(conn)
+    return conn
+
+
+def get_timestamp_storage(conn):
+    """The timestamp storage of the tables, judged by the type of the feed.created_at column."""
+    cur = conn.cursor()
+    cur.execute("PRAGMA table_info(feed);")
+    column_types = {name: col_type for _, name, col_type, *ignore in cur.fetchall()}
+    if column_types.get("created_at", "").lower() == TIMESTAMP_COLUMN_TYPES[EPOCH_US_STORAGE]:
+        return EPOCH_US_STORAGE
+    return TEXT_STORAGE
+
+
+def migrate_timestamps_to_epoch(conn):
+    """Convert all tables from text to epoch microsecond timestamps in one transaction.
+
+    Every table is copied into a table with integer timestamp columns, which
+    then replaces the original. Indexes are recreated from their definitions.
+    Readers keep seeing the old tables until the transaction commits.
+    """
+    table_sqls = {
+        "feed": SQL_CREATE_FEED_TABLE,
+        "sleep": SQL_CREATE_SLEEP_TABLE,
+        "weight": SQL_CREATE_WEIGHT_TABLE,
+        "poop": SQL_CREATE_POOP_TABLE,
+    }
+    timestamp_type = TIMESTAMP_COLUMN_TYPES[EPOCH_US_STORAGE]
+    conn.commit()
+    cur = conn.cursor()
+    cur.execute("BEGIN;")
+    try:
+        for table, timestamp_columns in TIMESTAMP_TABLES.items():
+            cur.execute("SELECT sql FROM sqlite_master WHERE type='index' AND tbl_name = ? AND sql IS NOT NULL;", (table,))
+            index_sqls = [row[0] for row in cur.fetchall()]
+            cur.execute(f"PRAGMA table_info({table});")
+            columns = [row[1] for row in cur.fetchall()]
+            select_columns = [
+                f"CAST(strftime('%s', {col}) AS INTEGER) * 1000000 + CAST(substr({col}, 21, 6) AS INTEGER)"
+                if col in timestamp_columns else col
+                for col in columns
+            ]
+            new_table_sql = table_sqls[table].format(timestamp_type=timestamp_type)
+            cur.execute(new_table_sql.replace(f"EXISTS {table} (", f"EXISTS {table}_epoch_us ("))
+            cur.execute(f"INSERT INTO {table}_epoch_us({','.join(columns)}) SELECT {','.join(select_columns)} FROM {table};")
+            cur.execute(f"DROP TABLE {table};")
+            cur.execute(f"ALTER TABLE {table}_epoch_us RENAME TO {table};")
+            for index_sql in index_sqls:
+                cur.execute(index_sql)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    logger.info("Migrated timestamps to epoch microseconds")
+
+
+def configure_connection(conn):
+    """Tune a connection for a long lived, concurrently used database file."""
+    cur = conn.cursor()
+    cur.execute("PRAGMA journal_mode=WAL;")
+    cur.execute("PRAGMA synchronous=NORMAL;")
+    cur.execute(f"PRAGMA cache_size=-{CACHE_SIZE_KIB};")
+    cur.execute(f"PRAGMA mmap_size={MMAP_SIZE_BYTES};")
     return conn
 
 
+class PoolTimeoutError(RuntimeError):
+    """Exception raised when no pooled connection becomes available in time."""
+    pass
+
+
+class ConnectionPool:
+    """A fixed size pool of pre-opened and pre-configured SQLite connections.
+
+    The schema is set up once when the pool is created. Connections may be
+    used from any thread, but only by one thread at a time.
+    """
+
+    def __init__(self, db_file: str, size=4, timeout=30.0):
+        if db_file == ":memory:":
+            # Every in-memory connection is a separate database, so share a single one.
+            size = 1
+        self.db_file = db_file
+        self.size = size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue(maxsize=size)
+        self._lock = threading.Lock()
+        self._n_acquired = 0
+        self._n_waits = 0
+        self._n_timeouts = 0
+        self._wait_seconds = 0.0
+        self._max_wait_seconds = 0.0
+        self._in_use = 0
+
+        # The schema is set up through the first connection only.
+        schema_conn = init_db(db_file, check_same_thread=False)
+        self._idle.put(configure_connection(schema_conn))
+        for _ in range(size - 1):
+            conn = create_connection(db_file, check_same_thread=False)
+            conn.timestamp_storage = schema_conn.timestamp_storage
+            self._idle.put(configure_connection(conn))
+        logger.info(f"Opened connection pool of size {size} to: {db_file}")
+
+    def acquire(self, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        start = time.perf_counter()
+        waited = False
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            waited = True
+            try:
+                conn = self._idle.get(timeout=timeout)
+            except queue.Empty:
+                with self._lock:
+                    self._n_timeouts += 1
+                raise PoolTimeoutError(f"No database connection available within {timeout} seconds")
+        wait_seconds = time.perf_counter() - start
+        with self._lock:
+            self._n_acquired += 1
+            self._in_use += 1
+            if waited:
+                self._n_waits += 1
+                self._wait_seconds += wait_seconds
+                self._max_wait_seconds = max(self._max_wait_seconds, wait_seconds)
+        return conn
+
+    def release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        with self._lock:
+            self._in_use -= 1
+        self._idle.put(conn)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": self.size,
+                "in_use": self._in_use,
+                "idle": self._idle.qsize(),
+                "acquired": self._n_acquired,
+                "waits": self._n_waits,
+                "timeouts": self._n_timeouts,
+                "wait_seconds_total": self._wait_seconds,
+                "wait_seconds_max": self._max_wait_seconds,
+            }
+
+    def close(self):
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+
+
 def create_sleep(conn, sleep):
     return _create_duration_record(conn, sleep, "sleep")
 
 
+def create_sleeps(conn, sleeps):
+    return _create_duration_records(conn, sleeps, "sleep")
+
+
 def _create_duration_record(conn, duration_record, table):
     """
     Create a new generic duration type record into the specified table
@@ -116,29 +367,65 @@ def _create_duration_record(conn, duration_record, table):
     sql = f"""INSERT INTO {table}(from_time,to_time,duration,created_at,updated_at)
               VALUES(?,?,?,?,?) """
     cur = conn.cursor()
-    current_timestamp = to_iso(datetime.now())
+    current_timestamp = to_db_timestamp(conn, datetime.now())
     from_time, to_time, duration = duration_record
+    rollup_from_time = from_time
     if from_time is not None:
-        from_time = to_iso(from_time)
+        from_time = to_db_timestamp(conn, from_time)
     if to_time is not None:
-        to_time = to_iso(to_time)
+        to_time = to_db_timestamp(conn, to_time)
     if duration is not None:
         duration = ut.timedelta_to_seconds(duration)
     row = (from_time, to_time, duration, current_timestamp, None)
     cur.execute(sql, row)
+    rollup.apply_record(conn, table, rollup_from_time, duration)
+    bump_table_version(conn, table)
     conn.commit()
     return cur.lastrowid
 
+
+def _create_duration_records(conn, duration_records, table):
+    """
+    Create several duration records in one transaction
+    :param duration_records: (from_time, to_time, duration) tuples
+    :return: ids of the records, in the order of duration_records
+    """
+    if not duration_records:
+        return []
+    sql = f"""INSERT INTO {table}(from_time,to_time,duration,created_at,updated_at)
+              VALUES(?,?,?,?,?) """
+    cur = conn.cursor()
+    current_timestamp = to_db_timestamp(conn, datetime.now())
+    rows = []
+    rollup_records = []
+    for from_time, to_time, duration in duration_records:
+        if duration is not None:
+            duration = ut.timedelta_to_seconds(duration)
+        rollup_records.append((from_time, duration))
+        rows.append((
+            to_db_timestamp(conn, from_time) if from_time is not None else None,
+            to_db_timestamp(conn, to_time) if to_time is not None else None,
+            duration, current_timestamp, None,
+        ))
+    cur.executemany(sql, rows)
+    # The rows get consecutive ids, since the transaction holds the write lock.
+    last_id = cur.execute("SELECT last_insert_rowid()").fetchone()[0]
+    rollup.apply_records(conn, table, rollup_records)
+    bump_table_version(conn, table)
+    conn.commit()
+    return list(range(last_id - len(rows) + 1, last_id + 1))
+
 def create_weight(conn, weight_rec):
     sql = f"""INSERT INTO weight(timestamp,weight,created_at,updated_at)
               VALUES(?,?,?,?) """
     cur = conn.cursor()
-    current_timestamp = to_iso(datetime.now())
+    current_timestamp = to_db_timestamp(conn, datetime.now())
     timestamp, weight = weight_rec
     if timestamp is not None:
-        timestamp = to_iso(timestamp)
+        timestamp = to_db_timestamp(conn, timestamp)
     row = (timestamp, weight, current_timestamp, None)
     cur.execute(sql, row)
+    bump_table_version(conn, "weight")
     conn.commit()
     return cur.lastrowid
 
@@ -147,28 +434,44 @@ def create_poop(conn, poop_rec):
     sql = f"""INSERT INTO poop(timestamp,created_at,updated_at)
               VALUES(?,?,?) """
     cur = conn.cursor()
-    current_timestamp = to_iso(datetime.now())
+    current_timestamp = to_db_timestamp(conn, datetime.now())
     timestamp = poop_rec
     if timestamp is not None:
-        timestamp = to_iso(timestamp)
+        timestamp = to_db_timestamp(conn, timestamp)
     row = (timestamp, current_timestamp, None)
     cur.execute(sql, row)
+    bump_table_version(conn, "poop")
     conn.commit()
     return cur.lastrowid
 
 
-def get_latest_feed_records(conn, n=5):
-    return _get_latest_duration_records(conn, "feed", n)
+def get_latest_feed_records(conn, n=5, before=None):
+    return _get_latest_duration_records(conn, "feed", n, before)
+
+
+def get_latest_sleep_records(conn, n=5, before=None):
+    return _get_latest_duration_records(conn, "sleep", n, before)
 
 
-def get_latest_sleep_records(conn, n=5):
-    return _get_latest_duration_records(conn, "sleep", n)
+def _page_condition(conn, key_column, before):
+    """WHERE clause and parameters of the records before a page key.
+
+    :param before: (timestamp, id) of the last record of the previous page, or (timestamp, None) for all records before the timestamp.
+    """
+    if before is None:
+        return "", []
+    timestamp, record_id = before
+    if record_id is None:
+        return f"WHERE {key_column} < ?", [to_db_timestamp(conn, timestamp)]
+    # A row value comparison, which is a range search of the index on key_column.
+    return f"WHERE ({key_column}, id) < (?, ?)", [to_db_timestamp(conn, timestamp), record_id]
 
 
-def _get_latest_duration_records(conn, table, n):
+def _get_latest_duration_records(conn, table, n, before=None):
     cur = conn.cursor()
-    sql = f"SELECT * FROM {table} ORDER BY created_at desc LIMIT {n}"
-    cur.execute(sql)
+    where, params = _page_condition(conn, "created_at", before)
+    sql = f"SELECT * FROM {table} {where} ORDER BY created_at desc, id desc LIMIT {n}"
+    cur.execute(sql, params)
     rows = cur.fetchall()
     transformed_rows = []
     for row in rows:
@@ -176,11 +479,12 @@ def _get_latest_duration_records(conn, table, n):
         transformed_rows.append(transformed_row)
     return transformed_rows
 
-def get_latest_weight_records(conn, n=None):
+def get_latest_weight_records(conn, n=None, before=None):
     cur = conn.cursor()
     limit = f"LIMIT {n}" if n is not None else ""
-    sql = f"SELECT * FROM weight ORDER BY timestamp desc " + limit
-    cur.execute(sql)
+    where, params = _page_condition(conn, "timestamp", before)
+    sql = f"SELECT * FROM weight {where} ORDER BY timestamp desc, id desc " + limit
+    cur.execute(sql, params)
     rows = cur.fetchall()
     transformed_rows = []
     for row in rows:
@@ -189,11 +493,12 @@ def get_latest_weight_records(conn, n=None):
     return transformed_rows
 
 
-def get_latest_poop_records(conn, n=None):
+def get_latest_poop_records(conn, n=None, before=None):
     cur = conn.cursor()
     limit = f"LIMIT {n}" if n is not None else ""
-    sql = f"SELECT * FROM poop ORDER BY timestamp desc " + limit
-    cur.execute(sql)
+    where, params = _page_condition(conn, "timestamp", before)
+    sql = f"SELECT * FROM poop {where} ORDER BY timestamp desc, id desc " + limit
+    cur.execute(sql, params)
     rows = cur.fetchall()
     transformed_rows = []
     for row in rows:
@@ -251,28 +556,28 @@ def _get_latest_duration_record_with_null_to_time(conn, table):
 
 def transform_duration_row(row):
     id, from_time, to_time, duration, created_at, updated_at = row
-    from_time = to_datetime(from_time)
-    to_time = to_datetime(to_time)
+    from_time = from_db_timestamp(from_time)
+    to_time = from_db_timestamp(to_time)
     duration = seconds_to_timedelta(duration)
-    created_at = to_datetime(created_at)
-    updated_at = to_datetime(updated_at)
+    created_at = from_db_timestamp(created_at)
+    updated_at = from_db_timestamp(updated_at)
     transformed_row = id, from_time, to_time, duration, created_at, updated_at
     return transformed_row
 
 
 def transform_weight_row(row):
     id, timestamp, weight, created_at, updated_at = row
-    timestamp = to_datetime(timestamp)
-    created_at = to_datetime(created_at)
-    updated_at = to_datetime(updated_at)
+    timestamp = from_db_timestamp(timestamp)
+    created_at = from_db_timestamp(created_at)
+    updated_at = from_db_timestamp(updated_at)
     transformed_row = id, timestamp, weight, created_at, updated_at
     return transformed_row
 
 def transform_poop_row(row):
     id, timestamp, created_at, updated_at = row
-    timestamp = to_datetime(timestamp)
-    created_at = to_datetime(created_at)
-    updated_at = to_datetime(updated_at)
+    timestamp = from_db_timestamp(timestamp)
+    created_at = from_db_timestamp(created_at)
+    updated_at = from_db_timestamp(updated_at)
     transformed_row = id, timestamp, created_at, updated_at
     return transformed_row
 
@@ -287,23 +592,35 @@ def delete_sleep(conn, sleep_id):
 
 def _delete_duration_record(conn, record_id, table):
     """
-    Create a new generic duration type record into the specified table
+    Delete a generic duration type record from the specified table
     :param conn:
-    :param duration_record:
+    :param record_id:
     :param table:
     :return: id
     """
     sql = f"""DELETE from {table} where id = {record_id}"""
     cur = conn.cursor()
+    _remove_from_rollup(conn, table, record_id)
     cur.execute(sql)
+    bump_table_version(conn, table)
     conn.commit()
     return record_id
 
 
+def _remove_from_rollup(conn, table, record_id):
+    cur = conn.cursor()
+    cur.execute(f"SELECT from_time, duration FROM {table} WHERE id = ?", (record_id,))
+    row = cur.fetchone()
+    if row is not None:
+        from_time, duration = row
+        rollup.apply_record(conn, table, from_db_timestamp(from_time), duration, sign=-1)
+
+
 def delete_weight_record(conn, record_id):
     sql = f"""DELETE from weight where id = {record_id}"""
     cur = conn.cursor()
     cur.execute(sql)
+    bump_table_version(conn, "weight")
     conn.commit()
     return record_id
 
@@ -312,6 +629,7 @@ def delete_poop_record(conn, record_id):
     sql = f"""DELETE from poop where id = {record_id}"""
     cur = conn.cursor()
     cur.execute(sql)
+    bump_table_version(conn, "poop")
     conn.commit()
     return record_id
 
@@ -332,23 +650,83 @@ def _update_duration_record(conn, table, id, duration_record):
                     updated_at = ?
                 WHERE id = ?"""
     cur = conn.cursor()
-    current_timestamp = to_iso(datetime.now())
+    current_timestamp = to_db_timestamp(conn, datetime.now())
     from_time, to_time, duration = duration_record
+    rollup_from_time = from_time
     if from_time is not None:
-        from_time = to_iso(from_time)
+        from_time = to_db_timestamp(conn, from_time)
     if to_time is not None:
-        to_time = to_iso(to_time)
+        to_time = to_db_timestamp(conn, to_time)
     if duration is not None:
         duration = ut.timedelta_to_seconds(duration)
     row = (from_time, to_time, duration, current_timestamp, id)
+    _remove_from_rollup(conn, table, id)
     cur.execute(sql, row)
+    rollup.apply_record(conn, table, rollup_from_time, duration)
+    bump_table_version(conn, table)
     conn.commit()
     return id
 
+def bump_table_version(conn, table):
+    """Count a change of a table. Does not commit, the caller owns the transaction."""
+    sql = """INSERT INTO table_version(table_name, version, updated_at) VALUES(?, 1, ?)
+             ON CONFLICT(table_name) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at"""
+    cur = conn.cursor()
+    cur.execute(sql, (table, to_iso(datetime.now())))
+
+
+def get_table_versions(conn, tables):
+    """The change counters of the tables as a dict, 0 for tables never written to."""
+    cur = conn.cursor()
+    placeholders = ",".join("?" for _ in tables)
+    cur.execute(f"SELECT table_name, version FROM table_version WHERE table_name IN ({placeholders})", tuple(tables))
+    versions = dict(cur.fetchall())
+    return {table: versions.get(table, 0) for table in tables}
+
+
+def get_database_id(conn):
+    """The random id the database got when it was created."""
+    cur = conn.cursor()
+    cur.execute("SELECT value FROM database_info WHERE key = 'id'")
+    return cur.fetchone()[0]
+
+
+def get_table_modified(conn, table):
+    """The change counter of a table and the time of the last change, (0, None) for tables never written to."""
+    cur = conn.cursor()
+    cur.execute("SELECT version, updated_at FROM table_version WHERE table_name = ?", (table,))
+    row = cur.fetchone()
+    if row is None:
+        return 0, None
+    version, updated_at = row
+    return version, to_datetime(updated_at)
+
+
 def to_iso(timestamp: datetime):
     return timestamp.strftime(ISO_FORMAT)
 
 
+def to_epoch_us(timestamp: datetime):
+    return (timestamp - EPOCH) // timedelta(microseconds=1)
+
+
+def from_epoch_us(epoch_us: int):
+    return EPOCH + timedelta(microseconds=epoch_us)
+
+
+def to_db_timestamp(conn, timestamp: datetime):
+    if getattr(conn, "timestamp_storage", TEXT_STORAGE) == EPOCH_US_STORAGE:
+        return to_epoch_us(timestamp)
+    return to_iso(timestamp)
+
+
+def from_db_timestamp(timestamp):
+    """Read a timestamp in either storage format."""
+    if isinstance(timestamp, int):
+        return from_epoch_us(timestamp)
+    return to_datetime(timestamp)
+
+
 def to_datetime(timestamp: str):
     if timestamp is None:
         return None     
@@ -371,8 +749,16 @@ def list_sleep_records(conn, limit=5):
 
 
 def _list_duration_records(conn, table, limit):
-    sql = f"""SELECT from_time,to_time,duration,created_at,updated_at from {table} LIMIT {limit}"""
+    """The latest records, as stored."""
+    sql = f"""SELECT from_time,to_time,duration,created_at,updated_at from {table} ORDER BY created_at desc, id desc LIMIT {limit}"""
     cur = conn.cursor()
     cur.execute(sql)
     records = cur.fetchall()
     return records
+
+
+# The conversions run once per row or value.
+metrics.instrument_module(__name__, exclude=[
+    "connection_factory", "transform_duration_row", "transform_weight_row", "transform_poop_row", "to_iso",
+    "to_epoch_us", "from_epoch_us", "to_db_timestamp", "from_db_timestamp", "to_datetime", "seconds_to_timedelta",
+])
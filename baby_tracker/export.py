@@ -0,0 +1,133 @@
+"""Export of the tables as CSV or NDJSON.
+
+    python -m baby_tracker.export --db-file ./db.sqlite sleep > sleep.csv
+    python -m baby_tracker.export --format ndjson --since 2024-03-01 --until 2024-04-01 feed
+
+Rows are read from a cursor in chunks of CHUNK_SIZE and written out chunk by
+chunk, so memory use does not grow with the table. Timestamps are written in
+the text format of the database whatever the storage, and durations in
+seconds, so a CSV export can be loaded again with baby_tracker.bulk_import.
+The same streams are served at GET /babytracker/export/<table>.
+"""
+import argparse
+import csv
+import io
+import json
+import sys
+
+from baby_tracker import db
+from baby_tracker import timeparse
+from baby_tracker.bulk_import import TABLE_COLUMNS, TIMESTAMP_COLUMNS
+
+from baby_tracker import DB_FILE
+
+
+CHUNK_SIZE = 1000
+COLUMNS = {table: ("id", *columns) for table, columns in TABLE_COLUMNS.items()}
+# Column of the since and until filters, which have an index.
+TIME_COLUMNS = {"feed": "from_time", "sleep": "from_time", "weight": "timestamp", "poop": "timestamp"}
+CONTENT_TYPES = {"csv": "text/csv; charset=utf-8", "ndjson": "application/x-ndjson"}
+
+
+def export_rows(conn, table, since=None, until=None, chunk_size=CHUNK_SIZE):
+    """Lists of up to chunk_size rows of a table, ordered by time, with timestamps as text.
+
+    :param since: datetime, only rows at or after it.
+    :param until: datetime, only rows before it.
+    """
+    columns = COLUMNS[table]
+    time_column = TIME_COLUMNS[table]
+    conditions, params = [], []
+    if since is not None:
+        conditions.append(f"{time_column} >= ?")
+        params.append(db.to_db_timestamp(conn, since))
+    if until is not None:
+        conditions.append(f"{time_column} < ?")
+        params.append(db.to_db_timestamp(conn, until))
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    timestamp_positions = [i for i, column in enumerate(columns) if column in TIMESTAMP_COLUMNS]
+    cur = conn.cursor()
+    try:
+        cur.execute(f"SELECT {','.join(columns)} FROM {table} {where} ORDER BY {time_column}, id", params)
+        while True:
+            rows = cur.fetchmany(chunk_size)
+            if not rows:
+                break
+            chunk = []
+            for row in rows:
+                row = list(row)
+                for i in timestamp_positions:
+                    # Text timestamps are already in the export format.
+                    if isinstance(row[i], int):
+                        row[i] = db.to_iso(db.from_epoch_us(row[i]))
+                chunk.append(row)
+            yield chunk
+    finally:
+        cur.close()
+
+
+def csv_chunks(table, chunks):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(COLUMNS[table])
+    for chunk in chunks:
+        writer.writerows(chunk)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def ndjson_chunks(table, chunks):
+    columns = COLUMNS[table]
+    for chunk in chunks:
+        yield "".join(json.dumps(dict(zip(columns, row))) + "\n" for row in chunk)
+
+
+FORMATS = {"csv": csv_chunks, "ndjson": ndjson_chunks}
+
+
+def stream(conn, table, format="csv", since=None, until=None, chunk_size=CHUNK_SIZE):
+    """The export of a table as text chunks in the given format."""
+    return FORMATS[format](table, export_rows(conn, table, since, until, chunk_size))
+
+
+def parse_time_filter(text):
+    """A since or until argument as a datetime, None when left out."""
+    if not text:
+        return None
+    timestamp = timeparse.parse(text)
+    if timestamp is None:
+        raise ValueError(f"Not a valid timestamp: '{text}'")
+    return timestamp
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m baby_tracker.export", description="Export a table as CSV or NDJSON.")
+    parser.add_argument("table", choices=list(COLUMNS))
+    parser.add_argument("--db-file", default=DB_FILE)
+    parser.add_argument("--format", default="csv", choices=list(FORMATS))
+    parser.add_argument("--since", help="Only rows at or after this time, e.g. 2024-03-01.")
+    parser.add_argument("--until", help="Only rows before this time.")
+    parser.add_argument("--output", help="File to write to instead of stdout.")
+    cmd_args = parser.parse_args(argv)
+
+    try:
+        since, until = parse_time_filter(cmd_args.since), parse_time_filter(cmd_args.until)
+    except ValueError as e:
+        parser.error(str(e))
+    conn = db.init_db(db_file=cmd_args.db_file)
+    out = open(cmd_args.output, "w", newline="") if cmd_args.output else sys.stdout
+    try:
+        for chunk in stream(conn, cmd_args.table, cmd_args.format, since, until):
+            out.write(chunk)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,11 +1,14 @@
-import dateparser as dp
+from datetime import date
 
 from baby_tracker import db
+from baby_tracker import timeparse
 from baby_tracker import slack
-from baby_tracker import analyze as an
-from baby_tracker.feed.repository import create_feed_record
-from baby_tracker.utils import format_timestamp, is_timestamp
-from baby_tracker.router._duration import make_duration_status_text, format_merged_duration_row, format_timestamp, _validate_duration, analyze_timeline
+from baby_tracker import plot_cache
+from baby_tracker.feed.repository import create_feed_record, create_feeds
+from baby_tracker.utils import format_timestamp
+from baby_tracker.router._duration import make_duration_status_text, format_merged_duration_row, format_timestamp, _validate_duration, analyze_timeline, analyze_days, create_duration_records, batch_result, format_batch_message
+from baby_tracker.router.registry import Router, register, record_id
+from baby_tracker.router.listing import list_page, list_response, created_at_key
 
 from baby_tracker import DEFAULT_N_LIST, SLACK_OAUTH_TOKEN, CHANNEL_ID
 
@@ -15,36 +18,33 @@ FEED_HELP = """
 *Examples*:
 `/f`  _This help text_
 `/f 12:30 16:45` _Register breastfeeding between two time points_
-`/f ls 5` _List 5 latest breastfeeding entries_
+`/f 01:10-01:40 04:15-04:35` _Register several breastfeedings at once_
+`/f ls 5` _List 5 latest breastfeeding and sleep entries_
+`/f ls 20 before 2024-03-01` _List 20 entries created before a date, with a link to the next page_
 `/f d 71` _Delete breastfeeding record with id=71_
-`/f analyze` Returns plots and stats of breastfeeding bahaviour.
+`/f analyze` _The plots and stats of breastfeeding bahaviour_
+`/f analyze tot 14` _Total breastfeeding time per day over the last 14 days_
 """
 
+FEED_ANALYZE_HELP = """
+*Analyses*:
+`/f analyze tot|avg|cnt [days]` _Total, average and number of breastfeedings per day, over the last days when given_
+`/f analyze tl` _Timeline of breastfeeding and sleep_
+"""
+
+
+router = register(Router("feed", FEED_HELP))
+analyze_router = Router("feed analyze", FEED_ANALYZE_HELP, word_index=1)
+router.mount("analyze", analyze_router)
+
 
 def handle_feed_request(args, db_conn):
-    if (args is None) or args[0] == "help":
-        resp = slack.response(FEED_HELP, response_type="ephemeral")
-    elif args[0] in {"s", "start"}:
-        resp = handle_feed_start(args, db_conn)
-    elif args[0] in {"e", "end"}:
-        resp = handle_feed_end(args, db_conn)
-    elif args[0] in {"d", "del", "delete"}:
-        resp = handle_delete_feed(args, db_conn)
-    elif args[0] in {"ls", "list"}:
-        resp = handle_list_feeds(args, db_conn)
-    elif args[0] == "analyze":
-        resp = handle_feed_analyze(args, db_conn)
-    elif args[0] == "status":
-        resp = handle_feed_status(args, db_conn)
-    elif is_timestamp(args[0]):
-        resp = handle_feed_create(args, db_conn)
-    else:
-        raise ValueError(f"Not valid args: {args}")
-    return resp
+    return router.handle(args, db_conn)
 
 
-def handle_delete_feed(args, db_conn):
-    feed_id = args[1]
+@router.command("delete", "d", "del", parse_args=record_id)
+def handle_delete_feed(args, db_conn, record_id):
+    feed_id = record_id
     db.delete_feed(db_conn, feed_id)
     mrk_down_message = (
         f"Breastfeeding record with Id: *{feed_id}* deleted :wastebasket:"
@@ -53,28 +53,43 @@ def handle_delete_feed(args, db_conn):
     return resp
 
 
-def handle_list_feeds(args, db_conn):
-    n = int(args[1]) if len(args) == 2 else DEFAULT_N_LIST
-    feed_rows = db.get_latest_feed_records(db_conn, n//2)
-    sleep_rows = db.get_latest_sleep_records(db_conn, n//2)
+@router.command("list", "ls", parse_args=list_page)
+def handle_list_feeds(args, db_conn, n=DEFAULT_N_LIST, before=None):
+    # Both tables are paged on the same key, so the next page of the merged list starts at the same key in both.
+    feed_rows = db.get_latest_feed_records(db_conn, n + 1, before=before)
+    sleep_rows = db.get_latest_sleep_records(db_conn, n + 1, before=before)
     feed_rows = [(*row, "feed") for row in  feed_rows]
     sleep_rows = [(*row, "sleep") for row in  sleep_rows]
-    rows = sorted(feed_rows+sleep_rows, key=lambda row: row[1])
-    rows = [format_merged_duration_row(row) for row in rows]
+    records = sorted(feed_rows+sleep_rows, key=created_at_key, reverse=True)[:n + 1]
     colnames = ["from", "to", "duration", "activity"]
-    table_str = slack.table(rows, colnames)
-    msg_text = f"*{n} latest breastfeeding and sleep records:*\n{table_str}"
-    return slack.response(msg_text, response_type="ephemeral")
+    return list_response(
+        "latest breastfeeding and sleep records", records, n, format_merged_duration_row, colnames, created_at_key,
+        sort_key=lambda row: row[1],
+    )
 
 
-def handle_feed_create(args, db_conn):
-    feed_id, _ = create_feed_record(args, db_conn)
+@router.create("from_time")
+def handle_feed_create(args, db_conn, from_time=None):
+    feed_id, _ = create_feed_record(args, db_conn, from_time=from_time)
     mrk_down_message = f":breast-feeding: Breastfeeding record created with Id: *{feed_id}*.\n"
     mrk_down_message += make_duration_status_text(db_conn, "feed", latest_id=feed_id)
     resp = slack.response(mrk_down_message)
     return resp
 
 
+@router.pattern(timeparse.RANGE_PATTERN)
+def handle_feed_ranges(args, db_conn):
+    result = create_feed_batch(args, db_conn)
+    return slack.response(format_batch_message(":breast-feeding: Breastfeeding", result))
+
+
+@router.batch
+def create_feed_batch(records, db_conn):
+    ids, errors = create_duration_records(records, create_feeds, db_conn)
+    return batch_result(db_conn, "feed", ids, errors)
+
+
+@router.command("start", "s")
 def handle_feed_start(args, db_conn):
     feed_id, _ = create_feed_record(args[1:], db_conn)
     id, from_time, *ignore = db.get_feed_record_by_id(db_conn, feed_id)
@@ -82,9 +97,10 @@ def handle_feed_start(args, db_conn):
     resp = slack.response(mrk_down_message)
     return resp
 
+@router.command("end", "e")
 def handle_feed_end(args, db_conn):
     feed_id, from_time, to_time, *ignore = db.get_latest_feed_record_with_null_to_time(db_conn)
-    to_time = dp.parse(args[1])
+    to_time = timeparse.parse(args[1])
     duration = to_time - from_time
     updated_feed_record = (from_time, to_time, duration)
     db.update_feed(db_conn, feed_id, updated_feed_record)
@@ -93,57 +109,66 @@ def handle_feed_end(args, db_conn):
     resp = slack.response(mrk_down_message)
     return resp
 
-def handle_feed_analyze(args, db_conn):
-    if args[1] in {"tot", "total"}:
-        return analyze_feed_total(db_conn)
-    elif args[1] in {"avg", "average"}:
-        return analyze_feed_avg(db_conn)
-    elif args[1] in {"cnt", "count"}:
-        return analyze_feed_count(db_conn)
-    elif args[1] in {"tl", "timeline"}:
-        return analyze_timeline(db_conn)
-    else:
-        raise ValueError("Not valid args: {args}")
-
-
-def analyze_feed_total(db_conn):
-    df_agg_tot = an.total_duration_per_day(db_conn, "feed")
-    plot_buffer = an.duration_plot(
-        df_agg_tot, 
+analyze_router.command("timeline", "tl")(analyze_timeline)
+
+
+@analyze_router.command("total", "tot", parse_args=analyze_days)
+def analyze_feed_total(args, db_conn, n_days=None):
+    from baby_tracker import analyze as an
+    plot_png = plot_cache.render_cached(
+        db_conn,
+        ["feed"],
+        an.total_duration_per_day,
+        ("feed", "6Hours", n_days),
+        an.duration_plot,
+        cache_params=date.today() if n_days else None,
         title="Total breastfeeding time each day from 06:00 to 06:00",
         scale=1/3600,
         ylabel="Duration (hours)"
     )
-    slack.post_file("total_breatfeeding_time.png", plot_buffer, oauth_token=SLACK_OAUTH_TOKEN, channel_id=CHANNEL_ID)
+    slack.post_file("total_breatfeeding_time.png", plot_png, oauth_token=SLACK_OAUTH_TOKEN, channel_id=CHANNEL_ID)
     mrk_down_message = make_duration_status_text(db_conn, "feed")
     return slack.response(mrk_down_message, response_type="in_channel")
 
-def analyze_feed_avg(db_conn):
-    df_agg_tot = an.avg_duration_per_day(db_conn, "feed")
-    plot_buffer = an.duration_plot(
-        df_agg_tot, 
+@analyze_router.command("average", "avg", parse_args=analyze_days)
+def analyze_feed_avg(args, db_conn, n_days=None):
+    from baby_tracker import analyze as an
+    plot_png = plot_cache.render_cached(
+        db_conn,
+        ["feed"],
+        an.avg_duration_per_day,
+        ("feed", "6Hours", n_days),
+        an.duration_plot,
+        cache_params=date.today() if n_days else None,
         title="Average time of breastfeeding sessions between 06:00 to 06:00",
         scale=1/60,
         ylabel="Duration (minutes)"
     )
-    slack.post_file("total_breatfeeding_time.png", plot_buffer, oauth_token=SLACK_OAUTH_TOKEN, channel_id=CHANNEL_ID)
+    slack.post_file("total_breatfeeding_time.png", plot_png, oauth_token=SLACK_OAUTH_TOKEN, channel_id=CHANNEL_ID)
     mrk_down_message = make_duration_status_text(db_conn, "feed")
     return slack.response(mrk_down_message, response_type="in_channel")
 
 
-def analyze_feed_count(db_conn):
-    df_agg_tot = an.count_per_day(db_conn, "feed")
-    plot_buffer = an.duration_plot(
-        df_agg_tot, 
+@analyze_router.command("count", "cnt", parse_args=analyze_days)
+def analyze_feed_count(args, db_conn, n_days=None):
+    from baby_tracker import analyze as an
+    plot_png = plot_cache.render_cached(
+        db_conn,
+        ["feed"],
+        an.count_per_day,
+        ("feed", "6Hours", n_days),
+        an.duration_plot,
+        cache_params=date.today() if n_days else None,
         title="Number of breastfeeding sessions between 06:00 to 06:00",
         scale=1,
         ylabel="Count"
     )
-    slack.post_file("count_breastfeed.png", plot_buffer, oauth_token=SLACK_OAUTH_TOKEN, channel_id=CHANNEL_ID)
+    slack.post_file("count_breastfeed.png", plot_png, oauth_token=SLACK_OAUTH_TOKEN, channel_id=CHANNEL_ID)
     mrk_down_message = make_duration_status_text(db_conn, "feed")
     return slack.response(mrk_down_message, response_type="in_channel")
 
 
+@router.command("status")
 def handle_feed_status(args, db_conn):
     mrk_down_message = make_duration_status_text(db_conn, "feed")
     return slack.response(mrk_down_message, response_type="in_channel")
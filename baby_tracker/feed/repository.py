@@ -1,4 +1,4 @@
-from baby_tracker.db import _create_duration_record
+from baby_tracker.db import _create_duration_record, _create_duration_records
 from baby_tracker.router._duration import create_duration_record
 
 
@@ -6,5 +6,9 @@ def create_feed(conn, feed):
     return _create_duration_record(conn, feed, "feed")
 
 
-def create_feed_record(args, db_conn):
-    return create_duration_record(args, create_feed, db_conn)
\ No newline at end of file
+def create_feeds(conn, feeds):
+    return _create_duration_records(conn, feeds, "feed")
+
+
+def create_feed_record(args, db_conn, from_time=None):
+    return create_duration_record(args, create_feed, db_conn, from_time=from_time)
\ No newline at end of file
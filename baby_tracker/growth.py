@@ -0,0 +1,97 @@
+"""WHO growth references for z-scores and percentiles at any age.
+
+The WHO publishes each growth standard as LMS parameters per day of age: the
+Box-Cox power L, the median M and the coefficient of variation S. A
+measurement y at age t has the z-score
+
+    z = ((y / M(t)) ** L(t) - 1) / (L(t) * S(t))
+
+and the measurement at a z-score is M(t) * (1 + L(t) * S(t) * z) ** (1 / L(t)).
+Parameters between two tabulated days are interpolated linearly. Beyond
++-3 SD the WHO restricts the z-score to the distance between the 2 and 3 SD
+curves, see restricted_z_scores.
+
+The tables are read from GROWTH_CURVES_DIR once per process, on first use.
+"""
+import os
+from functools import lru_cache
+from statistics import NormalDist
+
+import numpy as np
+
+from baby_tracker import GROWTH_CURVES_DIR
+
+
+SEXES = {"boy": 1, "girl": 2}
+# Measurement: (LMS table in GROWTH_CURVES_DIR, factor from the table unit to the unit used in the app).
+LMS_TABLES = {
+    "weight": ("weianthro.txt", 1000),
+}
+
+
+class GrowthReference:
+    """The LMS parameters of one measurement and sex, indexed by age in days."""
+
+    def __init__(self, age, l, m, s, scale=1):
+        self.age = np.asarray(age, dtype=np.float64)
+        self.l = np.asarray(l, dtype=np.float64)
+        self.m = np.asarray(m, dtype=np.float64) * scale
+        self.s = np.asarray(s, dtype=np.float64)
+
+    @property
+    def max_age(self):
+        return self.age[-1]
+
+    def lms(self, age):
+        """The (L, M, S) arrays at the given ages.
+
+        Raises ValueError for ages outside of the reference.
+        """
+        age = np.asarray(age, dtype=np.float64)
+        if np.any((age < self.age[0]) | (age > self.age[-1])):
+            raise ValueError(f"Ages must be between {self.age[0]:.0f} and {self.age[-1]:.0f} days.")
+        return tuple(np.interp(age, self.age, param) for param in (self.l, self.m, self.s))
+
+    def value_at_z(self, age, z):
+        l, m, s = self.lms(age)
+        return m * (1 + l * s * np.asarray(z, dtype=np.float64)) ** (1 / l)
+
+    def value_at_percentile(self, age, percentile):
+        """The measurement at a percentile between 0 and 100."""
+        return self.value_at_z(age, NormalDist().inv_cdf(percentile / 100))
+
+    def z_scores(self, age, value):
+        l, m, s = self.lms(age)
+        return ((np.asarray(value, dtype=np.float64) / m) ** l - 1) / (l * s)
+
+    def restricted_z_scores(self, age, value):
+        """Z-scores as computed by the WHO, linear in the measurement beyond +-3 SD."""
+        value = np.asarray(value, dtype=np.float64)
+        z = self.z_scores(age, value)
+        sd2, sd3 = self.value_at_z(age, 2), self.value_at_z(age, 3)
+        sd2_neg, sd3_neg = self.value_at_z(age, -2), self.value_at_z(age, -3)
+        z = np.where(z > 3, 3 + (value - sd3) / (sd3 - sd2), z)
+        z = np.where(z < -3, -3 + (value - sd3_neg) / (sd2_neg - sd3_neg), z)
+        return z
+
+    def percentiles(self, age, value):
+        """The percentiles, between 0 and 100, of measurements at the given ages."""
+        return z_to_percentile(self.restricted_z_scores(age, value))
+
+
+def z_to_percentile(z):
+    cdf = np.vectorize(NormalDist().cdf, otypes=[np.float64])
+    return 100 * cdf(z)
+
+
+def load_reference(path, sex, scale=1):
+    """Read the rows of one sex from a WHO LMS table with the columns sex, age, l, m, s."""
+    table = np.loadtxt(path, skiprows=1)
+    table = table[table[:, 0] == SEXES[sex]]
+    return GrowthReference(table[:, 1], table[:, 2], table[:, 3], table[:, 4], scale=scale)
+
+
+@lru_cache(maxsize=None)
+def get_reference(measurement="weight", sex="boy"):
+    filename, scale = LMS_TABLES[measurement]
+    return load_reference(os.path.join(GROWTH_CURVES_DIR, filename), sex, scale=scale)
@@ -0,0 +1,80 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(RuntimeError):
+    """Exception raised when a job is submitted to a full queue."""
+    pass
+
+
+class JobQueue:
+    """Runs jobs in a bounded worker pool, skipping jobs with the same key as a queued or running one."""
+
+    def __init__(self, max_workers=2, max_pending=20):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._lock = threading.Lock()
+        self._active = {}
+        self._n_running = 0
+        self._n_submitted = 0
+        self._n_duplicates = 0
+        self._n_rejected = 0
+        self._n_failed = 0
+
+    def submit(self, key, func, *args, **kwargs):
+        """Queue func(*args, **kwargs) unless a job with the same key is active.
+
+        :return: (submitted, ahead) where ahead is the number of jobs waiting
+            for a worker before this one, not counting the running jobs.
+        """
+        with self._lock:
+            n_waiting = len(self._active) - self._n_running
+            if key in self._active:
+                self._n_duplicates += 1
+                return False, n_waiting
+            if len(self._active) >= self.max_pending:
+                self._n_rejected += 1
+                raise QueueFullError(f"{len(self._active)} jobs are already queued")
+            self._n_submitted += 1
+            future = self._executor.submit(self._run, key, func, *args, **kwargs)
+            self._active[key] = future
+            return True, n_waiting
+
+    def _run(self, key, func, *args, **kwargs):
+        with self._lock:
+            self._n_running += 1
+        try:
+            return func(*args, **kwargs)
+        except Exception:
+            with self._lock:
+                self._n_failed += 1
+            logger.exception(f"Job {key} failed")
+        finally:
+            with self._lock:
+                self._n_running -= 1
+                self._active.pop(key, None)
+
+    def depth(self):
+        with self._lock:
+            return len(self._active)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "max_pending": self.max_pending,
+                "depth": len(self._active),
+                "running": self._n_running,
+                "submitted": self._n_submitted,
+                "duplicates": self._n_duplicates,
+                "rejected": self._n_rejected,
+                "failed": self._n_failed,
+            }
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
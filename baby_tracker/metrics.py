@@ -0,0 +1,159 @@
+"""Request and function timings in the Prometheus text format.
+
+Timings are aggregated in process into histograms with fixed buckets: an
+observation is a bisect and a few additions under a lock, the text is only
+built when /metrics is scraped. Modules time their public functions with
+
+    metrics.instrument_module(__name__)
+
+at the end of the module, which replaces the functions in the module namespace
+by timed wrappers, so calls through the module (db.create_sleep(...)) are
+timed. Functions imported by name before the module finished loading are not.
+"""
+import bisect
+import functools
+import inspect
+import sys
+import threading
+import time
+
+
+# Upper bounds in seconds, from a fast SQLite query to a slow plot upload.
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(labelnames, labels, extra=()):
+    pairs = [*zip(labelnames, labels), *extra]
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, labels=()):
+        return self._values.get(labels, 0)
+
+    def collect(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        for labels, value in values:
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+
+
+class Histogram:
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labels: [count per bucket (last one is +Inf), sum]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][i] += 1
+            series[1] += value
+
+    def count(self, labels=()):
+        series = self._series.get(labels)
+        return sum(series[0]) if series else 0
+
+    def collect(self):
+        with self._lock:
+            series = sorted((labels, (list(counts), total)) for labels, (counts, total) in self._series.items())
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        for labels, (counts, total) in series:
+            cumulative = 0
+            for bound, count in zip([*map(repr, self.buckets), "+Inf"], counts):
+                cumulative += count
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, labels, [('le', bound)])} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(total)}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        return "\n".join(line for metric in self._metrics for line in metric.collect()) + "\n"
+
+
+REGISTRY = Registry()
+REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "baby_tracker_request_seconds", "Time to handle a slash command.", ("action", "command")
+))
+REQUEST_ERRORS = REGISTRY.register(Counter(
+    "baby_tracker_request_errors_total", "Slash commands that failed with an error.", ("action", "command")
+))
+FUNCTION_SECONDS = REGISTRY.register(Histogram(
+    "baby_tracker_function_seconds", "Time spent in instrumented functions, including nested ones.", ("module", "function")
+))
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def render():
+    return REGISTRY.render()
+
+
+def timed(func, histogram=FUNCTION_SECONDS, labels=None):
+    """Wrap func so every call is observed in histogram, under (module, function) by default."""
+    if labels is None:
+        labels = (func.__module__.rsplit(".", 1)[-1], func.__name__)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            histogram.observe(labels, time.perf_counter() - start)
+
+    wrapper._timed = True
+    return wrapper
+
+
+def instrument_module(module_name, names=None, exclude=()):
+    """Time the functions in names, by default the public functions defined in the module.
+
+    :param exclude: functions to leave alone, like small helpers called once per row.
+    """
+    module = sys.modules[module_name]
+    if names is None:
+        names = [
+            name for name, func in inspect.getmembers(module, inspect.isfunction)
+            if func.__module__ == module_name and not name.startswith("_") and name not in ("main", *exclude)
+        ]
+    for name in names:
+        func = getattr(module, name)
+        if not getattr(func, "_timed", False):
+            setattr(module, name, timed(func))
@@ -0,0 +1,127 @@
+"""Disk cache of rendered plots.
+
+A plot is stored under a hash of its kind, its parameters, the id of the
+database and the change counters of the tables it is made from
+(db.get_table_versions), so any write to those tables makes a new key, and
+databases sharing a cache directory never share plots, even when their
+counters are equal. The least recently used plots are evicted
+when the cache grows beyond its size limit.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+from baby_tracker import db
+from baby_tracker import render
+from baby_tracker import PLOT_CACHE_DIR, PLOT_CACHE_MAX_BYTES
+
+
+class PlotCache:
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._n_hits = 0
+        self._n_misses = 0
+        self._n_evictions = 0
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(kind, params, versions, database_id=None):
+        payload = json.dumps([kind, params, versions, database_id], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.png")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as png_file:
+                png = png_file.read()
+            # The modification time orders the entries for eviction.
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self._n_misses += 1
+            return None
+        with self._lock:
+            self._n_hits += 1
+        return png
+
+    def put(self, key, png: bytes):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as tmp_file:
+            tmp_file.write(png)
+        os.replace(tmp_path, self._path(key))
+        self.evict()
+
+    def _entries(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".png"):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def evict(self):
+        entries = sorted(self._entries())
+        total_bytes = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total_bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total_bytes -= size
+            with self._lock:
+                self._n_evictions += 1
+
+    def stats(self):
+        entries = self._entries()
+        with self._lock:
+            return {
+                "hits": self._n_hits,
+                "misses": self._n_misses,
+                "evictions": self._n_evictions,
+                "entries": len(entries),
+                "bytes": sum(size for _, size, _ in entries),
+                "max_bytes": self.max_bytes,
+            }
+
+
+_plot_cache = None
+_plot_cache_lock = threading.Lock()
+
+
+def get_plot_cache():
+    global _plot_cache
+    with _plot_cache_lock:
+        if _plot_cache is None:
+            _plot_cache = PlotCache(PLOT_CACHE_DIR, PLOT_CACHE_MAX_BYTES)
+        return _plot_cache
+
+
+def render_cached(db_conn, tables, load_df, load_args, plot_func, cache_params=None, **plot_kwargs) -> bytes:
+    """Render plot_func(load_df(db_conn, *load_args), **plot_kwargs), reusing a cached PNG.
+
+    :param tables: the tables the plot is made from.
+    :param cache_params: extra values the plot depends on, e.g. the current date.
+    """
+    cache = get_plot_cache()
+    versions = db.get_table_versions(db_conn, tables)
+    params = {"load": load_df.__name__, "load_args": load_args, "plot": plot_kwargs, "extra": cache_params}
+    key = cache.key(plot_func.__name__, params, versions, db.get_database_id(db_conn))
+    png = cache.get(key)
+    if png is None:
+        df = load_df(db_conn, *load_args)
+        png = render.render(plot_func, df, **plot_kwargs)
+        cache.put(key, png)
+    return png
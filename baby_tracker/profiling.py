@@ -0,0 +1,309 @@
+"""Opt-in profiles of slash commands.
+
+Two triggers, both off by default:
+
+- PROFILE_ACTIONS, e.g. "sleep analyze tl,weight": matching commands always
+  run under cProfile and are saved in the pstats format. Only one cProfile runs
+  at a time, commands matching while another is profiled run unprofiled.
+- PROFILE_THRESHOLD_MS: every other command has its stack sampled every
+  PROFILE_SAMPLE_INTERVAL_MS by a shared sampler thread, and commands that
+  take longer than the threshold are saved as collapsed stacks, the input of
+  flamegraph.pl and speedscope.
+
+Profiles go to PROFILE_DIR with a JSON file holding the action, arguments and
+latency next to each. Only the newest PROFILE_MAX_FILES profiles are kept.
+
+    python -m baby_tracker.profiling list
+    python -m baby_tracker.profiling show <profile file> [--limit 20]
+"""
+import argparse
+import cProfile
+import json
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+
+from baby_tracker import PROFILE_DIR, PROFILE_ACTIONS, PROFILE_THRESHOLD_MS, PROFILE_MAX_FILES, PROFILE_SAMPLE_INTERVAL_MS
+
+
+logger = logging.getLogger(__name__)
+
+PSTATS_SUFFIX = ".pstats"
+COLLAPSED_SUFFIX = ".collapsed"
+META_SUFFIX = ".json"
+
+
+# From Python 3.12 only one cProfile can be enabled in a process.
+_cprofile_lock = threading.Lock()
+
+
+def _frame_name(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """Samples the stacks of registered threads from one background thread."""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self._samples = {}
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def start(self, thread_id):
+        with self._condition:
+            self._samples[thread_id] = Counter()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+                self._thread.start()
+            self._condition.notify()
+
+    def stop(self, thread_id):
+        """Stop sampling a thread and return a Counter of its collapsed stacks."""
+        with self._condition:
+            return self._samples.pop(thread_id)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._samples:
+                    self._condition.wait()
+                thread_ids = list(self._samples)
+            frames = sys._current_frames()
+            stacks = {}
+            for thread_id in thread_ids:
+                frame = frames.get(thread_id)
+                names = []
+                while frame is not None:
+                    names.append(_frame_name(frame.f_code))
+                    frame = frame.f_back
+                stacks[thread_id] = ";".join(reversed(names))
+            with self._condition:
+                for thread_id, stack in stacks.items():
+                    if thread_id in self._samples and stack:
+                        self._samples[thread_id][stack] += 1
+            time.sleep(self.interval)
+
+
+class Profiler:
+    def __init__(self, directory, actions=(), threshold_ms=None, max_files=50, sample_interval_ms=5):
+        """:param actions: "action", "action command" or "action command subcommand" entries to always profile with cProfile."""
+        self.directory = directory
+        self.actions = {tuple(entry.split()) for entry in actions}
+        self.threshold_ms = threshold_ms or None
+        self.max_files = max_files
+        self._sampler = StackSampler(sample_interval_ms / 1000)
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return bool(self.actions) or self.threshold_ms is not None
+
+    def is_profiled_action(self, action, command, args=()):
+        if (action,) in self.actions or (action, command) in self.actions:
+            return True
+        subcommand_entries = [entry for entry in self.actions if len(entry) > 2 and entry[0] == action]
+        if not subcommand_entries:
+            return False
+        path = _command_path(action, args)
+        for entry in subcommand_entries:
+            # The entry is resolved like the arguments, so aliases like `tl` match too.
+            entry_path = _command_path(action, entry[1:])
+            if entry_path and path[:len(entry_path)] == entry_path:
+                return True
+        return False
+
+    def profile(self, action, command, args):
+        """Context manager profiling one command, or doing nothing when it is not profiled."""
+        if self.is_profiled_action(action, command, args):
+            return self._cprofile(action, command, args)
+        if self.threshold_ms is not None:
+            return self._sample(action, command, args)
+        return nullcontext()
+
+    @contextmanager
+    def _cprofile(self, action, command, args):
+        profile = _start_cprofile()
+        if profile is None:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            profile.disable()
+            _cprofile_lock.release()
+            elapsed_ms = 1000 * (time.perf_counter() - start)
+            self._save(action, command, args, elapsed_ms, PSTATS_SUFFIX, profile.dump_stats)
+
+    @contextmanager
+    def _sample(self, action, command, args):
+        thread_id = threading.get_ident()
+        start = time.perf_counter()
+        self._sampler.start(thread_id)
+        try:
+            yield
+        finally:
+            samples = self._sampler.stop(thread_id)
+            elapsed_ms = 1000 * (time.perf_counter() - start)
+            if elapsed_ms >= self.threshold_ms:
+                self._save(action, command, args, elapsed_ms, COLLAPSED_SUFFIX, lambda path: _write_collapsed(path, samples))
+
+    def _save(self, action, command, args, elapsed_ms, suffix, write):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            created_at = datetime.now()
+            name = f"{created_at:%Y%m%dT%H%M%S%f}_{action}_{command}_{elapsed_ms:.0f}ms"
+            path = os.path.join(self.directory, name + suffix)
+            write(path)
+            meta = {
+                "action": action, "command": command, "args": list(args or []), "elapsed_ms": elapsed_ms,
+                "created_at": created_at.isoformat(), "profile": os.path.basename(path),
+            }
+            with open(os.path.join(self.directory, name + META_SUFFIX), "w") as meta_file:
+                json.dump(meta, meta_file)
+            self.rotate()
+        except OSError:
+            logger.exception(f"Could not save the profile of {action} {command}")
+
+    def rotate(self):
+        """Remove the oldest profiles beyond max_files."""
+        with self._lock:
+            profiles = list_profiles(self.directory)
+            for meta in profiles[:max(len(profiles) - self.max_files, 0)]:
+                for file_name in (meta["profile"], meta["meta"]):
+                    try:
+                        os.remove(os.path.join(self.directory, file_name))
+                    except FileNotFoundError:
+                        pass
+
+
+def _start_cprofile():
+    """An enabled cProfile.Profile, None when another one is running or it cannot be enabled."""
+    if not _cprofile_lock.acquire(blocking=False):
+        return None
+    profile = cProfile.Profile()
+    try:
+        profile.enable()
+    except Exception:
+        _cprofile_lock.release()
+        logger.exception("Could not start cProfile")
+        return None
+    return profile
+
+
+def _command_path(action, args):
+    """The canonical command names of args, empty when they do not resolve."""
+    from baby_tracker.router import registry
+    try:
+        return registry.get_router(action).command_path(list(args or []))
+    except Exception:
+        return ()
+
+
+def _write_collapsed(path, samples):
+    with open(path, "w") as collapsed_file:
+        for stack, count in samples.most_common():
+            collapsed_file.write(f"{stack} {count}\n")
+
+
+def list_profiles(directory):
+    """Metadata of the saved profiles, oldest first."""
+    try:
+        file_names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    profiles = []
+    for file_name in sorted(file_names):
+        if not file_name.endswith(META_SUFFIX):
+            continue
+        try:
+            with open(os.path.join(directory, file_name)) as meta_file:
+                meta = json.load(meta_file)
+        except (OSError, ValueError):
+            continue
+        meta["meta"] = file_name
+        profiles.append(meta)
+    return profiles
+
+
+def read_collapsed(path):
+    samples = Counter()
+    with open(path) as collapsed_file:
+        for line in collapsed_file:
+            stack, _, count = line.rstrip("\n").rpartition(" ")
+            samples[stack] += int(count)
+    return samples
+
+
+def summarize_collapsed(samples, limit=20):
+    """Lines with the frames taking most samples, on top of the stack and anywhere in it."""
+    total = sum(samples.values())
+    own, inclusive = Counter(), Counter()
+    for stack, count in samples.items():
+        frames = stack.split(";")
+        own[frames[-1]] += count
+        for frame in set(frames):
+            inclusive[frame] += count
+    lines = [f"{total} samples", "", "Own samples:"]
+    lines += [f"{count:8d} {100 * count / total:5.1f}%  {frame}" for frame, count in own.most_common(limit)]
+    lines += ["", "Inclusive samples:"]
+    lines += [f"{count:8d} {100 * count / total:5.1f}%  {frame}" for frame, count in inclusive.most_common(limit)]
+    return "\n".join(lines)
+
+
+_profiler = None
+_profiler_lock = threading.Lock()
+
+
+def get_profiler():
+    global _profiler
+    with _profiler_lock:
+        if _profiler is None:
+            _profiler = Profiler(
+                PROFILE_DIR, actions=PROFILE_ACTIONS, threshold_ms=PROFILE_THRESHOLD_MS,
+                max_files=PROFILE_MAX_FILES, sample_interval_ms=PROFILE_SAMPLE_INTERVAL_MS,
+            )
+        return _profiler
+
+
+def profile_request(action, command, args):
+    profiler = get_profiler()
+    if not profiler.enabled:
+        return nullcontext()
+    return profiler.profile(action, command, args)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m baby_tracker.profiling", description="List and summarise saved profiles.")
+    parser.add_argument("--dir", default=PROFILE_DIR)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("list", help="List the saved profiles, newest last.")
+    show_parser = subparsers.add_parser("show", help="Summarise a profile.")
+    show_parser.add_argument("profile", help="File name of the profile, as listed.")
+    show_parser.add_argument("--limit", type=int, default=20)
+    show_parser.add_argument("--sort", default="cumulative", help="pstats sort key of cProfile profiles.")
+    cmd_args = parser.parse_args(argv)
+
+    if cmd_args.command == "list":
+        for meta in list_profiles(cmd_args.dir):
+            args = " ".join(meta["args"])
+            print(f"{meta['created_at'][:19]}  {meta['elapsed_ms']:9.1f} ms  /{meta['action']} {args:<24}  {meta['profile']}")
+        return 0
+
+    path = os.path.join(cmd_args.dir, cmd_args.profile)
+    if path.endswith(PSTATS_SUFFIX):
+        pstats.Stats(path).sort_stats(cmd_args.sort).print_stats(cmd_args.limit)
+    else:
+        print(summarize_collapsed(read_collapsed(path), cmd_args.limit))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
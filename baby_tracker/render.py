@@ -0,0 +1,80 @@
+"""Render plots in a pool of worker processes.
+
+Plot functions from analyze.py run in separate processes, so several plots
+can render in parallel without holding the GIL of the web server. Workers are
+started once, import matplotlib and pandas up front and send back PNG bytes.
+"""
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from baby_tracker import metrics
+from baby_tracker import RENDER_WORKERS
+
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _init_worker():
+    import matplotlib
+    matplotlib.use("Agg")
+    import pandas
+    import baby_tracker.analyze
+
+
+def _render(plot_func, args, kwargs):
+    return plot_func(*args, **kwargs).getvalue()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # Spawned workers do not inherit the threads and locks of the web server.
+            _executor = ProcessPoolExecutor(
+                max_workers=RENDER_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+            )
+            logger.info(f"Started {RENDER_WORKERS} render workers")
+        return _executor
+
+
+def render(plot_func, *args, **kwargs) -> bytes:
+    """Run a plot function returning a PNG buffer and return the PNG bytes.
+
+    Plots render inline when RENDER_WORKERS is 0 or the worker pool broke.
+    """
+    if RENDER_WORKERS <= 0:
+        return _render(plot_func, args, kwargs)
+    try:
+        return get_executor().submit(_render, plot_func, args, kwargs).result()
+    except BrokenProcessPool:
+        logger.exception("Render workers died, rendering inline")
+        shutdown(wait=False)
+        return _render(plot_func, args, kwargs)
+
+
+def warm_up():
+    """Start all workers ahead of the first plot."""
+    if RENDER_WORKERS > 0:
+        executor = get_executor()
+        futures = [executor.submit(_init_worker) for _ in range(RENDER_WORKERS)]
+        for future in futures:
+            future.result()
+
+
+def shutdown(wait=True):
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=wait)
+            _executor = None
+
+
+metrics.instrument_module(__name__, ["render"])
@@ -0,0 +1,219 @@
+"""Daily rollup of the duration tables (feed, sleep).
+
+Each row holds the aggregates of one table for one day, where a day runs from
+06:00 to 06:00 like the pandas resampling in analyze.py. The rollup is kept up
+to date by the write functions in db.py inside the same transaction as the
+record change, so status texts and daily plots read O(days) rows instead of
+resampling every record.
+
+Run `python -m baby_tracker.rollup rebuild` to recompute the rollup from the
+raw tables and `python -m baby_tracker.rollup check` to compare it with the
+pandas resampling of the raw tables.
+"""
+import argparse
+import logging
+import math
+import sys
+from datetime import date, datetime, timedelta
+
+from baby_tracker import metrics
+
+
+logger = logging.getLogger(__name__)
+
+DAY_OFFSET = timedelta(hours=6)
+DURATION_TABLES = ("feed", "sleep")
+ROLLUP_TABLE = "daily_duration_rollup"
+
+SQL_CREATE_ROLLUP_TABLE = f""" CREATE TABLE IF NOT EXISTS {ROLLUP_TABLE} (
+                                    table_name text NOT NULL,
+                                    day text NOT NULL,
+                                    duration real NOT NULL DEFAULT 0,
+                                    n_records int NOT NULL DEFAULT 0,
+                                    n_durations int NOT NULL DEFAULT 0,
+                                    PRIMARY KEY (table_name, day)
+                                ); """
+
+
+APPLY_SQL = f"""INSERT INTO {ROLLUP_TABLE}(table_name, day, duration, n_records, n_durations)
+               VALUES(?,?,?,?,?)
+               ON CONFLICT(table_name, day) DO UPDATE SET
+                 duration = duration + excluded.duration,
+                 n_records = n_records + excluded.n_records,
+                 n_durations = n_durations + excluded.n_durations"""
+
+
+def rollup_day(from_time: datetime) -> str:
+    return (from_time - DAY_OFFSET).date().isoformat()
+
+
+def rollup_exists(conn):
+    cur = conn.cursor()
+    cur.execute("SELECT name FROM sqlite_master WHERE type='table' AND name = ?;", (ROLLUP_TABLE,))
+    return cur.fetchone() is not None
+
+
+def apply_record(conn, table, from_time, duration, sign=1):
+    """Add (sign=1) or remove (sign=-1) a record from the rollup.
+
+    Does not commit, the caller owns the transaction.
+    :param from_time: datetime or None. Records without a start time are not part of any day.
+    :param duration: duration in seconds or None for open records.
+    """
+    if from_time is None:
+        return
+    day = rollup_day(from_time)
+    has_duration = duration is not None
+    cur = conn.cursor()
+    cur.execute(APPLY_SQL, (table, day, sign * (duration if has_duration else 0), sign, sign * int(has_duration)))
+    if sign < 0:
+        cur.execute(
+            f"DELETE FROM {ROLLUP_TABLE} WHERE table_name = ? AND day = ? AND n_records <= 0",
+            (table, day)
+        )
+
+
+def apply_records(conn, table, records):
+    """Add several records to the rollup. Does not commit.
+
+    :param records: (from_time, duration in seconds or None) tuples.
+    """
+    rows = [
+        (table, rollup_day(from_time), duration if duration is not None else 0, 1, int(duration is not None))
+        for from_time, duration in records if from_time is not None
+    ]
+    conn.cursor().executemany(APPLY_SQL, rows)
+
+
+def rebuild(conn, table):
+    """Recompute the rollup of a table from its raw records."""
+    offset = f"-{int(DAY_OFFSET.total_seconds())} seconds"
+    cur = conn.cursor()
+    cur.execute(f"DELETE FROM {ROLLUP_TABLE} WHERE table_name = ?", (table,))
+    # from_time is either ISO text or integer epoch microseconds, see db.py.
+    cur.execute(
+        f"""INSERT INTO {ROLLUP_TABLE}(table_name, day, duration, n_records, n_durations)
+            SELECT ?,
+                CASE typeof(from_time)
+                    WHEN 'integer' THEN date(from_time / 1000000, 'unixepoch', '{offset}')
+                    ELSE date(from_time, '{offset}')
+                END,
+                total(duration), count(*), count(duration)
+            FROM {table}
+            WHERE from_time IS NOT NULL
+            GROUP BY 2""",
+        (table,)
+    )
+    conn.commit()
+    logger.info(f"Rebuilt {ROLLUP_TABLE} for table '{table}'")
+
+
+def read_rollup(conn, table, from_day=None, until_day=None):
+    """Rows of (day, duration, n_records, n_durations) ordered by day.
+
+    :param from_day: first day to include, as returned by rollup_day, or None.
+    :param until_day: first day to leave out, or None.
+    """
+    conditions, params = ["table_name = ?"], [table]
+    if from_day is not None:
+        conditions.append("day >= ?")
+        params.append(from_day)
+    if until_day is not None:
+        conditions.append("day < ?")
+        params.append(until_day)
+    cur = conn.cursor()
+    cur.execute(
+        f"""SELECT day, duration, n_records, n_durations FROM {ROLLUP_TABLE}
+            WHERE {' AND '.join(conditions)} ORDER BY day""",
+        params
+    )
+    return [(date.fromisoformat(day), *aggregates) for day, *aggregates in cur.fetchall()]
+
+
+def latest_day(conn, table):
+    """The latest day with records as (day, duration) or None."""
+    cur = conn.cursor()
+    cur.execute(
+        f"""SELECT day, duration FROM {ROLLUP_TABLE}
+            WHERE table_name = ? ORDER BY day DESC LIMIT 1""",
+        (table,)
+    )
+    row = cur.fetchone()
+    if row is None:
+        return None
+    day, duration = row
+    return date.fromisoformat(day), duration
+
+
+def latest_daily_total(conn, table):
+    """The start of the latest day with records and its total duration as (datetime, timedelta).
+
+    Raises ValueError when the table has no records with a start time.
+    """
+    latest = latest_day(conn, table)
+    if latest is None:
+        raise ValueError(f"No {table} records with a start time found.")
+    day, duration = latest
+    return datetime.combine(day, datetime.min.time()) + DAY_OFFSET, timedelta(seconds=int(duration))
+
+
+def check_consistency(conn, table, tolerance=1e-6):
+    """Compare the rollup with the pandas resampling of the raw records.
+
+    :return: list of mismatch descriptions, empty when consistent.
+    """
+    from baby_tracker import analyze as an
+
+    mismatches = []
+    checks = [
+        ("total", an.total_duration_per_day, "sum"),
+        ("average", an.avg_duration_per_day, "mean"),
+        ("count", an.count_per_day, "size"),
+    ]
+    for name, from_rollup, how in checks:
+        expected = an.resample_duration_table(conn, table, how)
+        actual = from_rollup(conn, table)
+        if how != "size":
+            expected, actual = expected.duration, actual.duration
+        if list(expected.index) != list(actual.index):
+            mismatches.append(f"{table} {name}: days differ, expected {len(expected)} got {len(actual)}")
+            continue
+        for day, exp_value, act_value in zip(expected.index, expected, actual):
+            both_missing = math.isnan(exp_value) and math.isnan(act_value)
+            if not both_missing and not abs(exp_value - act_value) <= tolerance:
+                mismatches.append(f"{table} {name} on {day.date()}: expected {exp_value} got {act_value}")
+    return mismatches
+
+
+def main(argv=None):
+    from baby_tracker import db
+    from baby_tracker import DB_FILE
+
+    parser = argparse.ArgumentParser(prog="python -m baby_tracker.rollup", description="Maintain the daily duration rollup.")
+    parser.add_argument("command", choices=["rebuild", "check"])
+    parser.add_argument("--db-file", default=DB_FILE)
+    parser.add_argument("--table", choices=DURATION_TABLES, action="append")
+    cmd_args = parser.parse_args(argv)
+
+    conn = db.init_db(db_file=cmd_args.db_file)
+    tables = cmd_args.table or DURATION_TABLES
+    n_mismatches = 0
+    for table in tables:
+        if cmd_args.command == "rebuild":
+            rebuild(conn, table)
+            print(f"Rebuilt rollup for '{table}'")
+        else:
+            mismatches = check_consistency(conn, table)
+            for mismatch in mismatches:
+                print(mismatch)
+            print(f"'{table}': {len(mismatches)} mismatches")
+            n_mismatches += len(mismatches)
+    conn.close()
+    return 1 if n_mismatches else 0
+
+
+metrics.instrument_module(__name__, exclude=["rollup_day"])
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,11 @@
 from typing import Union
-import dateparser as dp
-from datetime import datetime
+from datetime import date, datetime
 
 from baby_tracker import slack
 from baby_tracker import db
-from baby_tracker import analyze as an
+from baby_tracker import timeparse
+from baby_tracker import rollup
+from baby_tracker import plot_cache
 from baby_tracker.utils import format_duration, format_timestamp, timedelta_to_seconds 
 
 from baby_tracker import SLACK_OAUTH_TOKEN, CHANNEL_ID
@@ -17,8 +18,8 @@ def _validate_duration(duration):
         ), f"Duration must be positive. Got a duration of '{duration}' seconds."
 
 
-def create_duration_record(args, create_db_record, db_conn, validate_duration=_validate_duration):
-    from_time, to_time = parse_duration_args(args)
+def create_duration_record(args, create_db_record, db_conn, validate_duration=_validate_duration, from_time=None):
+    from_time, to_time = parse_duration_args(args, from_time=from_time)
     try:
         duration = to_time - from_time
     except TypeError:
@@ -27,18 +28,76 @@ def create_duration_record(args, create_db_record, db_conn, validate_duration=_v
     return create_db_record(db_conn, (from_time, to_time, duration)), duration
 
 
+def parse_range_record(record):
+    """The from and to time of a batch record, either a range like "01:10-02:40" or a dict with from_time and to_time."""
+    if isinstance(record, str):
+        times = timeparse.parse_range(record)
+        if times is None:
+            raise ValueError(f"'{record}' is not a time range like 01:10-02:40")
+        return times
+    if isinstance(record, dict) and record.get("from_time"):
+        from_time = timeparse.parse(str(record["from_time"]))
+        to_time = timeparse.parse(str(record["to_time"])) if record.get("to_time") else None
+        if from_time is None or (record.get("to_time") and to_time is None):
+            raise ValueError(f"Not valid timestamps: {record}")
+        return from_time, to_time
+    raise ValueError(f"Not a time range or a record with a from_time: {record}")
+
+
+def create_duration_records(records, create_db_records, db_conn, validate_duration=_validate_duration):
+    """Validate the records one by one and create the valid ones in one transaction.
+
+    :return: (ids, errors) where errors are (index, record, message) of the records left out.
+    """
+    rows = []
+    errors = []
+    for i, record in enumerate(records):
+        try:
+            from_time, to_time = parse_range_record(record)
+            duration = to_time - from_time if to_time is not None else None
+            validate_duration(duration)
+        except (ValueError, AssertionError) as e:
+            errors.append((i, record, str(e)))
+            continue
+        rows.append((from_time, to_time, duration))
+    ids = create_db_records(db_conn, rows) if rows else []
+    return ids, errors
+
+
+def batch_result(db_conn, table, ids, errors):
+    """Result of the batch API, with the status text computed once for all the records."""
+    return {
+        "created": ids,
+        "errors": [{"index": i, "record": record, "error": message} for i, record, message in errors],
+        "text": make_duration_status_text(db_conn, table) if ids else "",
+    }
+
+
+def format_batch_message(label, result):
+    if result["created"]:
+        lines = [f"{label} records created with Ids: *{', '.join(map(str, result['created']))}*."]
+    else:
+        lines = ["No records created."]
+    lines += [f":exclamation: `{error['record']}`: {error['error']}" for error in result["errors"]]
+    if result["text"]:
+        lines.append(result["text"])
+    return "\n".join(lines)
+
+
 def make_duration_status_text(db_conn, table, latest_id=None):
     status_text = []
     if latest_id:
         latest_duration = db._get_duration_record_by_id(db_conn, table, latest_id)[3]
         status_text.append(f"Duration *{format_duration(latest_duration)}*")    
-    latest_date, latest_tot_duration = an.latest_daily_total_duration(db_conn, table)
+    latest_date, latest_tot_duration = rollup.latest_daily_total(db_conn, table)
     status_text.append(f"Total duration on {latest_date.strftime('%A %d/%m')}: *{format_duration(latest_tot_duration)}*")
     return "\n".join(status_text)
 
 
-def parse_duration_args(args):
-    from_time = parse_timestamp(args[0])
+def parse_duration_args(args, from_time=None):
+    """Parse the from and to time arguments. An already parsed from_time is used as is."""
+    if from_time is None:
+        from_time = parse_timestamp(args[0])
     try:
         to_time = parse_timestamp(args[1])
     except IndexError:
@@ -46,9 +105,7 @@ def parse_duration_args(args):
     return from_time, to_time
 
 def parse_timestamp(ts: Union[str, datetime]) -> datetime:
-    if not isinstance(ts, datetime):
-        ts = dp.parse(ts)
-    return ts
+    return timeparse.parse(ts)
 
 
 def format_duration_row(row: tuple):
@@ -67,9 +124,19 @@ def format_merged_duration_row(row: tuple):
     return from_time, to_time, duration, activity
 
 
-def analyze_timeline(db_conn):
-    df = an.merge_duration_tables(db_conn, tables=["feed", "sleep"])    
-    plot_buffer = an.timeline_plot(df, title="Timeline of breastfeeding and sleep")
-    slack.post_file("timeline.png", plot_buffer, oauth_token=SLACK_OAUTH_TOKEN, channel_id=CHANNEL_ID)
+def analyze_days(args):
+    """The optional number of days to analyze after the kind of analysis, e.g. `analyze tot 14`."""
+    return {"n_days": int(args[2]) if len(args) > 2 else None}
+
+
+def analyze_timeline(args, db_conn):
+    from baby_tracker import analyze as an
+    tables = ["feed", "sleep"]
+    # The timeline shows the last days, so it changes with the date as well.
+    plot_png = plot_cache.render_cached(
+        db_conn, tables, an.merge_duration_tables, (tables,), an.timeline_plot,
+        cache_params=date.today(), title="Timeline of breastfeeding and sleep"
+    )
+    slack.post_file("timeline.png", plot_png, oauth_token=SLACK_OAUTH_TOKEN, channel_id=CHANNEL_ID)
     return slack.empty_response()
 
@@ -0,0 +1,108 @@
+"""Pages of the `ls` commands, latest records first.
+
+    /sl ls 20                          the 20 latest records
+    /sl ls 20 before 2024-03-01        the 20 latest records before a time
+    /sl ls 20 next 18dfa8e2d4c00-71    the page after the one ending at a token
+
+Pages are read with keyset pagination: the next page token holds the sort key
+and id of the last record listed, and the next page is read from the index
+from there, so a page costs the same however far back it is. A page is cut
+short when its table would make the message longer than
+LIST_MAX_MESSAGE_CHARS, and the token then continues after the last record
+that fit.
+"""
+import re
+
+from baby_tracker import db
+from baby_tracker import slack
+from baby_tracker import timeparse
+
+from baby_tracker import DEFAULT_N_LIST, LIST_MAX_MESSAGE_CHARS
+
+
+# Largest page, the message size cap cuts most pages before it.
+MAX_PAGE_SIZE = 200
+TOKEN_PATTERN = re.compile(r"([0-9a-f]+)-(\d+)")
+
+
+def encode_token(timestamp, record_id):
+    """The next page token of the page ending at the record with this sort key and id."""
+    return f"{db.to_epoch_us(timestamp):x}-{record_id}"
+
+
+def decode_token(token):
+    match = TOKEN_PATTERN.fullmatch(token)
+    if match is None:
+        raise ValueError(f"Not a valid page token: '{token}'")
+    return db.from_epoch_us(int(match.group(1), 16)), int(match.group(2))
+
+
+def list_page(args):
+    """The page size and start of `ls 10`, `ls 10 before 2024-03-01` and `ls 10 next <token>`."""
+    words = list(args[1:])
+    n = DEFAULT_N_LIST
+    if words and words[0].isdigit():
+        n = int(words.pop(0))
+    if n < 1:
+        raise ValueError(f"List at least 1 record, not {n}")
+    kwargs = {"n": min(n, MAX_PAGE_SIZE)}
+    if not words:
+        return kwargs
+    if len(words) == 2 and words[0] == "next":
+        kwargs["before"] = decode_token(words[1])
+    elif len(words) >= 2 and words[0] == "before":
+        timestamp = timeparse.parse(" ".join(words[1:]))
+        if timestamp is None:
+            raise ValueError(f"Not a valid timestamp: '{' '.join(words[1:])}'")
+        kwargs["before"] = (timestamp, None)
+    else:
+        raise ValueError(f"Not valid args: {args}")
+    return kwargs
+
+
+def fitting_rows(table_str, max_chars):
+    """How many rows of a slack.table fit in max_chars, the header line always included."""
+    lines = table_str.split("\n")
+    # The closing backticks follow the last row.
+    size = len(lines[0]) + len("```")
+    for i, line in enumerate(lines[1:]):
+        size += 1 + len(line)
+        if size > max_chars:
+            return i
+    return len(lines) - 1
+
+
+def list_response(title, records, n, format_row, colnames, page_key, sort_key=None, max_chars=None):
+    """The message of a page of records, with the command of the next page when there is one.
+
+    :param records: up to n + 1 records in page order, the extra one only tells that there is a next page.
+    :param page_key: the (timestamp, id) sort key of a record.
+    :param sort_key: order of the rows within the page, the page order when None.
+    """
+    max_chars = LIST_MAX_MESSAGE_CHARS if max_chars is None else max_chars
+    page = records[:n]
+    has_next = len(records) > n
+    if page:
+        # The next page line is as long for every record, so the one of the last record is reserved.
+        reserved = len(f"*{len(page)} {title}:*\n") + len(_next_page_line(n, page[-1], page_key))
+        n_fitting = fitting_rows(slack.table([format_row(record) for record in page], colnames), max_chars - reserved)
+        if n_fitting < len(page):
+            page, has_next = page[:max(n_fitting, 1)], True
+    rows = [format_row(record) for record in (sorted(page, key=sort_key) if sort_key else page)]
+    msg_text = f"*{len(page)} {title}:*\n{slack.table(rows, colnames)}"
+    if has_next:
+        msg_text += _next_page_line(n, page[-1], page_key)
+    return slack.response(msg_text, response_type="ephemeral")
+
+
+def _next_page_line(n, record, page_key):
+    return f"\nNext page: `ls {n} next {encode_token(*page_key(record))}`"
+
+
+def created_at_key(record):
+    """Page key of the duration records, which are listed in the order they were created."""
+    return record[4], record[0]
+
+
+def timestamp_key(record):
+    return record[1], record[0]
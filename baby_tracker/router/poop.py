@@ -1,9 +1,9 @@
-import dateparser as dp
-
 from baby_tracker import db
+from baby_tracker import timeparse
 from baby_tracker import slack
-from baby_tracker import analyze as an
-from baby_tracker.utils import format_timestamp, is_timestamp
+from baby_tracker.utils import format_timestamp
+from baby_tracker.router.registry import Router, register, record_id
+from baby_tracker.router.listing import list_page, list_response, timestamp_key
 
 from baby_tracker import DEFAULT_N_LIST
 
@@ -15,38 +15,34 @@ POOP_HELP = f"""
 `/poop d 71` _Delete poop record with id=71_
 `/poop ls` _List {DEFAULT_N_LIST} latests poops_
 `/poop ls 10` _List 10 latests poops_
+`/poop ls 10 before 2024-03-01` _List 10 poops before a date, with a link to the next page_
 """
 
 
+router = register(Router("poop", POOP_HELP))
+
+
 def handle_poop_request(args, db_conn):
-    if (args is None) or args[0] == "help":
-        resp = slack.response(POOP_HELP, response_type="ephemeral")
-    elif args[0] in {"d", "del", "delete"}:
-        resp = handle_delete_poop(args, db_conn)
-    elif args[0] in {"ls", "list"}:
-        resp = handle_list_poop(args, db_conn)
-    elif is_timestamp(args[0]):
-        resp = handle_poop_create(args, db_conn)
-    else:
-        raise ValueError(f"Not valid args: {args}")
-    return resp
+    return router.handle(args, db_conn)
 
 
-def handle_poop_create(args, db_conn):
-    poop_id = create_poop_record(args, db_conn)
+@router.create("timestamp")
+def handle_poop_create(args, db_conn, timestamp=None):
+    poop_id = create_poop_record(args, db_conn, timestamp=timestamp)
     mrk_down_message = f":poop: poop record created with Id: *{poop_id}*.\n"
     resp = slack.response(mrk_down_message)
     return resp
 
 
-def create_poop_record(args, db_conn):
-    timestamp = args[0]
-    timestamp = dp.parse(timestamp)
+def create_poop_record(args, db_conn, timestamp=None):
+    if timestamp is None:
+        timestamp = timeparse.parse(args[0])
     return db.create_poop(db_conn, timestamp)
 
 
-def handle_delete_poop(args, db_conn):
-    poop_id = args[1]
+@router.command("delete", "d", "del", parse_args=record_id)
+def handle_delete_poop(args, db_conn, record_id):
+    poop_id = record_id
     db.delete_poop_record(db_conn, poop_id)
     mrk_down_message = (
         f"poop record with Id: *{poop_id}* deleted :wastebasket:"
@@ -55,14 +51,10 @@ def handle_delete_poop(args, db_conn):
     return resp
 
 
-def handle_list_poop(args, db_conn):
-    n = int(args[1]) if len(args) == 2 else DEFAULT_N_LIST
-    rows = db.get_latest_poop_records(db_conn, n)
-    rows = [format_poop_row(row) for row in rows]
-    colnames = ["date"]
-    table_str = slack.table(rows, colnames)
-    msg_text = f"*{n} latest poop records:*\n{table_str}"
-    return slack.response(msg_text, response_type="ephemeral")
+@router.command("list", "ls", parse_args=list_page)
+def handle_list_poop(args, db_conn, n=DEFAULT_N_LIST, before=None):
+    records = db.get_latest_poop_records(db_conn, n + 1, before=before)
+    return list_response("latest poop records", records, n, format_poop_row, ["date"], timestamp_key)
 
 
 def format_poop_row(row):
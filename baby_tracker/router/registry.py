@@ -0,0 +1,156 @@
+"""Routing of slash command arguments to handlers.
+
+Each action creates a Router and registers its commands once at import:
+
+    router = Router("poop", POOP_HELP)
+
+    @router.command("list", "ls", parse_args=list_page)
+    def handle_list_poop(args, db_conn, n=DEFAULT_N_LIST, before=None):
+        ...
+
+    @router.create("timestamp")
+    def handle_poop_create(args, db_conn, timestamp=None):
+        ...
+
+A command is found by one dict lookup of its first word. Other first words are
+matched against the patterns registered with Router.pattern, and then parsed
+as a timestamp once and passed to the create handler, which does not parse it
+again. Handlers are called with the arguments, the connection and the keyword
+arguments returned by parse_args.
+
+Routers of actions that take several records at once register a batch handler,
+called with a list of records by the batch API.
+"""
+from typing import Callable, NamedTuple, Optional
+
+from baby_tracker import slack
+from baby_tracker import timeparse
+
+
+class Command(NamedTuple):
+    name: str
+    handler: Callable
+    parse_args: Optional[Callable] = None
+
+
+class Route(NamedTuple):
+    name: str
+    handler: Callable
+    kwargs: dict
+
+
+ROUTERS = {}
+# Canonical names of the command words of all routers, e.g. "ls" -> "list".
+COMMAND_NAMES = {"help": "help"}
+
+
+class Router:
+    def __init__(self, action, help_text=None, word_index=0):
+        """:param word_index: position of the command word, 1 for the subcommands of e.g. `analyze`."""
+        self.action = action
+        self.help_text = help_text
+        self.word_index = word_index
+        self._commands = {}
+        self._patterns = []
+        self._create = None
+        self.batch_handler = None
+        if help_text is not None:
+            self.command("help")(self.handle_help)
+
+    def command(self, name, *aliases, parse_args=None):
+        """Register the decorated handler under name and its aliases."""
+        def register(handler):
+            command = Command(name, handler, parse_args)
+            for word in (name, *aliases):
+                if word in self._commands:
+                    raise ValueError(f"'{word}' is already a command of {self.action}")
+                self._commands[word] = command
+                if self.word_index == 0:
+                    COMMAND_NAMES[word] = name
+            return handler
+        return register
+
+    def create(self, timestamp_kwarg):
+        """Register the decorated handler for arguments starting with a timestamp, passed as timestamp_kwarg."""
+        def register(handler):
+            self._create = (handler, timestamp_kwarg)
+            return handler
+        return register
+
+    def pattern(self, regex, name="create"):
+        """Register the decorated handler for first words matching regex."""
+        def register(handler):
+            self._patterns.append((regex, Command(name, handler)))
+            return handler
+        return register
+
+    def batch(self, handler):
+        """Register the decorated handler(records, db_conn) of the batch API."""
+        self.batch_handler = handler
+        return handler
+
+    def mount(self, name, router, *aliases):
+        """Route the arguments of command name by their next word through router."""
+        self.command(name, *aliases)(router.handle)
+
+    def resolve(self, args):
+        # A mounted router without its subcommand word answers with its help, e.g. `analyze`.
+        if len(args or ()) <= self.word_index and self.help_text is not None:
+            return Route("help", self.handle_help, {})
+        word = args[self.word_index] if args and len(args) > self.word_index else None
+        command = self._commands.get(word)
+        if command is not None:
+            kwargs = command.parse_args(args) if command.parse_args else {}
+            return Route(command.name, command.handler, kwargs)
+        for regex, command in self._patterns:
+            if word is not None and regex.fullmatch(word):
+                return Route(command.name, command.handler, {})
+        if self._create is not None and word is not None:
+            timestamp = timeparse.parse(word)
+            if timestamp is not None:
+                handler, timestamp_kwarg = self._create
+                return Route("create", handler, {timestamp_kwarg: timestamp})
+        raise ValueError(f"Not valid args: {args}")
+
+    def command_path(self, args):
+        """Canonical names of the command of args and its subcommands, e.g. ("analyze", "timeline") for `analyze tl 7`."""
+        route = self.resolve(args)
+        router = getattr(route.handler, "__self__", None)
+        if isinstance(router, Router) and route.handler == router.handle:
+            return (route.name, *router.command_path(args))
+        return (route.name,)
+
+    def handle(self, args, db_conn):
+        route = self.resolve(args)
+        return route.handler(args, db_conn, **route.kwargs)
+
+    def handle_help(self, args, db_conn):
+        return slack.response(self.help_text, response_type="ephemeral")
+
+
+def register(router):
+    if router.action in ROUTERS:
+        raise ValueError(f"Action '{router.action}' is already registered")
+    ROUTERS[router.action] = router
+    return router
+
+
+def get_router(action):
+    try:
+        return ROUTERS[action]
+    except KeyError:
+        raise ValueError(f"action: '{action}' not recognized.")
+
+
+def command_name(args):
+    """Canonical name of the command in args, without parsing timestamps."""
+    if not args:
+        return "help"
+    return COMMAND_NAMES.get(args[0], "create")
+
+
+def record_id(args):
+    """The id of `d 71`."""
+    if len(args) < 2:
+        raise ValueError(f"Missing the record id: {args}")
+    return {"record_id": args[1]}
@@ -1,55 +1,52 @@
-import dateparser as dp
-
 from baby_tracker import db
+from baby_tracker import timeparse
 from baby_tracker import slack
-from baby_tracker import analyze as an
-from baby_tracker.utils import is_timestamp, format_timestamp
+from baby_tracker import plot_cache
+from baby_tracker.utils import format_timestamp
+from baby_tracker.router.registry import Router, register, record_id
+from baby_tracker.router.listing import list_page, list_response, timestamp_key
 
-from baby_tracker import SLACK_OAUTH_TOKEN, CHANNEL_ID, DEFAULT_N_LIST
+from baby_tracker import SLACK_OAUTH_TOKEN, CHANNEL_ID, DEFAULT_N_LIST, BIRTH_DATE, BABY_SEX
 
 WEIGHT_HELP = """
 *Examples*:
 `/w`  _This help text_
 `/w 2021-05-18 3254` _Register weight in grams at given date_
 `/w d 71` _Delete weight record with id=71_
+`/w ls 10 before 2024-03-01` _List 10 weights before a date, with a link to the next page_
 `/w analyze` _Plot growth curves_
+`/w z` _Weight-for-age z-score and percentile of the latest weight_
 """
 
 
+router = register(Router("weight", WEIGHT_HELP))
+
+
 def handle_weight_request(args, db_conn):
-    if (args is None) or args[0] == "help":
-        resp = slack.response(WEIGHT_HELP, response_type="ephemeral")
-    elif args[0] in {"d", "del", "delete"}:
-        resp = handle_delete_weight(args, db_conn)
-    elif args[0] in {"ls", "list"}:
-        resp = handle_list_weight(args, db_conn)
-    elif args[0] == "analyze":
-        resp = handle_weight_analyze(args, db_conn)
-    elif is_timestamp(args[0]):
-        resp = handle_weight_create(args, db_conn)
-    else:
-        raise ValueError(f"Not valid args: {args}")
-    return resp
+    return router.handle(args, db_conn)
 
 
-def handle_weight_create(args, db_conn):
-    weight_id = create_weight_record(args, db_conn)
+@router.create("timestamp")
+def handle_weight_create(args, db_conn, timestamp=None):
+    weight_id = create_weight_record(args, db_conn, timestamp=timestamp)
     mrk_down_message = f":weight_lifter: Weight record created with Id: *{weight_id}*.\n"
     resp = slack.response(mrk_down_message)
     return resp
 
 
-def create_weight_record(args, db_conn):
-    timestamp, weight_in_grams = args
-    timestamp = dp.parse(timestamp)
+def create_weight_record(args, db_conn, timestamp=None):
+    timestamp_arg, weight_in_grams = args
+    if timestamp is None:
+        timestamp = timeparse.parse(timestamp_arg)
     weight_in_grams = int(weight_in_grams)
     assert weight_in_grams > 0, "Weight must be positive"
     assert weight_in_grams < 20000, "Weight must be less than 20kg"
     return db.create_weight(db_conn, (timestamp, weight_in_grams))
 
 
-def handle_delete_weight(args, db_conn):
-    weight_id = args[1]
+@router.command("delete", "d", "del", parse_args=record_id)
+def handle_delete_weight(args, db_conn, record_id):
+    weight_id = record_id
     db.delete_weight_record(db_conn, weight_id)
     mrk_down_message = (
         f"Weight record with Id: *{weight_id}* deleted :wastebasket:"
@@ -58,21 +55,37 @@ def handle_delete_weight(args, db_conn):
     return resp
 
 
-def handle_list_weight(args, db_conn):
-    n = int(args[1]) if len(args) == 2 else DEFAULT_N_LIST
-    rows = db.get_latest_weight_records(db_conn, n)
-    rows = [format_weight_row(row) for row in rows]
-    colnames = ["date", "weight"]
-    table_str = slack.table(rows, colnames)
-    msg_text = f"*{n} latest weight records:*\n{table_str}"
-    return slack.response(msg_text, response_type="ephemeral")
+@router.command("list", "ls", parse_args=list_page)
+def handle_list_weight(args, db_conn, n=DEFAULT_N_LIST, before=None):
+    records = db.get_latest_weight_records(db_conn, n + 1, before=before)
+    return list_response("latest weight records", records, n, format_weight_row, ["date", "weight"], timestamp_key)
 
 
+@router.command("analyze")
 def handle_weight_analyze(args, db_conn):
-    df = an.weight_growth_df(db_conn)
-    plot_buffer = an.growth_curves_plot(df)
-    slack.post_file("weight.png", plot_buffer, oauth_token=SLACK_OAUTH_TOKEN, channel_id=CHANNEL_ID)
-    mrk_down_message = f"Latest weight measure at {df.iloc[-1]['weight']} g"
+    from baby_tracker import analyze as an
+    plot_png = plot_cache.render_cached(db_conn, ["weight"], an.weight_growth_df, (), an.growth_curves_plot, sex=BABY_SEX)
+    slack.post_file("weight.png", plot_png, oauth_token=SLACK_OAUTH_TOKEN, channel_id=CHANNEL_ID)
+    _id, _timestamp, weight, *_ = db.get_latest_weight_records(db_conn, 1)[0]
+    mrk_down_message = f"Latest weight measure at {weight} g"
+    return slack.response(mrk_down_message, response_type="in_channel")
+
+
+@router.command("z")
+def handle_weight_z_score(args, db_conn):
+    from baby_tracker import growth
+    records = db.get_latest_weight_records(db_conn, 1)
+    if not records:
+        return slack.response("No weight records found.", response_type="ephemeral")
+    _id, timestamp, weight, *_ = records[0]
+    age = (timestamp.date() - BIRTH_DATE).days
+    reference = growth.get_reference("weight", BABY_SEX)
+    z_score = reference.restricted_z_scores(age, weight).item()
+    percentile = growth.z_to_percentile(z_score).item()
+    mrk_down_message = (
+        f"Weight-for-age at {age} days ({format_timestamp(timestamp, date_only=True)}): {weight} g\n"
+        f"z-score *{z_score:+.2f}*, percentile *{percentile:.0f}*"
+    )
     return slack.response(mrk_down_message, response_type="in_channel")
 
 
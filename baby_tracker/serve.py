@@ -1,15 +1,23 @@
 import os
+import threading
+import time
 import traceback
-from flask import Flask, request, jsonify, g
+from flask import Flask, Response, request, jsonify, g
 
 from baby_tracker import db
 from baby_tracker import slack
-from baby_tracker.feed.endpoints import handle_feed_request
-from baby_tracker.sleep.endpoints import handle_sleep_request
-from baby_tracker.router.weight import handle_weight_request
-from baby_tracker.router.poop import handle_poop_request
+from baby_tracker import jobs
+from baby_tracker import plot_cache
+from baby_tracker import metrics
+from baby_tracker import profiling
+from baby_tracker import export
+from baby_tracker.router import registry
+# Importing the endpoint modules registers their commands.
+from baby_tracker.feed import endpoints as feed_endpoints
+from baby_tracker.sleep import endpoints as sleep_endpoints
+from baby_tracker.router import weight, poop
 
-from baby_tracker import DB_FILE
+from baby_tracker import DB_FILE, DB_POOL_SIZE, JOB_WORKERS, JOB_QUEUE_SIZE
 
 
 HELP = """
@@ -31,13 +39,104 @@ def parse_args(args_text):
 app = Flask(__name__)
 
 
+_extensions_lock = threading.Lock()
+
+
+def get_pool():
+    pool = app.extensions.get("db_pool")
+    if pool is None:
+        with _extensions_lock:
+            pool = app.extensions.get("db_pool")
+            if pool is None:
+                pool = app.extensions["db_pool"] = db.ConnectionPool(DB_FILE, size=DB_POOL_SIZE)
+    return pool
+
+
+def get_job_queue():
+    job_queue = app.extensions.get("job_queue")
+    if job_queue is None:
+        with _extensions_lock:
+            job_queue = app.extensions.get("job_queue")
+            if job_queue is None:
+                job_queue = app.extensions["job_queue"] = jobs.JobQueue(max_workers=JOB_WORKERS, max_pending=JOB_QUEUE_SIZE)
+    return job_queue
+
+
 def get_db():
     db_conn = getattr(g, "_database", None)
     if db_conn is None:
-        db_conn = g._database = db.init_db(db_file=DB_FILE)
+        db_conn = g._database = get_pool().acquire()
     return db_conn
 
 
+@app.teardown_appcontext
+def release_db(exception):
+    db_conn = g.pop("_database", None)
+    if db_conn is not None:
+        get_pool().release(db_conn)
+
+
+@app.route("/babytracker/pool", methods=["GET"])
+def pool_stats():
+    return jsonify(get_pool().stats())
+
+
+@app.route("/babytracker/jobs", methods=["GET"])
+def job_stats():
+    return jsonify(get_job_queue().stats())
+
+
+@app.route("/babytracker/plot-cache", methods=["GET"])
+def plot_cache_stats():
+    return jsonify(plot_cache.get_plot_cache().stats())
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics_text():
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+
+@app.route("/babytracker/export/<table>", methods=["GET"])
+def export_table(table):
+    """Stream a table as CSV or NDJSON, answering 304 when it did not change since the client's copy."""
+    if table not in export.COLUMNS:
+        return jsonify({"error": f"table: '{table}' not recognized."}), 404
+    format = request.args.get("format", "csv")
+    if format not in export.FORMATS:
+        return jsonify({"error": f"format: '{format}' not one of {', '.join(export.FORMATS)}."}), 400
+    try:
+        since = export.parse_time_filter(request.args.get("since"))
+        until = export.parse_time_filter(request.args.get("until"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # The connection is held until the response is sent, not until the view returns.
+    pool = get_pool()
+    db_conn = pool.acquire()
+    try:
+        version, updated_at = db.get_table_modified(db_conn, table)
+    except Exception:
+        pool.release(db_conn)
+        raise
+    etag = f"{table}-{version}"
+    last_modified = updated_at.astimezone().replace(microsecond=0) if updated_at is not None else None
+    if request.if_none_match:
+        not_modified = request.if_none_match.contains(etag)
+    else:
+        not_modified = last_modified is not None and request.if_modified_since is not None and last_modified <= request.if_modified_since
+    if not_modified:
+        pool.release(db_conn)
+        resp = Response(status=304)
+    else:
+        resp = Response(export.stream(db_conn, table, format, since, until), content_type=export.CONTENT_TYPES[format])
+        resp.call_on_close(lambda: pool.release(db_conn))
+        resp.headers["Content-Disposition"] = f"attachment; filename={table}.{format}"
+    resp.set_etag(etag)
+    if last_modified is not None:
+        resp.last_modified = last_modified
+    return resp
+
+
 @app.route("/babytracker", methods=["POST"])
 def help():
     resp = help()
@@ -48,34 +147,93 @@ def help():
 def create(action):
     args_text = request.form.get("text")
     args = parse_args(args_text)
+    response_url = request.form.get("response_url")
+    if response_url and is_deferred(action, args):
+        channel_id = request.form.get("channel_id")
+        resp = defer_action(action, args, response_url, channel_id)
+        return jsonify(resp)
     db_conn = get_db()
     resp = handle_action(action, args, db_conn)
     return jsonify(resp)
 
 
+def is_deferred(action, args):
+    """Analysis renders plots and uploads files, which can take longer than Slack waits for a response."""
+    return bool(args) and args[0] == "analyze"
+
+
+def defer_action(action, args, response_url, channel_id):
+    key = (channel_id, action, tuple(args))
+    try:
+        submitted, ahead = get_job_queue().submit(key, run_deferred_action, action, args, response_url)
+    except jobs.QueueFullError as e:
+        return slack.response(slack.error_message(e), response_type="ephemeral")
+    if not submitted:
+        resp = slack.response(f":hourglass_flowing_sand: `{' '.join(args)}` is already being rendered.", response_type="ephemeral")
+        # Answered through response_url like the deferred commands, falling back to the response when the queue is full.
+        try:
+            get_job_queue().submit(("follow-up", response_url), slack.post_response, response_url, resp)
+        except jobs.QueueFullError:
+            return resp
+        return slack.empty_response()
+    return slack.acknowledgement(ahead)
+
+
+def run_deferred_action(action, args, response_url):
+    try:
+        pool = get_pool()
+        db_conn = pool.acquire()
+        try:
+            resp = handle_action(action, args, db_conn)
+        finally:
+            pool.release(db_conn)
+    except Exception as e:
+        # Without a follow-up the acknowledgement would be the last the user hears of the command.
+        app.logger.exception(f"Deferred {action} {args} failed")
+        resp = slack.response(slack.error_message(e), response_type="ephemeral")
+    if resp is not None:
+        slack.post_response(response_url, resp)
+
+
 def handle_action(action, args, db_conn):
+    labels = (action if action in registry.ROUTERS else "unknown", registry.command_name(args))
+    start = time.perf_counter()
     try:
-        resp = _handle_action(action, args, db_conn)
+        with profiling.profile_request(*labels, args):
+            resp = _handle_action(action, args, db_conn)
     except Exception as e:
+        metrics.REQUEST_ERRORS.inc(labels)
         error_message = slack.error_message(e)
         resp = slack.response(error_message, response_type="ephemeral")
         traceback_str = " ".join(traceback.format_tb(e.__traceback__))
         app.logger.error(repr(e) + "\n" + traceback_str) 
+    metrics.REQUEST_SECONDS.observe(labels, time.perf_counter() - start)
     return resp
 
 
+@app.route("/babytracker/<action>/batch", methods=["POST"])
+def create_batch(action):
+    """Create several records from a JSON body like {"records": ["01:10-02:40", {"from_time": ..., "to_time": ...}]}."""
+    router = registry.ROUTERS.get(action)
+    if router is None or router.batch_handler is None:
+        return jsonify({"error": f"action: '{action}' does not take batches."}), 404
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict) or not isinstance(body.get("records"), list):
+        return jsonify({"error": "Expected a JSON object with a list of records."}), 400
+    labels = (action, "batch")
+    start = time.perf_counter()
+    try:
+        result = router.batch_handler(body["records"], get_db())
+    except Exception:
+        metrics.REQUEST_ERRORS.inc(labels)
+        raise
+    finally:
+        metrics.REQUEST_SECONDS.observe(labels, time.perf_counter() - start)
+    return jsonify(result)
+
+
 def _handle_action(action, args, db_conn):
-    if action == "feed":
-        resp = handle_feed_request(args, db_conn)
-    elif action == "sleep":
-        resp = handle_sleep_request(args, db_conn)
-    elif action == "weight":
-        resp = handle_weight_request(args, db_conn)
-    elif action == "poop":
-        resp = handle_poop_request(args, db_conn)
-    else:
-        raise ValueError(f"action: '{action}' not recognized.")
-    return resp
+    return registry.get_router(action).handle(args, db_conn)
 
 
 def help():
@@ -1,7 +1,21 @@
 import io
+import itertools
+import logging
+import threading
+import time
+from typing import Union
 import requests
+import urllib3
 from prettytable import PrettyTable, NONE
 
+from baby_tracker import jobs
+from baby_tracker import metrics
+from baby_tracker import SLACK_API_URL, SLACK_CONNECT_TIMEOUT, SLACK_READ_TIMEOUT, SLACK_MAX_RETRIES, SLACK_ASYNC_UPLOADS
+
+
+logger = logging.getLogger(__name__)
+
+
 def table(rows, colnames):
     t = PrettyTable()
     t.border = False
@@ -25,22 +39,159 @@ def response(mrk_down_message, response_type="in_channel"):
 def empty_response():
     return None
 
-def post_file(fname: str, buffer: io.BytesIO, oauth_token: str, channel_id: str, comment=""):
-    multipart_form = {
-        "file": (fname, buffer), 
-        "initial_comment": comment,
-    }
-    headers = {
-        "Authorization": f"Bearer {oauth_token}"
-    }
-
-    params = {
-        "channels": channel_id,
-    }
-
-    resp = requests.post("https://slack.com/api/files.upload", 
-        files=multipart_form, 
-        headers=headers, 
-        params=params
-    )
-    return resp
+
+def acknowledgement(jobs_ahead):
+    waiting = f" {jobs_ahead} job(s) ahead in the queue." if jobs_ahead > 0 else ""
+    return response(f":hourglass_flowing_sand: Working on it.{waiting}", response_type="ephemeral")
+
+
+# A 5xx answer to these may come after the server acted, which is harmless to repeat only for them.
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+
+
+class SlackError(RuntimeError):
+    """Exception raised when the Slack API answers with "ok": false."""
+    pass
+
+
+class SlackClient:
+    """Calls the Slack API over one keep-alive session, with timeouts and retries.
+
+    Rate limited (429) calls and calls that could not connect are retried up
+    to max_retries times, waiting for the Retry-After header or an exponential
+    backoff. Failed (5xx) calls are only retried when they are idempotent, by
+    method or as told by the caller. Calls that failed once connected, by timing
+    out while reading the response or by the connection dropping, are not
+    retried, since Slack may already have posted the file.
+    """
+
+    def __init__(self, api_url=SLACK_API_URL, connect_timeout=SLACK_CONNECT_TIMEOUT, read_timeout=SLACK_READ_TIMEOUT,
+                 max_retries=SLACK_MAX_RETRIES, backoff=0.5, max_backoff=30, upload_workers=1, max_pending_uploads=20):
+        self.api_url = api_url
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=10)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.uploads = jobs.JobQueue(max_workers=upload_workers, max_pending=max_pending_uploads)
+        self._upload_ids = itertools.count()
+
+    def request(self, method, url, idempotent=None, **kwargs):
+        """:param idempotent: whether a 5xx answer may be retried, by default for the idempotent HTTP methods."""
+        if idempotent is None:
+            idempotent = method.upper() in IDEMPOTENT_METHODS
+        attempt = 0
+        while True:
+            try:
+                resp = self.session.request(method, url, timeout=self.timeout, **kwargs)
+            except requests.ConnectionError as e:
+                if not _could_not_connect(e) or attempt >= self.max_retries:
+                    raise
+                delay = self._backoff_delay(attempt)
+                logger.warning(f"Could not connect to {url}, retrying in {delay:.1f}s")
+            else:
+                retryable = resp.status_code == 429 or (idempotent and resp.status_code >= 500)
+                if not retryable or attempt >= self.max_retries:
+                    return resp
+                delay = self._retry_after(resp, attempt)
+                logger.warning(f"{url} answered {resp.status_code}, retrying in {delay:.1f}s")
+            time.sleep(delay)
+            attempt += 1
+
+    def _backoff_delay(self, attempt):
+        return min(self.backoff * 2 ** attempt, self.max_backoff)
+
+    def _retry_after(self, resp, attempt):
+        try:
+            return min(float(resp.headers["Retry-After"]), self.max_backoff)
+        except (KeyError, ValueError):
+            return self._backoff_delay(attempt)
+
+    def post_file(self, fname, buffer, oauth_token, channel_id, comment=""):
+        if isinstance(buffer, io.BytesIO):
+            buffer = buffer.getvalue()
+        resp = self.request(
+            "POST", f"{self.api_url}/files.upload",
+            files={"file": (fname, buffer), "initial_comment": comment},
+            headers={"Authorization": f"Bearer {oauth_token}"},
+            params={"channels": channel_id},
+        )
+        resp.raise_for_status()
+        body = resp.json()
+        if not body.get("ok"):
+            raise SlackError(f"Upload of {fname} failed: {body.get('error')}")
+        return resp
+
+    def submit_file(self, fname, buffer, oauth_token, channel_id, comment=""):
+        """Queue the upload of a file and return without waiting for it. Failed uploads are logged.
+
+        :return: number of uploads waiting to start before this one.
+        """
+        if isinstance(buffer, io.BytesIO):
+            buffer = buffer.getvalue()
+        key = ("upload", fname, next(self._upload_ids))
+        _, ahead = self.uploads.submit(key, self.post_file, fname, buffer, oauth_token, channel_id, comment)
+        return ahead
+
+    def post_response(self, response_url, resp):
+        """Send a delayed response to a slash command through its response_url."""
+        http_resp = self.request("POST", response_url, json=resp)
+        http_resp.raise_for_status()
+        return http_resp
+
+    def close(self, wait=True):
+        """Finish the queued uploads and close the session."""
+        self.uploads.shutdown(wait=wait)
+        self.session.close()
+
+
+def _could_not_connect(e):
+    """Whether a requests.ConnectionError failed before the request was sent."""
+    if isinstance(e, requests.ConnectTimeout):
+        return True
+    reason = getattr(e.args[0], "reason", None) if e.args else None
+    return isinstance(reason, urllib3.exceptions.NewConnectionError)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = SlackClient()
+        return _client
+
+
+def set_client(client, wait=True):
+    """Replace the client of post_file and post_response, closing the previous one."""
+    global _client
+    with _client_lock:
+        previous, _client = _client, client
+    if previous is not None and previous is not client:
+        previous.close(wait=wait)
+
+
+def shutdown(wait=True):
+    set_client(None, wait=wait)
+
+
+def post_response(response_url: str, resp: dict):
+    """Send a delayed response to a slash command through its response_url."""
+    return get_client().post_response(response_url, resp)
+
+
+def post_file(fname: str, buffer: Union[io.BytesIO, bytes], oauth_token: str, channel_id: str, comment=""):
+    """Upload a file to a channel, in the background when SLACK_ASYNC_UPLOADS is set."""
+    client = get_client()
+    if SLACK_ASYNC_UPLOADS:
+        return client.submit_file(fname, buffer, oauth_token, channel_id, comment)
+    return client.post_file(fname, buffer, oauth_token, channel_id, comment)
+
+
+metrics.instrument_module(__name__, ["post_file", "post_response"])
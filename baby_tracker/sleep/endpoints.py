@@ -1,11 +1,13 @@
-import dateparser as dp
-from datetime import timedelta, datetime
+from datetime import date, timedelta, datetime
 
 from baby_tracker import db
+from baby_tracker import timeparse
 from baby_tracker import slack
-from baby_tracker import analyze as an
-from baby_tracker.utils import format_timestamp, format_duration, is_timestamp
-from baby_tracker.router._duration import create_duration_record, make_duration_status_text, format_duration_row, format_timestamp, _validate_duration, analyze_timeline
+from baby_tracker import plot_cache
+from baby_tracker.utils import format_timestamp, format_duration
+from baby_tracker.router._duration import create_duration_record, make_duration_status_text, format_duration_row, format_timestamp, _validate_duration, analyze_timeline, analyze_days, create_duration_records, batch_result, format_batch_message
+from baby_tracker.router.registry import Router, register, record_id
+from baby_tracker.router.listing import list_page, list_response, created_at_key
 
 from baby_tracker import DEFAULT_N_LIST, SLACK_OAUTH_TOKEN, CHANNEL_ID
 
@@ -15,10 +17,19 @@ SLEEP_HELP = """
 `/sl start` _Start a sleep stretch now_
 `/sl end` _End latest sleep stretch_
 `/sl 12:30 16:45` _Register sleep between two time points_
+`/sl 01:10-02:40 03:15-05:50` _Register several sleep stretches at once_
 `/sl ls 5` _List 5 latest sleep entries_
+`/sl ls 20 before 2024-03-01` _List 20 sleep entries created before a date, with a link to the next page_
 `/sl d 71` _Delete sleep record with id=71_
 `/sl s 14:45` Sleep started at 14:45.
-`/sl analyze` Returns plots and stats of sleeping bahaviour.
+`/sl analyze` _The plots and stats of sleeping bahaviour_
+`/sl analyze avg 14` _Average sleep period per day over the last 14 days_
+"""
+
+SLEEP_ANALYZE_HELP = """
+*Analyses*:
+`/sl analyze tot|avg|cnt [days]` _Total, average and number of sleep periods per day, over the last days when given_
+`/sl analyze tl` _Timeline of breastfeeding and sleep_
 """
 
 MAX_VALID_SLEEP_SEC = timedelta(hours=10)
@@ -33,39 +44,40 @@ def validate_sleep_duration(duration):
         assert duration < MAX_VALID_SLEEP_SEC, f"Sleep duration must be less than {format_duration(MAX_VALID_SLEEP_SEC)}"
 
 
+router = register(Router("sleep", SLEEP_HELP))
+analyze_router = Router("sleep analyze", SLEEP_ANALYZE_HELP, word_index=1)
+router.mount("analyze", analyze_router)
+
+
 def handle_sleep_request(args, db_conn):
-    if (args is None) or args[0] == "help":
-        resp = slack.response(SLEEP_HELP, response_type="ephemeral")
-    elif args[0] in {"s", "start"}:
-        resp = handle_sleep_start(args, db_conn)
-    elif args[0] in {"e", "end"}:
-        resp = handle_sleep_end(args, db_conn)
-    elif args[0] in {"d", "del", "delete"}:
-        resp = handle_delete_sleep(args, db_conn)
-    elif args[0] in {"ls", "list"}:
-        resp = handle_list_sleeps(args, db_conn)
-    elif args[0] == "analyze":
-        resp = handle_sleep_analyze(args, db_conn)
-    elif args[0] == "status":
-        resp = handle_sleep_status(args, db_conn)
-    elif is_timestamp(args[0]):
-        resp = handle_sleep_create(args, db_conn)
-    else:
-        raise ValueError(f"Not valid args: {args}")
-    return resp
+    return router.handle(args, db_conn)
 
 
-def handle_sleep_create(args, db_conn):
-    sleep_id, _ = create_sleep_record(args, db_conn)
+@router.create("from_time")
+def handle_sleep_create(args, db_conn, from_time=None):
+    sleep_id, _ = create_sleep_record(args, db_conn, from_time=from_time)
     mrk_down_message = f":sleeping: Sleep record created with Id: *{sleep_id}*.\n"
     mrk_down_message += make_duration_status_text(db_conn, "sleep", latest_id=sleep_id)
     resp = slack.response(mrk_down_message)
     return resp
 
 
+@router.pattern(timeparse.RANGE_PATTERN)
+def handle_sleep_ranges(args, db_conn):
+    result = create_sleep_batch(args, db_conn)
+    return slack.response(format_batch_message(":sleeping: Sleep", result))
+
+
+@router.batch
+def create_sleep_batch(records, db_conn):
+    ids, errors = create_duration_records(records, db.create_sleeps, db_conn, validate_duration=validate_sleep_duration)
+    return batch_result(db_conn, "sleep", ids, errors)
+
+
+@router.command("start", "s")
 def handle_sleep_start(args, db_conn):
     try:
-        from_time = dp.parse(args[1])
+        from_time = timeparse.parse(args[1])
     except IndexError:
         from_time = datetime.now()
 
@@ -76,6 +88,7 @@ def handle_sleep_start(args, db_conn):
     return resp
 
 
+@router.command("end", "e")
 def handle_sleep_end(args, db_conn):
     try:
         sleep_id, from_time, to_time, *ignore = db.get_latest_sleep_record_with_null_to_time(db_conn)
@@ -83,7 +96,7 @@ def handle_sleep_end(args, db_conn):
         raise NoActiveSleepRecordError
 
     try:
-        to_time = dp.parse(args[1])
+        to_time = timeparse.parse(args[1])
     except IndexError:
         to_time = datetime.now()
 
@@ -97,11 +110,12 @@ def handle_sleep_end(args, db_conn):
     return resp
 
 
-def create_sleep_record(args, db_conn):
-    return create_duration_record(args, db.create_sleep, db_conn, validate_duration=validate_sleep_duration)
+def create_sleep_record(args, db_conn, from_time=None):
+    return create_duration_record(args, db.create_sleep, db_conn, validate_duration=validate_sleep_duration, from_time=from_time)
 
-def handle_delete_sleep(args, db_conn):
-    sleep_id = args[1]
+@router.command("delete", "d", "del", parse_args=record_id)
+def handle_delete_sleep(args, db_conn, record_id):
+    sleep_id = record_id
     db.delete_sleep(db_conn, sleep_id)
     mrk_down_message = (
         f"Sleeping record with Id: *{sleep_id}* deleted :wastebasket:"
@@ -110,66 +124,73 @@ def handle_delete_sleep(args, db_conn):
     return resp
 
 
-def handle_list_sleeps(args, db_conn):
-    n = int(args[1]) if len(args) == 2 else DEFAULT_N_LIST
-    rows = db.get_latest_sleep_records(db_conn, n)
-    rows = [format_duration_row(row) for row in rows]
+@router.command("list", "ls", parse_args=list_page)
+def handle_list_sleeps(args, db_conn, n=DEFAULT_N_LIST, before=None):
+    # One record more than the page tells whether there is a next page.
+    records = db.get_latest_sleep_records(db_conn, n + 1, before=before)
     colnames = ["from", "to", "duration"]
-    table_str = slack.table(rows, colnames)
-    msg_text = f"*{n} latest sleeping records:*\n{table_str}"
-    return slack.response(msg_text, response_type="ephemeral")
-
-def handle_sleep_analyze(args, db_conn):
-    if args[1] in {"tot", "total"}:
-        return analyze_sleep_total(db_conn)
-    elif args[1] in {"avg", "average"}:
-        return analyze_sleep_avg(db_conn)
-    elif args[1] in {"cnt", "count"}:
-        return analyze_sleep_count(db_conn)
-    elif args[1] in {"tl", "timeline"}:
-        return analyze_timeline(db_conn)
-    else:
-        raise ValueError("Not valid args: {args}")
-
-
-def analyze_sleep_total(db_conn):
-    df_agg_tot = an.total_duration_per_day(db_conn, "sleep")
-    plot_buffer = an.duration_plot(
-        df_agg_tot, 
+    return list_response("latest sleeping records", records, n, format_duration_row, colnames, created_at_key)
+
+analyze_router.command("timeline", "tl")(analyze_timeline)
+
+
+@analyze_router.command("total", "tot", parse_args=analyze_days)
+def analyze_sleep_total(args, db_conn, n_days=None):
+    from baby_tracker import analyze as an
+    plot_png = plot_cache.render_cached(
+        db_conn,
+        ["sleep"],
+        an.total_duration_per_day,
+        ("sleep", "6Hours", n_days),
+        an.duration_plot,
+        cache_params=date.today() if n_days else None,
         title="Total sleeping time each day from 06:00 to 06:00",
         scale=1/3600,
         ylabel="Duration (hours)"
     )
-    slack.post_file("total_sleeping_time.png", plot_buffer, oauth_token=SLACK_OAUTH_TOKEN, channel_id=CHANNEL_ID)
+    slack.post_file("total_sleeping_time.png", plot_png, oauth_token=SLACK_OAUTH_TOKEN, channel_id=CHANNEL_ID)
     mrk_down_message = make_duration_status_text(db_conn, "sleep")
     return slack.response(mrk_down_message, response_type="in_channel")
 
 
-def analyze_sleep_avg(db_conn):
-    df_agg_tot = an.avg_duration_per_day(db_conn, "sleep")
-    plot_buffer = an.duration_plot(
-        df_agg_tot, 
+@analyze_router.command("average", "avg", parse_args=analyze_days)
+def analyze_sleep_avg(args, db_conn, n_days=None):
+    from baby_tracker import analyze as an
+    plot_png = plot_cache.render_cached(
+        db_conn,
+        ["sleep"],
+        an.avg_duration_per_day,
+        ("sleep", "6Hours", n_days),
+        an.duration_plot,
+        cache_params=date.today() if n_days else None,
         title="Average duration of each sleep period between 06:00 to 06:00",
         scale=1/3600,
         ylabel="Duration (hours)"
     )
-    slack.post_file("avg_sleeping_time.png", plot_buffer, oauth_token=SLACK_OAUTH_TOKEN, channel_id=CHANNEL_ID)
+    slack.post_file("avg_sleeping_time.png", plot_png, oauth_token=SLACK_OAUTH_TOKEN, channel_id=CHANNEL_ID)
     mrk_down_message = make_duration_status_text(db_conn, "sleep")
     return slack.response(mrk_down_message, response_type="in_channel")
 
-def analyze_sleep_count(db_conn):
-    df_agg_tot = an.count_per_day(db_conn, "sleep")
-    plot_buffer = an.duration_plot(
-        df_agg_tot, 
+@analyze_router.command("count", "cnt", parse_args=analyze_days)
+def analyze_sleep_count(args, db_conn, n_days=None):
+    from baby_tracker import analyze as an
+    plot_png = plot_cache.render_cached(
+        db_conn,
+        ["sleep"],
+        an.count_per_day,
+        ("sleep", "6Hours", n_days),
+        an.duration_plot,
+        cache_params=date.today() if n_days else None,
         title="Number of sleep periods between 06:00 to 06:00",
         scale=1,
         ylabel="Count"
     )
-    slack.post_file("count_sleeping_time.png", plot_buffer, oauth_token=SLACK_OAUTH_TOKEN, channel_id=CHANNEL_ID)
+    slack.post_file("count_sleeping_time.png", plot_png, oauth_token=SLACK_OAUTH_TOKEN, channel_id=CHANNEL_ID)
     mrk_down_message = make_duration_status_text(db_conn, "sleep")
     return slack.response(mrk_down_message, response_type="in_channel")
 
 
+@router.command("status")
 def handle_sleep_status(args, db_conn):
     mrk_down_message = make_duration_status_text(db_conn, "sleep")
     return slack.response(mrk_down_message, response_type="in_channel")
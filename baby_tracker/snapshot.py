@@ -0,0 +1,253 @@
+"""Columnar snapshots of the tables for offline analysis.
+
+    python -m baby_tracker.snapshot --db-file ./db.sqlite --dir ./snapshots
+    python -m baby_tracker.snapshot --format arrow sleep feed
+
+Each table is written to one file per month of its from_time or timestamp,
+
+    <dir>/<table>/month=2024-03/part.parquet
+
+as Parquet or Arrow IPC, with timestamps as timestamp[us] and durations as
+duration[s]. A _manifest.json next to the partitions holds a fingerprint of
+each month, the row count, the largest id and the last change, and a run only
+rewrites the months whose fingerprint changed, so running it from cron after
+the first run writes little more than the current month.
+
+analyze.df_from_snapshot loads a window from the partitions it overlaps,
+memory-mapping the files instead of querying SQLite.
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+from datetime import datetime, timedelta
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from baby_tracker import db
+from baby_tracker.export import COLUMNS, TIME_COLUMNS
+
+from baby_tracker import DB_FILE, SNAPSHOT_DIR
+
+
+FORMATS = {"parquet": "parquet", "arrow": "arrow"}
+MANIFEST_FILE = "_manifest.json"
+PART_NAME = "part"
+# Partition of the records without a time.
+UNKNOWN_MONTH = "unknown"
+COLUMN_TYPES = {
+    "id": pa.int64(),
+    "from_time": pa.timestamp("us"),
+    "to_time": pa.timestamp("us"),
+    "timestamp": pa.timestamp("us"),
+    "created_at": pa.timestamp("us"),
+    "updated_at": pa.timestamp("us"),
+    "duration": pa.duration("s"),
+    "weight": pa.int64(),
+}
+
+
+def _month_sql(conn, column):
+    if getattr(conn, "timestamp_storage", db.TEXT_STORAGE) == db.EPOCH_US_STORAGE:
+        return f"strftime('%Y-%m', {column} / 1000000, 'unixepoch')"
+    return f"substr({column}, 1, 7)"
+
+
+def month_fingerprints(conn, table, from_time=None, until=None):
+    """{month: [n_rows, max_id, last change]} of the records of a table, in one grouped scan.
+
+    With from_time or until only the whole months overlapping [from_time, until) are scanned, through the index.
+    """
+    time_column = TIME_COLUMNS[table]
+    month_sql = _month_sql(conn, time_column)
+    conditions, params = [], []
+    if from_time is not None:
+        conditions.append(f"{time_column} >= ?")
+        params.append(db.to_db_timestamp(conn, month_bounds(f"{from_time:%Y-%m}")[0]))
+    if until is not None:
+        conditions.append(f"{time_column} < ?")
+        params.append(db.to_db_timestamp(conn, month_bounds(f"{until - timedelta(microseconds=1):%Y-%m}")[1]))
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    cur = conn.cursor()
+    cur.execute(
+        f"SELECT {month_sql} AS month, count(*), max(id), max(coalesce(updated_at, created_at)) "
+        f"FROM {table} {where} GROUP BY month",
+        params,
+    )
+    return {month or UNKNOWN_MONTH: list(fingerprint) for month, *fingerprint in cur.fetchall()}
+
+
+def month_bounds(month):
+    """The (start, end) datetimes of a "YYYY-MM" month."""
+    start = datetime.strptime(month, "%Y-%m")
+    end = start.replace(year=start.year + 1, month=1) if start.month == 12 else start.replace(month=start.month + 1)
+    return start, end
+
+
+def read_month(conn, table, month):
+    """The records of one month of a table as an Arrow table, ordered by time."""
+    columns = COLUMNS[table]
+    time_column = TIME_COLUMNS[table]
+    if month == UNKNOWN_MONTH:
+        where, params = f"{time_column} IS NULL", []
+    else:
+        start, end = month_bounds(month)
+        where, params = f"{time_column} >= ? AND {time_column} < ?", [db.to_db_timestamp(conn, start), db.to_db_timestamp(conn, end)]
+    cur = conn.cursor()
+    cur.execute(f"SELECT {','.join(columns)} FROM {table} WHERE {where} ORDER BY {time_column}, id", params)
+    rows = cur.fetchall()
+    values = list(zip(*rows)) if rows else [()] * len(columns)
+    epoch_us = getattr(conn, "timestamp_storage", db.TEXT_STORAGE) == db.EPOCH_US_STORAGE
+    arrays = [_to_arrow(column_values, COLUMN_TYPES[column], epoch_us) for column, column_values in zip(columns, values)]
+    return pa.table(arrays, names=list(columns))
+
+
+def _to_arrow(values, arrow_type, epoch_us):
+    if pa.types.is_timestamp(arrow_type):
+        # Both storages cast without a round trip through datetime objects.
+        return pa.array(values, pa.int64() if epoch_us else pa.string()).cast(arrow_type)
+    if pa.types.is_duration(arrow_type):
+        return pa.array(values, pa.int64()).cast(arrow_type)
+    return pa.array(values, arrow_type)
+
+
+def partition_path(directory, table, month, format):
+    return os.path.join(directory, table, f"month={month}", f"{PART_NAME}.{FORMATS[format]}")
+
+
+def write_partition(arrow_table, path, format):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    if format == "parquet":
+        pq.write_table(arrow_table, tmp_path)
+    else:
+        with pa.OSFile(tmp_path, "wb") as sink:
+            with pa.ipc.new_file(sink, arrow_table.schema) as writer:
+                writer.write_table(arrow_table)
+    # Readers see either the old or the new partition, never a partly written one.
+    os.replace(tmp_path, path)
+
+
+def read_manifest(directory, table):
+    """The manifest of the snapshot of a table, None when there is none."""
+    try:
+        with open(os.path.join(directory, table, MANIFEST_FILE)) as manifest_file:
+            return json.load(manifest_file)
+    except FileNotFoundError:
+        return None
+
+
+def _write_manifest(directory, table, manifest):
+    path = os.path.join(directory, table, MANIFEST_FILE)
+    with open(path + ".tmp", "w") as manifest_file:
+        json.dump(manifest, manifest_file, indent=1, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+
+def snapshot_table(conn, directory, table, format="parquet"):
+    """Write the months of a table that changed since the last snapshot and return them."""
+    version, _ = db.get_table_modified(conn, table)
+    fingerprints = month_fingerprints(conn, table)
+    manifest = read_manifest(directory, table)
+    if manifest is None or manifest["format"] != format:
+        shutil.rmtree(os.path.join(directory, table), ignore_errors=True)
+        previous = {}
+    else:
+        previous = manifest["months"]
+
+    written = sorted(month for month, fingerprint in fingerprints.items() if previous.get(month) != fingerprint)
+    for month in written:
+        write_partition(read_month(conn, table, month), partition_path(directory, table, month, format), format)
+    for month in set(previous) - set(fingerprints):
+        shutil.rmtree(os.path.dirname(partition_path(directory, table, month, format)), ignore_errors=True)
+    os.makedirs(os.path.join(directory, table), exist_ok=True)
+    _write_manifest(directory, table, {"format": format, "table_version": version, "months": fingerprints})
+    return written
+
+
+def snapshot(conn, directory, tables=tuple(COLUMNS), format="parquet"):
+    """{table: written months} of a snapshot of the tables."""
+    return {table: snapshot_table(conn, directory, table, format) for table in tables}
+
+
+def is_current(conn, directory, table):
+    """Whether the snapshot of a table holds all its changes."""
+    manifest = read_manifest(directory, table)
+    return manifest is not None and manifest["table_version"] == db.get_table_modified(conn, table)[0]
+
+
+def window_months(months, from_time=None, until=None):
+    """The months overlapping the window [from_time, until), all months without a window."""
+    if from_time is None and until is None:
+        return sorted(months)
+    selected = []
+    for month in sorted(months):
+        if month == UNKNOWN_MONTH:
+            continue
+        start, end = month_bounds(month)
+        if (until is None or start < until) and (from_time is None or end > from_time):
+            selected.append(month)
+    return selected
+
+
+def _read_partition(path, format, columns):
+    if format == "parquet":
+        return pq.read_table(path, columns=columns, memory_map=True)
+    # The record batches point into the mapped file, nothing is copied.
+    arrow_table = pa.ipc.open_file(pa.memory_map(path)).read_all()
+    return arrow_table.select(columns)
+
+
+def read_snapshot(directory, table, columns=None, from_time=None, until=None, months=None):
+    """The records of a table in the window [from_time, until) of its from_time or timestamp, as an Arrow table.
+
+    :param columns: the columns to load besides id, all columns when None.
+    :param months: only read these months of the window.
+    """
+    manifest = read_manifest(directory, table)
+    if manifest is None:
+        raise FileNotFoundError(f"No snapshot of {table} in {directory}")
+    time_column = TIME_COLUMNS[table]
+    selected = ["id", *columns] if columns is not None else list(COLUMNS[table])
+    read_columns = selected if time_column in selected else [*selected, time_column]
+    format = manifest["format"]
+    parts = [
+        _read_partition(partition_path(directory, table, month, format), format, read_columns)
+        for month in window_months(manifest["months"] if months is None else months, from_time, until)
+    ]
+    if not parts:
+        return pa.schema([(column, COLUMN_TYPES[column]) for column in selected]).empty_table()
+    arrow_table = pa.concat_tables(parts)
+    if from_time is not None:
+        arrow_table = arrow_table.filter(pc.greater_equal(arrow_table[time_column], pa.scalar(from_time, COLUMN_TYPES[time_column])))
+    if until is not None:
+        arrow_table = arrow_table.filter(pc.less(arrow_table[time_column], pa.scalar(until, COLUMN_TYPES[time_column])))
+    return arrow_table.select(selected)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m baby_tracker.snapshot", description="Write columnar snapshots of the tables.")
+    parser.add_argument("tables", nargs="*", help=f"Tables to snapshot, all of {', '.join(COLUMNS)} when left out.")
+    parser.add_argument("--db-file", default=DB_FILE)
+    parser.add_argument("--dir", default=SNAPSHOT_DIR)
+    parser.add_argument("--format", default="parquet", choices=list(FORMATS))
+    cmd_args = parser.parse_args(argv)
+    unknown_tables = set(cmd_args.tables) - set(COLUMNS)
+    if unknown_tables:
+        parser.error(f"Unknown tables: {', '.join(sorted(unknown_tables))}")
+
+    conn = db.init_db(db_file=cmd_args.db_file)
+    try:
+        written = snapshot(conn, cmd_args.dir, cmd_args.tables or tuple(COLUMNS), cmd_args.format)
+    finally:
+        conn.close()
+    for table, months in written.items():
+        print(f"{table}: {len(months)} months written {' '.join(months)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+"""Timestamp parsing for command arguments.
+
+The formats users actually type are matched by precompiled patterns, anything
+else falls back to dateparser, which is slow and imported on first use.
+"""
+import re
+from datetime import datetime, time, timedelta
+from functools import lru_cache
+from typing import Optional, Tuple, Union
+
+from baby_tracker import metrics
+
+CACHE_SIZE = 512
+
+CLOCK_PATTERN = re.compile(r"(?P<hour>\d{1,2})[:.](?P<minute>\d{2})|(?P<hour4>\d{2})(?P<minute4>\d{2})")
+DATE_PATTERN = re.compile(r"(?P<year>\d{4})-(?P<month>\d{2})-(?P<day>\d{2})")
+DATETIME_PATTERN = re.compile(
+    r"(?P<year>\d{4})-(?P<month>\d{2})-(?P<day>\d{2})[ T](?P<hour>\d{1,2}):(?P<minute>\d{2})(:(?P<second>\d{2}))?"
+)
+RELATIVE_PATTERN = re.compile(r"-(?P<amount>\d+)\s*(?P<unit>m|min|h|d)")
+RELATIVE_UNITS = {"m": "minutes", "min": "minutes", "h": "hours", "d": "days"}
+# Two timestamps without dashes joined by one, e.g. 01:10-02:40.
+RANGE_PATTERN = re.compile(r"(?P<start>[^-\s]+)-(?P<end>[^-\s]+)")
+
+
+def parse(text: Union[str, datetime], now: Optional[datetime] = None) -> Optional[datetime]:
+    """Parse a timestamp argument, returning None when it is not a timestamp."""
+    if isinstance(text, datetime):
+        return text
+    now = now or datetime.now()
+    spec = _match_fast(text.strip().lower())
+    if spec is not None:
+        return _resolve(spec, now)
+    return _parse_fallback(text, now.replace(second=0, microsecond=0))
+
+
+def parse_range(text: str, now: Optional[datetime] = None) -> Optional[Tuple[datetime, datetime]]:
+    """Parse a range like 01:10-02:40 into its start and end, returning None when it is not a range.
+
+    A range of clock times ending before it starts, like 23:10-01:40, crosses
+    midnight and starts the day before.
+    """
+    match = RANGE_PATTERN.fullmatch(text.strip())
+    if not match:
+        return None
+    now = now or datetime.now()
+    start, end = parse(match.group("start"), now), parse(match.group("end"), now)
+    if start is None or end is None:
+        return None
+    start_spec, end_spec = _match_fast(match.group("start").lower()), _match_fast(match.group("end").lower())
+    if start_spec and end_spec and start_spec[0] == end_spec[0] == "clock" and end < start:
+        start -= timedelta(days=1)
+    return start, end
+
+
+def is_timestamp(text: str) -> bool:
+    return parse(text) is not None
+
+
+def cache_info():
+    return {"fast": _match_fast.cache_info(), "fallback": _parse_fallback.cache_info()}
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _match_fast(text):
+    """Match the common formats into a spec that does not depend on the current time."""
+    if text == "now":
+        return ("now",)
+    match = CLOCK_PATTERN.fullmatch(text)
+    if match:
+        hour = int(match.group("hour") or match.group("hour4"))
+        minute = int(match.group("minute") or match.group("minute4"))
+        if hour < 24 and minute < 60:
+            return ("clock", time(hour, minute))
+        return None
+    match = RELATIVE_PATTERN.fullmatch(text)
+    if match:
+        unit = RELATIVE_UNITS[match.group("unit")]
+        return ("relative", timedelta(**{unit: int(match.group("amount"))}))
+    match = DATETIME_PATTERN.fullmatch(text)
+    if match:
+        try:
+            return ("absolute", datetime(*(int(match.group(g) or 0) for g in ("year", "month", "day", "hour", "minute", "second"))))
+        except ValueError:
+            return None
+    match = DATE_PATTERN.fullmatch(text)
+    if match:
+        try:
+            return ("absolute", datetime(*(int(match.group(g)) for g in ("year", "month", "day"))))
+        except ValueError:
+            return None
+    return None
+
+
+def _resolve(spec, now):
+    kind, *values = spec
+    if kind == "now":
+        return now
+    if kind == "clock":
+        return datetime.combine(now.date(), values[0])
+    if kind == "relative":
+        return now - values[0]
+    return values[0]
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _parse_fallback(text, minute: datetime):
+    # The current minute is part of the cache key, since dateparser resolves
+    # relative expressions against the current time.
+    import dateparser as dp
+    return dp.parse(text)
+
+
+metrics.instrument_module(__name__, ["parse"])
@@ -1,5 +1,5 @@
 from datetime import datetime, timedelta
-import dateparser as dp
+from baby_tracker import timeparse
 
 
 def timedelta_to_seconds(timedelta):
@@ -42,5 +42,4 @@ def datetime_range(start=None, end=None):
 
 
 def is_timestamp(s):
-    out = dp.parse(s)
-    return out is not None
+    return timeparse.is_timestamp(s)
@@ -0,0 +1,47 @@
+"""Timings of the analyze.py aggregations and plots against the synthetic history."""
+import pytest
+
+from baby_tracker import analyze as an
+from baby_tracker import rollup
+
+
+@pytest.mark.parametrize("per_day", [an.total_duration_per_day, an.avg_duration_per_day, an.count_per_day])
+@pytest.mark.parametrize("window", [{}, {"n_days": 14}], ids=["all", "14 days"])
+def test_per_day_from_rollup(benchmark, db_conn, per_day, window):
+    benchmark(per_day, db_conn, "sleep", **window)
+
+
+@pytest.mark.parametrize("how", ["sum", "mean", "size"])
+def test_resample_all_records(benchmark, db_conn, how):
+    benchmark(an.resample_duration_table, db_conn, "feed", how)
+
+
+@pytest.mark.parametrize("load,args", [
+    (an.merge_duration_tables, (["feed", "sleep"],)),
+    (an.get_duration_table, ("sleep", 3, 4)),
+    (an.latest_n_intervals, ("feed",)),
+    (an.weight_growth_df, ()),
+    (rollup.latest_daily_total, ("feed",)),
+], ids=["merge_duration_tables", "get_duration_table", "latest_n_intervals", "weight_growth_df", "latest_daily_total"])
+def test_load(benchmark, db_conn, load, args):
+    benchmark(load, db_conn, *args)
+
+
+def test_rollup_rebuild(benchmark, db_conn):
+    benchmark(rollup.rebuild, db_conn, "feed")
+
+
+def test_duration_plot(benchmark, db_conn):
+    df = an.total_duration_per_day(db_conn, "sleep")
+    benchmark(lambda: an.duration_plot(df.copy(), title="Total", scale=1/3600))
+
+
+@pytest.mark.parametrize("n_days", [3, 14])
+def test_timeline_plot(benchmark, db_conn, n_days):
+    df = an.merge_duration_tables(db_conn, ["feed", "sleep"], n_days=n_days)
+    benchmark(an.timeline_plot, df)
+
+
+def test_growth_curves_plot(benchmark, db_conn):
+    df = an.weight_growth_df(db_conn)
+    benchmark(an.growth_curves_plot, df)
@@ -0,0 +1,87 @@
+"""Timings of the slash command handlers against the synthetic history."""
+import pytest
+from datetime import datetime, timedelta
+
+from baby_tracker import db
+from baby_tracker.feed import endpoints as feed
+from baby_tracker.feed.repository import create_feed
+from baby_tracker.sleep import endpoints as sleep
+from baby_tracker.router import registry
+from baby_tracker.router import weight
+from baby_tracker.router import poop
+
+
+def time_arg(minutes_ago):
+    return (datetime.now() - timedelta(minutes=minutes_ago)).strftime("%H:%M")
+
+
+@pytest.mark.parametrize("action,args", [
+    ("feed", ["ls", "10"]),
+    ("sleep", ["analyze", "tot", "14"]),
+    ("weight", ["z"]),
+    ("feed", [time_arg(30), time_arg(10)]),
+    ("poop", [datetime.now().strftime("%Y-%m-%d")]),
+], ids=["feed ls", "sleep analyze tot 14", "weight z", "feed create", "poop create"])
+def test_dispatch(benchmark, action, args):
+    """Finding the handler of a command, including parsing the timestamp of a create command."""
+    benchmark(lambda: registry.get_router(action).resolve(args))
+
+
+@pytest.mark.parametrize("handle,args", [
+    (feed.handle_feed_request, ["ls", "10"]),
+    (feed.handle_feed_request, ["status"]),
+    (sleep.handle_sleep_request, ["ls", "10"]),
+    (sleep.handle_sleep_request, ["status"]),
+    (weight.handle_weight_request, ["ls", "10"]),
+    (weight.handle_weight_request, ["z"]),
+    (poop.handle_poop_request, ["ls", "10"]),
+], ids=["feed ls", "feed status", "sleep ls", "sleep status", "weight ls", "weight z", "poop ls"])
+def test_read_commands(benchmark, db_conn, handle, args):
+    benchmark(handle, args, db_conn)
+
+
+@pytest.mark.parametrize("handle,args", [
+    (feed.handle_feed_request, [time_arg(30), time_arg(10)]),
+    (sleep.handle_sleep_request, [time_arg(90), time_arg(10)]),
+    (weight.handle_weight_request, [datetime.now().strftime("%Y-%m-%d"), "9500"]),
+    (poop.handle_poop_request, [datetime.now().strftime("%Y-%m-%d")]),
+], ids=["feed", "sleep", "weight", "poop"])
+def test_create_commands(benchmark, db_conn, handle, args):
+    benchmark(handle, args, db_conn)
+
+
+@pytest.mark.parametrize("handle,create", [
+    (feed.handle_feed_request, lambda conn: create_feed(conn, (datetime.now(), None, None))),
+    (sleep.handle_sleep_request, lambda conn: db.create_sleep(conn, (datetime.now(), None, None))),
+    (weight.handle_weight_request, lambda conn: db.create_weight(conn, (datetime.now(), 9500))),
+    (poop.handle_poop_request, lambda conn: db.create_poop(conn, datetime.now())),
+], ids=["feed", "sleep", "weight", "poop"])
+def test_delete_commands(benchmark, db_conn, handle, create):
+    benchmark.pedantic(handle, setup=lambda: ((["d", str(create(db_conn))], db_conn), {}), rounds=50)
+
+
+@pytest.mark.parametrize("handle,table", [
+    (feed.handle_feed_request, "feed"),
+    (sleep.handle_sleep_request, "sleep"),
+], ids=["feed", "sleep"])
+def test_start_and_end_commands(benchmark, db_conn, handle, table):
+    def start_and_end():
+        handle(["s", time_arg(20)], db_conn)
+        handle(["e", time_arg(5)], db_conn)
+    benchmark(start_and_end)
+
+
+@pytest.mark.parametrize("handle,args", [
+    (feed.handle_feed_request, ["analyze", "tot"]),
+    (feed.handle_feed_request, ["analyze", "avg", "14"]),
+    (feed.handle_feed_request, ["analyze", "cnt"]),
+    (feed.handle_feed_request, ["analyze", "tl"]),
+    (sleep.handle_sleep_request, ["analyze", "tot", "14"]),
+    (sleep.handle_sleep_request, ["analyze", "avg"]),
+    (sleep.handle_sleep_request, ["analyze", "cnt"]),
+    (weight.handle_weight_request, ["analyze"]),
+], ids=[
+    "feed tot", "feed avg 14 days", "feed cnt", "feed tl", "sleep tot 14 days", "sleep avg", "sleep cnt", "weight",
+])
+def test_analyze_commands(benchmark, db_conn, handle, args):
+    benchmark(handle, args, db_conn)
@@ -0,0 +1,53 @@
+import pytest
+
+from baby_tracker import db
+from baby_tracker import plot_cache
+from baby_tracker import render
+from baby_tracker import slack
+
+from benchmarks.generate_history import generate_history
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("history", "synthetic history of the benchmark database")
+    group.addoption("--history-years", type=float, default=2, help="Years of history (default 2).")
+    group.addoption("--history-scale", type=float, default=1, help="Multiplier of the records per day (default 1).")
+    group.addoption("--timestamp-storage", default=db.TEXT_STORAGE, choices=list(db.TIMESTAMP_COLUMN_TYPES))
+
+
+def pytest_benchmark_update_json(config, benchmarks, output_json):
+    output_json["history"] = {
+        "years": config.getoption("--history-years"),
+        "scale": config.getoption("--history-scale"),
+        "timestamp_storage": config.getoption("--timestamp-storage"),
+    }
+
+
+@pytest.fixture(scope="session")
+def history_db_file(request, tmp_path_factory):
+    db_file = str(tmp_path_factory.mktemp("history") / "db.sqlite")
+    timestamp_storage = request.config.getoption("--timestamp-storage")
+    conn = db.init_db(db_file=db_file, timestamp_storage=timestamp_storage)
+    generate_history(conn, request.config.getoption("--history-years"), request.config.getoption("--history-scale"))
+    conn.close()
+    return db_file, timestamp_storage
+
+
+@pytest.fixture
+def db_conn(history_db_file):
+    db_file, timestamp_storage = history_db_file
+    _db_conn = db.init_db(db_file=db_file, timestamp_storage=timestamp_storage)
+    yield _db_conn
+    _db_conn.close()
+
+
+@pytest.fixture(autouse=True)
+def no_slack_uploads(monkeypatch):
+    monkeypatch.setattr(slack, "post_file", lambda *args, **kwargs: None)
+
+
+@pytest.fixture(autouse=True)
+def uncached_inline_plots(monkeypatch, tmp_path):
+    """Every analyze command loads its data and renders, in this process so the profile includes it."""
+    monkeypatch.setattr(render, "RENDER_WORKERS", 0)
+    monkeypatch.setattr(plot_cache, "_plot_cache", plot_cache.PlotCache(str(tmp_path / "plots"), max_bytes=0))
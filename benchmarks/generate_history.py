@@ -0,0 +1,106 @@
+"""Fill a database with a synthetic multi-year history for benchmarks.
+
+    python -m benchmarks.generate_history --db-file ./bench.sqlite --years 3 --scale 10
+
+At scale 1 a day has about 9 feeds, 6 sleeps and 4 poops, and the baby is
+weighed once a week, roughly 7000 rows a year. The scale multiplies the number
+of records per day, so --years 3 --scale 50 gives about a million rows. The
+history ends now, so windows like the last 3 days hit the latest records.
+"""
+import argparse
+import math
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from baby_tracker import db
+from baby_tracker import bulk_import
+from baby_tracker import DB_TIMESTAMP_STORAGE
+
+
+FEEDS_PER_DAY = 9
+SLEEPS_PER_DAY = 6
+POOPS_PER_DAY = 4
+WEIGHINGS_PER_DAY = 1 / 7
+# Share of the duration records that are never ended.
+OPEN_RECORD_SHARE = 0.005
+BIRTH_WEIGHT = 3300
+
+
+def _spread(rng, start, end, per_day):
+    """Start times of events per_day times a day between start and end, with jitter."""
+    interval = timedelta(days=1) / per_day
+    n_events = int((end - start) / interval)
+    for i in range(n_events):
+        yield (start + interval * (i + rng.random() * 0.5)).replace(microsecond=0), interval
+
+
+def duration_rows(rng, start, end, per_day, min_minutes, max_minutes):
+    """Rows of (from_time, to_time, duration, created_at, updated_at) like the bulk importer takes."""
+    for from_time, interval in _spread(rng, start, end, per_day):
+        # Records of one table do not overlap, even at a large scale.
+        max_duration = min(timedelta(minutes=max_minutes), interval * 0.45)
+        duration = min(timedelta(minutes=rng.uniform(min_minutes, max_minutes)), max_duration)
+        if rng.random() < OPEN_RECORD_SHARE:
+            yield (from_time, None, None, from_time + timedelta(seconds=5), None)
+            continue
+        to_time = from_time + duration
+        created_at = to_time + timedelta(seconds=rng.randint(5, 600))
+        yield (from_time, to_time, int(duration.total_seconds()), created_at, None)
+
+
+def weight_rows(rng, start, end, per_day):
+    for timestamp, _ in _spread(rng, start, end, per_day):
+        age_days = (timestamp - start).days
+        weight = BIRTH_WEIGHT + 9000 * (1 - math.exp(-age_days / 400)) + rng.gauss(0, 50)
+        yield (timestamp, int(weight), timestamp + timedelta(minutes=1), None)
+
+
+def poop_rows(rng, start, end, per_day):
+    for timestamp, _ in _spread(rng, start, end, per_day):
+        yield (timestamp, timestamp + timedelta(minutes=2), None)
+
+
+def generate_history(conn, years, scale=1, end=None, seed=0, batch_size=bulk_import.BATCH_SIZE):
+    """Replace the records of all tables with a synthetic history of the given length.
+
+    :return: dict with the number of rows per table.
+    """
+    rng = random.Random(seed)
+    end = end or datetime.now().replace(microsecond=0)
+    start = end - timedelta(days=365 * years)
+    rows = {
+        "feed": duration_rows(rng, start, end, FEEDS_PER_DAY * scale, 5, 40),
+        "sleep": duration_rows(rng, start, end, SLEEPS_PER_DAY * scale, 20, 240),
+        "weight": weight_rows(rng, start, end, WEIGHINGS_PER_DAY * scale),
+        "poop": poop_rows(rng, start, end, POOPS_PER_DAY * scale),
+    }
+    return {
+        table: bulk_import.load_table(conn, table, table_rows, batch_size=batch_size, replace=True)
+        for table, table_rows in rows.items()
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.generate_history", description=__doc__.splitlines()[0])
+    parser.add_argument("--db-file", required=True)
+    parser.add_argument("--years", type=float, default=3)
+    parser.add_argument("--scale", type=float, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timestamp-storage", default=DB_TIMESTAMP_STORAGE, choices=list(db.TIMESTAMP_COLUMN_TYPES))
+    cmd_args = parser.parse_args(argv)
+
+    conn = db.init_db(db_file=cmd_args.db_file, timestamp_storage=cmd_args.timestamp_storage)
+    start = time.perf_counter()
+    counts = generate_history(conn, cmd_args.years, cmd_args.scale, seed=cmd_args.seed)
+    conn.close()
+    seconds = time.perf_counter() - start
+    for table, n_rows in counts.items():
+        print(f"{table}: {n_rows} rows")
+    print(f"Total: {sum(counts.values())} rows in {seconds:.2f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,289 @@
+"""Load test of the slash command endpoints.
+
+    python -m benchmarks.loadtest --rate 50 --n-requests 2000 --concurrency 8
+    python -m benchmarks.loadtest --url http://localhost:5000 --replay recorded.jsonl --stub-port 8099
+
+Form posts to /babytracker/<action> are sent at a fixed rate, either as a
+synthetic mix of commands or replayed from a JSONL file with an "action" and a
+"text" per line. By default the Flask app of baby_tracker.serve runs in this
+process on a database with a synthetic history. With --url the posts go to a
+running server, which should be started with SLACK_API_URL pointing at the
+stub (http://127.0.0.1:<--stub-port>).
+
+A local stub stands in for the Slack API, so plot uploads and the delayed
+responses of deferred commands never leave the machine.
+
+Latency is measured from the time a request was scheduled to be sent, so
+time spent waiting for a free worker counts as latency and an overloaded
+server shows up in the tail instead of as a lower request rate.
+"""
+import argparse
+import json
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import requests
+from prettytable import PrettyTable
+
+from benchmarks.generate_history import generate_history
+from tests.slack_stub import StubSlack
+
+
+# (weight, action, text) of the synthetic mix. The text is formatted with the
+# values of clock_values when the commands are generated.
+SYNTHETIC_MIX = [
+    (25, "feed", "{start} {end}"),
+    (15, "sleep", "{start} {end}"),
+    (10, "feed", "ls 10"),
+    (5, "sleep", "ls 10"),
+    (10, "feed", "status"),
+    (5, "sleep", "status"),
+    (5, "poop", "{date}"),
+    (2, "poop", "ls"),
+    (2, "weight", "{date} 9500"),
+    (3, "weight", "ls"),
+    (3, "weight", "z"),
+    (4, "feed", "analyze tot 14"),
+    (3, "sleep", "analyze avg"),
+    (3, "feed", "analyze tl"),
+    (2, "weight", "analyze"),
+]
+PERCENTILES = (50, 95, 99)
+
+
+class InProcessTarget:
+    """Posts to a Flask app through a test client per worker thread."""
+
+    def __init__(self, app):
+        self.app = app
+        self._local = threading.local()
+
+    def post(self, path, form):
+        client = getattr(self._local, "client", None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        resp = client.post(path, data=form)
+        return resp.status_code, resp.get_json(silent=True)
+
+
+class HttpTarget:
+    """Posts to a running server through a session per worker thread."""
+
+    def __init__(self, base_url, timeout=60):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def post(self, path, form):
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        resp = session.post(self.base_url + path, data=form, timeout=self.timeout)
+        try:
+            return resp.status_code, resp.json()
+        except ValueError:
+            return resp.status_code, None
+
+
+def clock_values(now=None):
+    now = now or datetime.now()
+    return {
+        "start": (now - timedelta(minutes=30)).strftime("%H:%M"),
+        "end": (now - timedelta(minutes=10)).strftime("%H:%M"),
+        "date": now.strftime("%Y-%m-%d"),
+    }
+
+
+def synthetic_commands(n_requests, seed=0):
+    """(action, text) of n_requests commands drawn from SYNTHETIC_MIX."""
+    rng = random.Random(seed)
+    weights = [weight for weight, _, _ in SYNTHETIC_MIX]
+    for weight, action, text in rng.choices(SYNTHETIC_MIX, weights=weights, k=n_requests):
+        yield action, text.format(**clock_values())
+
+
+def recorded_commands(path, n_requests=None):
+    """(action, text) of the commands in a JSONL file, repeated until there are n_requests."""
+    with open(path) as jsonl_file:
+        records = [json.loads(line) for line in jsonl_file if line.strip()]
+    commands = [(record["action"], record.get("text", "")) for record in records]
+    if not commands:
+        raise ValueError(f"{path} holds no commands")
+    n_requests = n_requests or len(commands)
+    for i in range(n_requests):
+        yield commands[i % len(commands)]
+
+
+def command_label(action, text):
+    """Name of the command for the per-command breakdown, e.g. 'feed ls' or 'feed create'."""
+    words = text.split()
+    if not words:
+        return f"{action} help"
+    if words[0][0].isdigit():
+        return f"{action} create"
+    return " ".join([action, *words[:2]]) if words[0] == "analyze" else f"{action} {words[0]}"
+
+
+def is_error(status, body):
+    if status >= 400 or body is None:
+        return status >= 400
+    return str(body.get("text", "")).startswith(":exclamation:")
+
+
+def run_load(target, commands, rate, concurrency, response_url=None):
+    """Send the commands at rate requests per second from concurrency worker threads.
+
+    :return: (results, elapsed seconds) where results are (label, latency seconds, error) tuples.
+    """
+    commands = list(commands)
+    results = []
+    results_lock = threading.Lock()
+    next_index = iter(range(len(commands)))
+    index_lock = threading.Lock()
+    start = time.perf_counter()
+
+    def worker():
+        while True:
+            with index_lock:
+                i = next(next_index, None)
+            if i is None:
+                return
+            scheduled = start + i / rate
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            action, text = commands[i]
+            form = {"text": text, "channel_id": "C-LOADTEST", "user_id": "U-LOADTEST"}
+            if response_url:
+                form["response_url"] = response_url
+            try:
+                status, body = target.post(f"/babytracker/{action}", form)
+                error = is_error(status, body)
+            except Exception:
+                error = True
+            latency = time.perf_counter() - scheduled
+            with results_lock:
+                results.append((command_label(action, text), latency, error))
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, time.perf_counter() - start
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of sorted values."""
+    rank = max(int(round(p / 100 * len(sorted_values))), 1)
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def latency_stats(results):
+    latencies = sorted(latency for _, latency, _ in results)
+    n_errors = sum(error for _, _, error in results)
+    stats = {"requests": len(results), "errors": n_errors, "error_rate": n_errors / len(results)}
+    for p in PERCENTILES:
+        stats[f"p{p}_ms"] = 1000 * percentile(latencies, p)
+    stats["max_ms"] = 1000 * latencies[-1]
+    return stats
+
+
+def summarize(results, elapsed):
+    by_label = defaultdict(list)
+    for result in results:
+        by_label[result[0]].append(result)
+    return {
+        "elapsed_s": elapsed,
+        "throughput_rps": len(results) / elapsed,
+        "overall": latency_stats(results),
+        "by_command": {label: latency_stats(label_results) for label, label_results in sorted(by_label.items())},
+    }
+
+
+def format_report(summary):
+    t = PrettyTable()
+    t.field_names = ["command", "requests", "errors", *[f"p{p} ms" for p in PERCENTILES], "max ms"]
+    t.align = "r"
+    t.align["command"] = "l"
+    rows = [*summary["by_command"].items(), ("all", summary["overall"])]
+    for label, stats in rows:
+        t.add_row([
+            label, stats["requests"], f"{stats['errors']} ({stats['error_rate']:.1%})",
+            *[f"{stats[f'p{p}_ms']:.1f}" for p in PERCENTILES], f"{stats['max_ms']:.1f}",
+        ])
+    return f"{t.get_string()}\n{summary['overall']['requests']} requests in {summary['elapsed_s']:.1f}s ({summary['throughput_rps']:.1f} requests/s)"
+
+
+def in_process_app(db_file, slack_api_url):
+    """The Flask app of baby_tracker.serve on db_file, uploading to slack_api_url."""
+    from baby_tracker import serve
+    from baby_tracker import slack
+    serve.DB_FILE = db_file
+    slack.set_client(slack.SlackClient(api_url=slack_api_url))
+    return serve.app
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.loadtest", description="Load test the slash command endpoints.")
+    parser.add_argument("--url", help="Base URL of a running server. Runs the app in this process when left out.")
+    parser.add_argument("--db-file", help="Database of the in-process app. A synthetic history is generated when left out.")
+    parser.add_argument("--history-years", type=float, default=2)
+    parser.add_argument("--history-scale", type=float, default=1)
+    parser.add_argument("--replay", metavar="JSONL", help="Commands to replay instead of the synthetic mix.")
+    parser.add_argument("--n-requests", type=int, default=500)
+    parser.add_argument("--rate", type=float, default=20, help="Requests per second.")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--stub-port", type=int, default=0)
+    parser.add_argument("--stub-latency", type=float, default=0.05, help="Seconds the Slack stub takes to answer.")
+    parser.add_argument("--json", metavar="PATH", help="Also write the summary as JSON.")
+    cmd_args = parser.parse_args(argv)
+
+    stub = StubSlack(port=cmd_args.stub_port, latency=cmd_args.stub_latency).start()
+    print(f"Slack stub listening on {stub.url}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if cmd_args.url:
+            target = HttpTarget(cmd_args.url)
+        else:
+            from baby_tracker import db
+            db_file = cmd_args.db_file
+            if db_file is None:
+                db_file = f"{tmp_dir}/db.sqlite"
+                conn = db.init_db(db_file=db_file)
+                generate_history(conn, cmd_args.history_years, cmd_args.history_scale, seed=cmd_args.seed)
+                conn.close()
+            target = InProcessTarget(in_process_app(db_file, stub.url))
+
+        if cmd_args.replay:
+            commands = recorded_commands(cmd_args.replay, cmd_args.n_requests)
+        else:
+            commands = synthetic_commands(cmd_args.n_requests, seed=cmd_args.seed)
+        results, elapsed = run_load(target, commands, cmd_args.rate, cmd_args.concurrency, response_url=f"{stub.url}/response")
+
+        if not cmd_args.url:
+            from baby_tracker import serve
+            from baby_tracker import render
+            from baby_tracker import slack
+            serve.get_job_queue().shutdown(wait=True)
+            slack.shutdown()
+            render.shutdown()
+    stub.stop()
+
+    summary = summarize(results, elapsed)
+    summary["slack_stub_requests"] = dict(stub.counts)
+    print(format_report(summary))
+    print(f"Slack stub requests: {dict(stub.counts)}")
+    if cmd_args.json:
+        with open(cmd_args.json, "w") as json_file:
+            json.dump(summary, json_file, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
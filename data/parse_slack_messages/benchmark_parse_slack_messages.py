@@ -0,0 +1,101 @@
+"""Benchmark the Slack export parser on a synthetic multi-year export.
+
+    python benchmark_parse_slack_messages.py --years 3
+
+Pass --module to time another version of the parser, e.g. an older one from
+git history:
+
+    git show <commit>:data/parse_slack_messages/parse_slack_messages.py > /tmp/psm_old.py
+    python benchmark_parse_slack_messages.py --module /tmp/psm_old.py
+"""
+import argparse
+import importlib.util
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+
+def make_export(path, years, seed=0):
+    """Write a synthetic export with about 20 messages a day and return the number of messages."""
+    rng = random.Random(seed)
+    templates = [
+        "Amme: {a}-{b}",
+        "Amme: {a}-{b}\nBøvse-øvning: {b}-{c}",
+        "Sov: {a}-{b}",
+        "S: {a}",
+        "F:{a}-{b} (edited) ",
+        "N: {a}-?",
+        "Lort: {a}",
+        "Lagt i lift: {a}",
+        "Vågen: {a}",
+    ]
+    n_messages = 0
+    day = datetime(2021, 5, 19)
+    with open(path, "w") as export:
+        for _ in range(int(years * 365)):
+            minutes = sorted(rng.sample(range(24 * 60), 20))
+            for minute in minutes:
+                posted = day + timedelta(minutes=minute)
+                start = posted - timedelta(minutes=rng.randint(10, 60))
+                clocks = {
+                    "a": start.strftime(rng.choice(["%H:%M", "%H.%M"])),
+                    "b": posted.strftime("%H:%M"),
+                    "c": (posted + timedelta(minutes=5)).strftime("%H.%M"),
+                }
+                username = rng.choice(["ph", "duffau"])
+                text = rng.choice(templates).format(**clocks)
+                export.write(f"\n\n{username}  {posted.strftime('%H:%M')}\n{text}")
+                n_messages += 1
+            day += timedelta(days=1)
+    return n_messages
+
+
+def load_parser(path):
+    spec = importlib.util.spec_from_file_location("parse_slack_messages_under_test", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def parse_export(psm, path):
+    n_messages, n_records = 0, 0
+    with open(path) as export:
+        if hasattr(psm, "read_messages"):
+            messages = psm.read_messages(export, psm.USERNAMES)
+        else:
+            messages = psm.split_messages(export.read(), psm.USERNAMES)
+        if hasattr(psm, "iter_timestamps"):
+            timestamped = psm.iter_timestamps(messages, psm.FIRST_MESSAGE_DATE, psm.USERNAMES)
+        else:
+            timestamped = zip(psm.infer_timestamps(messages, psm.FIRST_MESSAGE_DATE, psm.USERNAMES), messages)
+        for timestamp, msg in timestamped:
+            n_messages += 1
+            for record_txt in psm.extract_feed_recordings(msg):
+                psm.parse_feed_record(timestamp, record_txt)
+                n_records += 1
+            for record_txt in psm.extract_sleep_recordings(msg):
+                psm.parse_sleep_record(timestamp, record_txt)
+                n_records += 1
+    return n_messages, n_records
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--years", type=float, default=3)
+    parser.add_argument("--module", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "parse_slack_messages.py"))
+    cmd_args = parser.parse_args()
+
+    psm = load_parser(cmd_args.module)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "slack-messages.txt")
+        make_export(path, cmd_args.years)
+        start = time.perf_counter()
+        n_messages, n_records = parse_export(psm, path)
+        seconds = time.perf_counter() - start
+    print(f"{cmd_args.module}: {n_messages} messages, {n_records} records in {seconds:.2f}s ({n_messages / seconds:.0f} messages/s)")
+
+
+if __name__ == "__main__":
+    main()
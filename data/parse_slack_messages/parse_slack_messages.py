@@ -1,10 +1,13 @@
 import re
 import csv
-import itertools
+import io
+import os
+import json
+import argparse
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
 from datetime import datetime, date, time, timedelta
-import dateparser as dp
+from functools import lru_cache
 import zlib
-from copy import copy, deepcopy
 import pickle
 
 
@@ -13,67 +16,113 @@ USERNAMES = ["ph", "duffau"]
 FEED_PREFIX_PATTERNS = [r"Amme:\s*", r"Amme v:\s*", r"F:\s*", r"N:\s*"] 
 SLEEP_PREFIX_PATTERNS = [r"Sov:\s*", r"S:\s*", r"Lagt i lift:\s*e"]
 SKIP_EDIT = False
+EXPORT_FILE = "slack-messages.txt"
+EDIT_FILES = {"feed": "feed_edits.jsonl", "sleep": "sleep_edits.jsonl"}
+LEGACY_EDIT_FILES = {"feed": "feed_edits.pickle", "sleep": "sleep_edits.pickle"}
+CSV_FILES = {"feed": "../feed_slack_records.csv", "sleep": "../sleep_slack_records.csv"}
+REVIEW_QUEUE_FILE = "review_queue.jsonl"
+CHECKPOINT_DIR = "batch_checkpoints"
+CHUNK_DAYS = 7
+
+# A record is a prefix, a start clock, a separator and an end clock. A clock is
+# hour and minute separated by ':' or '.', where either may be '?', or '?' or HHMM.
+# Sleep records may leave out the hour, the minute or the end clock and may
+# separate the clocks with whitespace.
+FEED_CLOCK_PATTERN = r"(?:\d{1,2}|\?)[:.](?:\d{1,2}|\?)|\?|\d{4}"
+SLEEP_CLOCK_PATTERN = r"(?:\d{1,2}|\?|)[:.](?:\d{1,2}|\?|)|\?|\d{4}"
+FEED_RECORD_PATTERN = re.compile(
+    rf"(?:{'|'.join(FEED_PREFIX_PATTERNS)})(?:{FEED_CLOCK_PATTERN})-(?:{FEED_CLOCK_PATTERN})"
+)
+SLEEP_RECORD_PATTERN = re.compile(
+    rf"(?:{'|'.join(SLEEP_PREFIX_PATTERNS)})(?:{SLEEP_CLOCK_PATTERN})(?:-|\s*)(?:{SLEEP_CLOCK_PATTERN}|)"
+)
+# The same records as one alternative per combination of prefix, clocks and separator. Where a
+# record could end early or late, e.g. 'S: :45159', the first combination decides, not the first
+# end clock, so only this pattern ends sleep records where the parser always has.
+SLEEP_START_CLOCK_PATTERNS = [
+    h + sep + m for h in [r"\d{1,2}", r"\?", r""] for sep in [r":", r"\."] for m in [r"\d{1,2}", r"\?", r""]
+] + [r"\?", r"\d{4}"]
+SLEEP_RECORD_EXACT_PATTERN = re.compile("|".join(
+    prefix + start_clock + sep + end_clock
+    for prefix in SLEEP_PREFIX_PATTERNS
+    for start_clock in SLEEP_START_CLOCK_PATTERNS
+    for sep in [r"-", r"\s*", r""]
+    for end_clock in SLEEP_START_CLOCK_PATTERNS + [r""]
+))
+FEED_PREFIX_PATTERN = re.compile("|".join(FEED_PREFIX_PATTERNS))
+SLEEP_PREFIX_PATTERN = re.compile("|".join(SLEEP_PREFIX_PATTERNS))
+RECORD_SEP_PATTERN = re.compile(r"-")
+
+
+@lru_cache()
+def _header_pattern(usernames):
+    return re.compile(f"({'|'.join(usernames)})  (\\d{{2}}:\\d{{2}})")
+
+
+def read_messages(lines, usernames):
+    """Yield the messages of an export one at a time from an iterable of lines.
+
+    A message starts with a 'username  HH:MM' line after an empty line and
+    runs until the empty line before the next message.
+    """
+    header_pattern = _header_pattern(tuple(usernames))
+    message_lines = None
+    prev_line, prev_prev_line = None, None
+    for line in lines:
+        is_header = prev_line == "\n" and prev_prev_line is not None and header_pattern.match(line)
+        if is_header:
+            if message_lines is not None:
+                # The newline ending the last line and the empty line separate the messages.
+                message_lines.pop()
+                message_lines[-1] = message_lines[-1][:-1]
+                yield "".join(message_lines)
+            message_lines = []
+        if message_lines is not None:
+            message_lines.append(line)
+        prev_prev_line, prev_line = prev_line, line
+    if message_lines is not None:
+        yield "".join(message_lines)
 
 
 def split_messages(txt, usernames):
-    split_pattern = r"\n\n" + "(" + "|".join([f"{name}  \\d{{2}}:\\d{{2}}" for name in usernames])  + ")"
-    print("split_pattern:", split_pattern)
-    splits =  re.split(split_pattern, txt)
-    if splits[0] == "":
-        splits.pop(0)
-    return [s1+s2 for s1,s2 in zip(splits[0::2], splits[1::2])]
+    return list(read_messages(io.StringIO(txt), usernames))
 
-def infer_timestamps(messages, start_date, usernames):
-    timestamps = []
+
+def iter_timestamps(messages, start_date, usernames):
+    """Yield (timestamp, message), where the date advances when the clock goes backwards."""
     current_date = date.fromisoformat(start_date)
     prev_timestamp = datetime(1,1,1,0,0,0,0)
-    for i, msg in enumerate(messages):
+    for msg in messages:
         clock = extract_clock(msg, usernames)
-        if clock >= prev_timestamp.time():
-            timestamp = datetime.combine(current_date, clock)
-        else:
+        if clock < prev_timestamp.time():
             current_date += timedelta(days=1)
-            timestamp = datetime.combine(current_date, clock)
-        timestamps.append(timestamp)
+        timestamp = datetime.combine(current_date, clock)
+        yield timestamp, msg
         prev_timestamp = timestamp
-    return timestamps
+
+
+def infer_timestamps(messages, start_date, usernames):
+    return [timestamp for timestamp, _ in iter_timestamps(messages, start_date, usernames)]
 
 
 def extract_clock(message_text, usernames):
-    clock_matches = re.search(f"({'|'.join(usernames)})  (\\d{{2}}:\\d{{2}})", message_text)
+    clock_matches = _header_pattern(tuple(usernames)).search(message_text)
     clock = clock_matches.group(2)
     clock = time.fromisoformat(clock)
     return clock
 
 def extract_feed_recordings(message_text):
-    prefix_patterns = FEED_PREFIX_PATTERNS
-    hour_minute_sep_patterns = [r":", r"\."]
-    hour_minute_patterns = [r"\d{1,2}", r"\?"]
-    clock_patterns = itertools.product(hour_minute_patterns, hour_minute_sep_patterns, hour_minute_patterns) 
-    clock_patterns = ["".join([h,s,m]) for h,s,m in clock_patterns]
-    clock_patterns += [r"\?", r"\d{4}"]
-    sep_pattern = [r"-"]
-    patterns = itertools.product(prefix_patterns, clock_patterns, sep_pattern, clock_patterns)
-    patterns = ["".join([pre, clock1, sep, clock2]) for pre, clock1, sep, clock2 in patterns]
-    pattern = "|".join(patterns)
-    matches = re.findall(pattern, message_text)
-    return matches
+    return [match.group(0) for match in FEED_RECORD_PATTERN.finditer(message_text)]
 
 
 def extract_sleep_recordings(message_text):
-    prefix_patterns = SLEEP_PREFIX_PATTERNS 
-    hour_minute_sep_patterns = [r":", r"\."]
-    hour_minute_patterns = [r"\d{1,2}", r"\?", r""]
-    start_clock_patterns = itertools.product(hour_minute_patterns, hour_minute_sep_patterns, hour_minute_patterns) 
-    start_clock_patterns = ["".join([h,s,m]) for h,s,m in start_clock_patterns]
-    start_clock_patterns += [r"\?", r"\d{4}"]
-    end_clock_patterns = [p for p in start_clock_patterns] + [r""]
-    sep_pattern = [r"-", r"\s*", r""]
-    patterns = itertools.product(prefix_patterns, start_clock_patterns, sep_pattern, end_clock_patterns)
-    patterns = ["".join([pre, clock1, sep, clock2]) for pre, clock1, sep, clock2 in patterns]
-    pattern = "|".join(patterns)
-    matches = re.findall(pattern, message_text)
-    return matches
+    records, pos = [], 0
+    # The nested pattern finds the start of the next record fast, the exact one where it ends.
+    while (match := SLEEP_RECORD_PATTERN.search(message_text, pos)) is not None:
+        record = SLEEP_RECORD_EXACT_PATTERN.match(message_text, match.start()).group(0)
+        records.append(record)
+        pos = match.start() + len(record)
+    return records
 
 def parse_feed_record(message_timestamp, feed_record_txt):
     created_at = message_timestamp
@@ -114,18 +163,15 @@ def parse_sleep_record(message_timestamp, sleep_record_txt):
     return (from_time, to_time, created_at)
 
 def feed_from_and_to_time(feed_record_txt):
-    return _from_and_to_time(feed_record_txt, FEED_PREFIX_PATTERNS)
+    return _from_and_to_time(feed_record_txt, FEED_PREFIX_PATTERN)
 
 def sleep_from_and_to_time(feed_record_txt):
-    return _from_and_to_time(feed_record_txt, SLEEP_PREFIX_PATTERNS)
+    return _from_and_to_time(feed_record_txt, SLEEP_PREFIX_PATTERN)
 
-def _from_and_to_time(feed_record_txt, prefix_patterns):
-    prefix_pattern = "|".join(prefix_patterns)
-    feed_record_txt = re.sub(prefix_pattern, "", feed_record_txt)
+def _from_and_to_time(feed_record_txt, prefix_pattern):
+    feed_record_txt = prefix_pattern.sub("", feed_record_txt)
     feed_record_txt = feed_record_txt.strip()
-    sep_patterns = [r"-"]
-    sep_pattern = "|".join(sep_patterns)
-    splits = re.split(sep_pattern, feed_record_txt)
+    splits = RECORD_SEP_PATTERN.split(feed_record_txt)
 
     if len(splits) == 2:
         from_time, to_time = splits
@@ -202,105 +248,323 @@ def _checksum(text: str) -> str:
     checksum = zlib.adler32(text.encode())
     return f"0x{checksum:08X}"
 
-def main():
-    with open("slack-messages.txt") as txt_file:
-        txt = txt_file.read()
+def with_neighbours(timestamped_messages):
+    """Yield (previous message, (timestamp, message), next message), keeping only three messages in memory."""
+    prev_msg, current = None, None
+    for item in timestamped_messages:
+        if current is not None:
+            yield prev_msg, current, item[1]
+            prev_msg = current[1]
+        current = item
+    if current is not None:
+        yield prev_msg, current, None
+
+
+def encode_record(record):
+    return None if record is None else [ts.isoformat() if ts else None for ts in record]
+
+
+def decode_record(values):
+    return None if values is None else tuple(datetime.fromisoformat(v) if v else None for v in values)
+
+
+class EditStore:
+    """Append-only file of edit decisions, one JSON line per decision.
 
-    messages = split_messages(txt, USERNAMES)
-    timestamps = infer_timestamps(messages, FIRST_MESSAGE_DATE, USERNAMES)
+    The latest line of an edit id wins. Opening the file indexes the offset of
+    those lines, so a lookup reads one line and a decision is on disk as soon
+    as it is made. A record of None means the record was dropped.
+    """
+
+    def __init__(self, path, legacy_pickle_path=None):
+        self.path = path
+        self._index = {}
+        is_new = not os.path.exists(path)
+        self._file = open(path, "a+b")
+        self._file.seek(0)
+        offset = 0
+        for line in self._file:
+            try:
+                self._index[json.loads(line)["edit_id"]] = offset
+            except json.JSONDecodeError:
+                print(f"Ignoring a broken line at offset {offset} in {path}")
+            offset += len(line)
+        if is_new and legacy_pickle_path and os.path.exists(legacy_pickle_path):
+            with open(legacy_pickle_path, "rb") as pickle_file:
+                for edit_id, record in pickle.load(pickle_file).items():
+                    self.put(edit_id, record)
+
+    def __contains__(self, edit_id):
+        return edit_id in self._index
+
+    def __len__(self):
+        return len(self._index)
+
+    def get(self, edit_id, default=None):
+        offset = self._index.get(edit_id)
+        if offset is None:
+            return default
+        self._file.seek(offset)
+        return decode_record(json.loads(self._file.readline())["record"])
+
+    def put(self, edit_id, record):
+        line = json.dumps({"edit_id": edit_id, "record": encode_record(record)}) + "\n"
+        self._file.seek(0, os.SEEK_END)
+        offset = self._file.tell()
+        self._file.write(line.encode())
+        self._file.flush()
+        self._index[edit_id] = offset
+
+    def close(self):
+        self._file.close()
+
+
+def open_edit_stores():
+    return {kind: EditStore(path, LEGACY_EDIT_FILES[kind]) for kind, path in EDIT_FILES.items()}
+
+
+def chunk_by_days(timestamped_messages, chunk_days=CHUNK_DAYS):
+    """Group (timestamp, message) pairs into lists spanning chunk_days days.
+
+    The dates come from iter_timestamps, so chunks are cut after the date
+    roll-over has been inferred from the whole sequence of messages.
+    """
+    chunk, chunk_start = [], None
+    for timestamp, msg in timestamped_messages:
+        if chunk and (timestamp.date() - chunk_start).days >= chunk_days:
+            yield chunk
+            chunk = []
+        if not chunk:
+            chunk_start = timestamp.date()
+        chunk.append((timestamp, msg))
+    if chunk:
+        yield chunk
+
+
+def chunk_id(chunk):
+    """Name a chunk by its days and a checksum of its messages, so a changed export is parsed again."""
+    checksum = _checksum("".join(msg for _, msg in chunk))
+    return f"{chunk[0][0].date().isoformat()}_{chunk[-1][0].date().isoformat()}_{checksum}"
+
+
+def parse_chunk(chunk):
+    """Parse the records of a chunk.
+
+    :return: list of (kind, record, edit_id, timestamp, message), where edit_id
+        and message are None for records without missing timestamps.
+    """
+    parsed = []
+    for timestamp, msg in chunk:
+        for kind, extract, parse in [("feed", extract_feed_recordings, parse_feed_record), ("sleep", extract_sleep_recordings, parse_sleep_record)]:
+            for record_txt in extract(msg):
+                record = parse(timestamp, record_txt)
+                if None in record:
+                    parsed.append((kind, record, _checksum(msg + record_txt), timestamp, msg))
+                else:
+                    parsed.append((kind, record, None, None, None))
+    return parsed
+
+
+def _checkpoint_path(checkpoint_dir, chunk_name):
+    return os.path.join(checkpoint_dir, f"{chunk_name}.json")
+
+
+def save_checkpoint(checkpoint_dir, chunk_name, parsed):
+    rows = [
+        (kind, encode_record(record), edit_id, timestamp.isoformat() if timestamp else None, msg)
+        for kind, record, edit_id, timestamp, msg in parsed
+    ]
+    path = _checkpoint_path(checkpoint_dir, chunk_name)
+    with open(path + ".tmp", "w") as checkpoint_file:
+        json.dump(rows, checkpoint_file)
+    os.replace(path + ".tmp", path)
+
+
+def load_checkpoint(checkpoint_dir, chunk_name):
+    with open(_checkpoint_path(checkpoint_dir, chunk_name)) as checkpoint_file:
+        rows = json.load(checkpoint_file)
+    return [
+        (kind, decode_record(record), edit_id, datetime.fromisoformat(timestamp) if timestamp else None, msg)
+        for kind, record, edit_id, timestamp, msg in rows
+    ]
+
+
+def run_batch(workers=None, chunk_days=CHUNK_DAYS, checkpoint_dir=CHECKPOINT_DIR):
+    """Parse the export without prompting.
+
+    Chunks of days are parsed in a process pool and each result is saved as a
+    checkpoint, so a rerun only parses chunks without one. Stored edits are
+    applied and records still missing timestamps are written to the review
+    queue, to be resolved with --review.
+    """
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    workers = workers or os.cpu_count()
+    chunk_names, pending = [], {}
+    n_parsed_chunks = 0
+    with open(EXPORT_FILE) as txt_file, ProcessPoolExecutor(max_workers=workers) as executor:
+        timestamped_messages = iter_timestamps(read_messages(txt_file, USERNAMES), FIRST_MESSAGE_DATE, USERNAMES)
+        for chunk in chunk_by_days(timestamped_messages, chunk_days):
+            chunk_name = chunk_id(chunk)
+            chunk_names.append(chunk_name)
+            if os.path.exists(_checkpoint_path(checkpoint_dir, chunk_name)):
+                continue
+            pending[executor.submit(parse_chunk, chunk)] = chunk_name
+            n_parsed_chunks += 1
+            # Bound the number of chunks held in memory.
+            while len(pending) >= 2 * workers:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    save_checkpoint(checkpoint_dir, pending.pop(future), future.result())
+        for future in list(pending):
+            save_checkpoint(checkpoint_dir, pending.pop(future), future.result())
+
+    edit_stores = open_edit_stores()
+    n_records = {"feed": 0, "sleep": 0}
+    n_review = 0
+    csv_files = {kind: open(path, "w") for kind, path in CSV_FILES.items()}
+    csv_writers = {kind: csv.writer(csv_file) for kind, csv_file in csv_files.items()}
+    for csv_writer in csv_writers.values():
+        csv_writer.writerow(["from_time","to_time","created_at"])
+    with open(REVIEW_QUEUE_FILE, "w") as review_file:
+        for chunk_name in chunk_names:
+            for kind, record, edit_id, timestamp, msg in load_checkpoint(checkpoint_dir, chunk_name):
+                if edit_id is not None:
+                    if edit_id in edit_stores[kind]:
+                        record = edit_stores[kind].get(edit_id)
+                    else:
+                        review_item = {"kind": kind, "edit_id": edit_id, "timestamp": timestamp.isoformat(),
+                                       "message": msg, "record": encode_record(record)}
+                        review_file.write(json.dumps(review_item) + "\n")
+                        n_review += 1
+                if record is not None:
+                    csv_writers[kind].writerow(csv_format_duration_record(record))
+                    n_records[kind] += 1
+    for csv_file in csv_files.values():
+        csv_file.close()
+    for edit_store in edit_stores.values():
+        edit_store.close()
+
+    print(f"Parsed {n_parsed_chunks} of {len(chunk_names)} chunks, the rest were checkpointed")
+    print(f"Found {n_records['feed']} breastfeeding records")
+    print(f"Found {n_records['sleep']} sleep records")
+    print(f"{n_review} records to review in {REVIEW_QUEUE_FILE}")
+    return {"chunks": len(chunk_names), "parsed_chunks": n_parsed_chunks, "review": n_review, **n_records}
+
+
+def review():
+    """Prompt for the records in the review queue, storing each decision right away."""
+    edit_stores = open_edit_stores()
+    with open(REVIEW_QUEUE_FILE) as review_file:
+        for line in review_file:
+            item = json.loads(line)
+            edit_store = edit_stores[item["kind"]]
+            if item["edit_id"] in edit_store:
+                continue
+            print()
+            print("-"*15)
+            print(f"None in {item['kind'].capitalize()} record")
+            print_message(datetime.fromisoformat(item["timestamp"]), item["message"], "Current")
+            updated_record = prompt(decode_record(item["record"]))
+            if updated_record != "skip":
+                edit_store.put(item["edit_id"], updated_record)
+    for edit_store in edit_stores.values():
+        edit_store.close()
+
+
+def main():
+    txt_file = open(EXPORT_FILE)
+    messages = read_messages(txt_file, USERNAMES)
+    timestamped_messages = iter_timestamps(messages, FIRST_MESSAGE_DATE, USERNAMES)
     global feed_csv
     feed_csv = []
     global sleep_csv
     sleep_csv = []
 
-    try:
-        with open("feed_edits.pickle", "rb") as feed_edits_file:
-            global feed_edits 
-            feed_edits = pickle.load(feed_edits_file)
-    except FileNotFoundError:
-        feed_edits = {} 
-
-    try:
-        with open("sleep_edits.pickle", "rb") as sleep_edits_file:
-            global sleep_edits
-            sleep_edits = pickle.load(sleep_edits_file)
-    except FileNotFoundError:
-        sleep_edits = {} 
+    edit_stores = open_edit_stores()
+    feed_edits, sleep_edits = edit_stores["feed"], edit_stores["sleep"]
 
-    for i, (msg, timestamp) in enumerate(zip(messages, timestamps)):
+    n_messages, first_timestamp = 0, None
+    for prev_msg, (timestamp, msg), next_msg in with_neighbours(timestamped_messages):
+        n_messages += 1
+        first_timestamp = first_timestamp or timestamp
 
         feed_records_texts = extract_feed_recordings(msg)
         for feed_record_txt in feed_records_texts:
             feed_record = parse_feed_record(timestamp, feed_record_txt)
             if None in feed_record:
                 edit_id = _checksum(msg + feed_record_txt)
-                updated_feed_record = feed_edits.get(edit_id)
-                if not SKIP_EDIT:
-                    if not updated_feed_record:
-                        print()
-                        print("-"*15)
-                        print("None in Feed record")
-                        print_message(timestamp, messages[i-1] if i>0 else None, "Previous")
-                        print_message(timestamp, msg, "Current")
-                        print_message(timestamp, messages[i+1] if i+1<len(messages) else None, "Next")
-                        updated_feed_record = prompt(feed_record)
-                        if updated_feed_record != "skip":
-                            feed_edits[edit_id] = deepcopy(updated_feed_record)
-                            feed_record = updated_feed_record
-                    else:
+                # A stored decision of None drops the record.
+                if edit_id in feed_edits:
+                    feed_record = feed_edits.get(edit_id)
+                elif not SKIP_EDIT:
+                    print()
+                    print("-"*15)
+                    print("None in Feed record")
+                    print_message(timestamp, prev_msg, "Previous")
+                    print_message(timestamp, msg, "Current")
+                    print_message(timestamp, next_msg, "Next")
+                    updated_feed_record = prompt(feed_record)
+                    if updated_feed_record != "skip":
+                        feed_edits.put(edit_id, updated_feed_record)
                         feed_record = updated_feed_record
-            feed_csv.append(csv_format_duration_record(feed_record))
+            if feed_record is not None:
+                feed_csv.append(csv_format_duration_record(feed_record))
 
         sleep_records_texts = extract_sleep_recordings(msg)
         for sleep_records_txt in sleep_records_texts:
             sleep_record = parse_sleep_record(timestamp, sleep_records_txt)
             if None in sleep_record:
                 edit_id = _checksum(msg+sleep_records_txt)
-                updated_sleep_record = sleep_edits.get(edit_id)
-                if not SKIP_EDIT:
-                    if not updated_sleep_record:
-                        print()
-                        print("-"*15)
-                        print("None in Sleep record")
-                        print_message(timestamp, messages[i-1] if i>0 else None, "Previous")
-                        print_message(timestamp, msg, "Current")
-                        print_message(timestamp, messages[i+1] if i+1<len(messages) else None, "Next")
-                        updated_sleep_record = prompt(sleep_record)
-                        if updated_sleep_record != "skip":
-                            sleep_edits[edit_id] = deepcopy(updated_sleep_record)
-                            sleep_record = updated_sleep_record
-                    else:
+                # A stored decision of None drops the record.
+                if edit_id in sleep_edits:
+                    sleep_record = sleep_edits.get(edit_id)
+                elif not SKIP_EDIT:
+                    print()
+                    print("-"*15)
+                    print("None in Sleep record")
+                    print_message(timestamp, prev_msg, "Previous")
+                    print_message(timestamp, msg, "Current")
+                    print_message(timestamp, next_msg, "Next")
+                    updated_sleep_record = prompt(sleep_record)
+                    if updated_sleep_record != "skip":
+                        sleep_edits.put(edit_id, updated_sleep_record)
                         sleep_record = updated_sleep_record
-            sleep_csv.append(csv_format_duration_record(sleep_record))
-
-    print(f"Found {len(timestamps)} timstamps")
-    print(f"Found {len(messages)} messages.")
-    print(f"First timestamp: {timestamps[0]}")
-    print(f"Last timestamp: {timestamps[-1]}")
+            if sleep_record is not None:
+                sleep_csv.append(csv_format_duration_record(sleep_record))
+
+    txt_file.close()
+    for edit_store in edit_stores.values():
+        edit_store.close()
+    print(f"Found {n_messages} timstamps")
+    print(f"Found {n_messages} messages.")
+    print(f"First timestamp: {first_timestamp}")
+    print(f"Last timestamp: {timestamp}")
     print(f"Found {len(feed_csv)} breastfeeding records")
     print(f"Found {len(sleep_csv)} sleep records")
 
 if __name__ == "__main__":
-    import sys
-    cmd_args = sys.argv
-    cmd_flags = [arg for arg in cmd_args if arg.startswith("--")] 
-    try:
-        if "--skip" in set(cmd_flags):
-            SKIP_EDIT = True
-        main()
-    finally:
-        with open("../feed_slack_records.csv", "w") as feed_csv_file:
-            feed_csv_writer = csv.writer(feed_csv_file)
-            feed_csv_writer.writerow(["from_time","to_time","created_at"])
-            feed_csv_writer.writerows(feed_csv)
-
-        with open("../sleep_slack_records.csv", "w") as sleep_csv_file:
-            sleep_csv_writer = csv.writer(sleep_csv_file)
-            sleep_csv_writer.writerow(["from_time","to_time","created_at"])
-            sleep_csv_writer.writerows(sleep_csv)
-
-        with open("feed_edits.pickle", "wb") as feed_edits_file:
-            pickle.dump(feed_edits, feed_edits_file)
-
-        with open("sleep_edits.pickle", "wb") as sleep_edits_file:
-            pickle.dump(sleep_edits, sleep_edits_file)   
+    parser = argparse.ArgumentParser(description="Parse feed and sleep records from the Slack export.")
+    parser.add_argument("--skip", action="store_true", help="Do not prompt for records with missing timestamps.")
+    parser.add_argument("--batch", action="store_true", help="Parse in parallel and resumably, queueing records for review.")
+    parser.add_argument("--review", action="store_true", help="Prompt for the records queued by --batch.")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--chunk-days", type=int, default=CHUNK_DAYS)
+    cmd_args = parser.parse_args()
+    if cmd_args.batch:
+        run_batch(workers=cmd_args.workers, chunk_days=cmd_args.chunk_days)
+    elif cmd_args.review:
+        review()
+    else:
+        SKIP_EDIT = cmd_args.skip
+        try:
+            main()
+        finally:
+            with open(CSV_FILES["feed"], "w") as feed_csv_file:
+                feed_csv_writer = csv.writer(feed_csv_file)
+                feed_csv_writer.writerow(["from_time","to_time","created_at"])
+                feed_csv_writer.writerows(feed_csv)
+
+            with open(CSV_FILES["sleep"], "w") as sleep_csv_file:
+                sleep_csv_writer = csv.writer(sleep_csv_file)
+                sleep_csv_writer.writerow(["from_time","to_time","created_at"])
+                sleep_csv_writer.writerows(sleep_csv)
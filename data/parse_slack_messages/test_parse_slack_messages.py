@@ -1,7 +1,10 @@
+import pytest
 from pytest_cases import parametrize_with_cases
 
-import data.parse_slack_messages as psm
+import data.parse_slack_messages.parse_slack_messages as psm
 from datetime import datetime
+import json
+import pickle
 
 
 def test_split_messages():
@@ -26,6 +29,18 @@ Amme start: 19:40
     assert messages[1].startswith("ph  16:48")
     assert messages[2].startswith("duffau  19:41")
 
+def test_read_messages_from_lines():
+    lines = iter([
+        "\n", "\n",
+        "ph  16:29\n", "Amme: 13:?-14:45\n", "\n",
+        "ph  16:48\n", "Sov: 14:45-16:45\n", "\n",
+        "\n",
+        "duffau  19:41\n", "Amme start: 19:40\n",
+    ])
+    messages = psm.read_messages(lines, psm.USERNAMES)
+    assert next(messages) == "ph  16:29\nAmme: 13:?-14:45"
+    assert list(messages) == ["ph  16:48\nSov: 14:45-16:45\n", "duffau  19:41\nAmme start: 19:40\n"]
+
 def test_infer_timestamps_same_day():
     messages = [
         "ph  16:48\nSov: 14:45-16:45",
@@ -132,9 +147,100 @@ class MessageTextSleepRecords:
         expected_records = ["Sov: 05:17"] 
         return message_text, expected_records
 
+    def case_run_on_digits_end_as_before(self):
+        # Records that could end at several digits end where the flat alternation of the first parser ended them.
+        message_text = "S: :45159\nS:10.55591\nSov: 12:3045\nS: 1.2.3-4"
+        expected_records = ["S: :45159", "S:10.55591", "Sov: 12:30", "S: 1.2.3"]
+        return message_text, expected_records
+
 @parametrize_with_cases("message_text,expected_records", cases=MessageTextSleepRecords)
 def test_find_sleep_recordings(message_text, expected_records):
     record_strings = psm.extract_sleep_recordings(message_text)
     for s in record_strings:
         print(s)
     assert record_strings == expected_records
+
+
+def test_edit_store_latest_decision_wins(tmp_path):
+    path = str(tmp_path / "edits.jsonl")
+    store = psm.EditStore(path)
+    store.put("0x1", (None, datetime(2021, 5, 19, 14, 45), datetime(2021, 5, 19, 16, 29)))
+    store.put("0x2", None)
+    store.put("0x1", (datetime(2021, 5, 19, 14, 0), datetime(2021, 5, 19, 14, 45), datetime(2021, 5, 19, 16, 29)))
+    store.close()
+
+    store = psm.EditStore(path)
+    assert len(store) == 2
+    assert store.get("0x1")[0] == datetime(2021, 5, 19, 14, 0)
+    assert "0x2" in store and store.get("0x2") is None
+    assert store.get("0x3", "missing") == "missing"
+    store.close()
+
+
+def test_edit_store_imports_legacy_pickle(tmp_path):
+    pickle_path = tmp_path / "edits.pickle"
+    record = (datetime(2021, 5, 22, 22, 32), None, datetime(2021, 5, 22, 22, 55))
+    pickle_path.write_bytes(pickle.dumps({"0xB405104C": record}))
+    store = psm.EditStore(str(tmp_path / "edits.jsonl"), str(pickle_path))
+    assert store.get("0xB405104C") == record
+    store.close()
+
+
+def test_chunk_by_days_follows_inferred_dates():
+    messages = ["ph  22:01\nHello", "ph  23:48\nSov: 23:45-02:45", "duffau  02:54\nAmme: 02:51-03:00", "ph  03:04\nS: 3:04"]
+    timestamped = psm.iter_timestamps(messages, psm.FIRST_MESSAGE_DATE, psm.USERNAMES)
+    chunks = list(psm.chunk_by_days(timestamped, chunk_days=1))
+    assert [[msg for _, msg in chunk] for chunk in chunks] == [messages[:2], messages[2:]]
+
+
+def test_run_batch_resumes_from_checkpoints(tmp_path, monkeypatch):
+    export = """
+
+ph  16:29
+Amme: 13:?-14:45
+
+ph  16:48
+Sov: 14:45-16:45
+
+duffau  19:41
+Amme: 19:20-19:40
+
+ph  08:50
+Amme: 07:?-08:40
+"""
+    (tmp_path / "parse").mkdir()
+    (tmp_path / "parse" / "slack-messages.txt").write_text(export)
+    monkeypatch.chdir(tmp_path / "parse")
+    stats = psm.run_batch(workers=2, chunk_days=1)
+    assert stats == {"chunks": 2, "parsed_chunks": 2, "review": 2, "feed": 3, "sleep": 1}
+    assert psm.run_batch(workers=2, chunk_days=1)["parsed_chunks"] == 0
+
+    with open(psm.REVIEW_QUEUE_FILE) as review_file:
+        item = json.loads(review_file.readline())
+    store = psm.EditStore(psm.EDIT_FILES["feed"])
+    store.put(item["edit_id"], None)
+    store.close()
+    stats = psm.run_batch(workers=2, chunk_days=1)
+    assert (stats["review"], stats["feed"]) == (1, 2)
+
+
+def test_main_applies_stored_drops(tmp_path, monkeypatch):
+    export = """
+
+ph  16:29
+Amme: 13:?-14:45
+
+duffau  19:41
+Amme: 19:20-19:40
+"""
+    (tmp_path / "slack-messages.txt").write_text(export)
+    monkeypatch.chdir(tmp_path)
+    store = psm.EditStore(psm.EDIT_FILES["feed"])
+    store.put(psm._checksum("ph  16:29\nAmme: 13:?-14:45" + "Amme: 13:?-14:45"), None)
+    store.close()
+    # A dropped record is neither prompted for again nor kept.
+    monkeypatch.setattr("builtins.input", lambda *args: pytest.fail("prompted for a dropped record"))
+    for skip_edit in [False, True]:
+        monkeypatch.setattr(psm, "SKIP_EDIT", skip_edit)
+        psm.main()
+        assert psm.feed_csv == [["2021-05-19 19:20", "2021-05-19 19:40", "2021-05-19 19:41"]]
@@ -15,6 +15,8 @@ deploy()
     scp requirements.txt $USER@$REMOTE_HOST:${DEPLOY_DIR}/
     scp main.sh $USER@$REMOTE_HOST:${DEPLOY_DIR}/
     rsync -rav -e ssh  --exclude='__pycache__' ./baby_tracker $USER@$REMOTE_HOST:${DEPLOY_DIR}/
+    ssh $USER@$REMOTE_HOST "mkdir -p ${DEPLOY_DIR}/data"
+    rsync -rav -e ssh ./data/growth-curves $USER@$REMOTE_HOST:${DEPLOY_DIR}/data/
     scp create-venv.sh $USER@$REMOTE_HOST:${DEPLOY_DIR}/
 
     if [ $INSTALL_DEPS == 0 ]
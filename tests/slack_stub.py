@@ -0,0 +1,68 @@
+"""Local stand-in for the Slack API, shared by the unit tests and benchmarks.loadtest."""
+import json
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubSlack:
+    """Local stand-in for the Slack API and the response_url of slash commands.
+
+    Every POST is answered with {"ok": true} after an optional delay and counted
+    by path, unless a scripted response was queued with respond_next. Connections
+    are kept alive and the client addresses are recorded in connections.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0):
+        self.latency = latency
+        self.counts = defaultdict(int)
+        self.connections = set()
+        self._scripted = []
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                with stub._lock:
+                    stub.counts[self.path.split("?")[0]] += 1
+                    stub.connections.add(self.client_address)
+                    status, headers, body = stub._scripted.pop(0) if stub._scripted else (200, {}, {"ok": True})
+                if stub.latency:
+                    time.sleep(stub.latency)
+                body = json.dumps(body).encode()
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+
+    def respond_next(self, status, headers=None, body=None):
+        """Answer the next POST without a scripted response with status, headers and a JSON body."""
+        with self._lock:
+            self._scripted.append((status, headers or {}, body if body is not None else {"ok": status < 400}))
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
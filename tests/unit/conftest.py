@@ -0,0 +1,20 @@
+import pytest
+
+from baby_tracker import db
+from tests.slack_stub import StubSlack
+
+
+@pytest.fixture(params=[db.TEXT_STORAGE, db.EPOCH_US_STORAGE])
+def db_conn(request):
+    """An empty in-memory database, once with each timestamp storage."""
+    _db_conn = db.init_db(db_file=":memory:", timestamp_storage=request.param)
+    yield _db_conn
+    _db_conn.close()
+
+
+@pytest.fixture
+def stub():
+    """A local Slack API, see tests/slack_stub.py."""
+    _stub = StubSlack().start()
+    yield _stub
+    _stub.stop()
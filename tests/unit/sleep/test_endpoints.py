@@ -43,3 +43,21 @@ def test_handle_end_sleep_produces_valid_response_with_active_sleep_stretch(db_c
     endpoints.create_sleep_record([from_time], db_conn)
     resp = endpoints.handle_sleep_request(["end"], db_conn)
     assert "error" not in resp["text"]
+
+
+def test_sleep_ranges_report_invalid_rows(db_conn):
+    resp = endpoints.handle_sleep_request(["01:10-02:40", "03:15-02:50", "03:15-05:50", "01:00-12:00"], db_conn)
+    assert "Sleep records created with Ids: *1, 2*" in resp["text"]
+    # Ending before the start, the range crosses midnight.
+    assert "`03:15-02:50`: Sleep duration must be less than" in resp["text"]
+    assert "`01:00-12:00`: Sleep duration must be less than" in resp["text"]
+    durations = [row[3] for row in db.get_latest_sleep_records(db_conn, 5)]
+    assert durations == [timedelta(hours=2, minutes=35), timedelta(hours=1, minutes=30)]
+
+
+def test_sleep_range_across_midnight(db_conn):
+    resp = endpoints.handle_sleep_request(["23:10-01:40"], db_conn)
+    assert "Sleep records created with Ids: *1*" in resp["text"]
+    _id, from_time, to_time, duration, *_ = db.get_latest_sleep_records(db_conn, 1)[0]
+    assert duration == timedelta(hours=2, minutes=30)
+    assert to_time.date() == datetime.now().date() and from_time.date() == to_time.date() - timedelta(days=1)
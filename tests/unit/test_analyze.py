@@ -0,0 +1,79 @@
+import pytest
+import pandas as pd
+from datetime import date, datetime, timedelta
+
+from baby_tracker import db
+from baby_tracker import analyze as an
+
+
+def make_record(from_time, minutes):
+    duration = timedelta(minutes=minutes) if minutes is not None else None
+    to_time = from_time + duration if duration is not None else None
+    return (from_time, to_time, duration)
+
+
+def create_days(db_conn, first_day, n_days, table="feed"):
+    for i in range(n_days):
+        day = datetime.combine(first_day + timedelta(days=i), an.START_OF_DAY)
+        db._create_duration_record(db_conn, make_record(day + timedelta(hours=2), 10 + i), table)
+        db._create_duration_record(db_conn, make_record(day + timedelta(hours=20), 20), table)
+
+
+def test_time_window():
+    today = date.today()
+    assert an.time_window() == (None, None)
+    assert an.time_window(from_time=datetime(2024, 2, 1)) == (datetime(2024, 2, 1), None)
+    assert an.time_window(n_days=3) == (datetime.combine(today - timedelta(days=2), an.START_OF_DAY), None)
+    from_time, _ = an.time_window(n_weeks=1)
+    assert from_time.weekday() == 0 and (today - from_time.date()).days == 7 + today.weekday()
+
+
+def test_df_from_db_table_window_and_dtypes(db_conn):
+    create_days(db_conn, date(2024, 2, 1), 5)
+    df = an.df_from_db_table(
+        db_conn, "feed", columns=["from_time", "duration"],
+        from_time=datetime(2024, 2, 2, 6), until=datetime(2024, 2, 4, 6)
+    )
+    assert list(df.columns) == ["from_time", "duration"]
+    assert list(df.from_time) == [
+        datetime(2024, 2, 2, 8), datetime(2024, 2, 3, 2), datetime(2024, 2, 3, 8), datetime(2024, 2, 4, 2)
+    ]
+    assert df.duration.dtype == "float64"
+
+    empty = an.df_from_db_table(db_conn, "feed", columns=["from_time", "to_time", "duration"], from_time=datetime(2025, 1, 1))
+    assert empty.empty
+    assert pd.api.types.is_datetime64_any_dtype(empty.from_time)
+    assert empty.duration.dtype == "float64"
+
+
+def test_latest_n_intervals_takes_the_latest_records(db_conn):
+    create_days(db_conn, date(2024, 2, 1), 5)
+    df = an.latest_n_intervals(db_conn, "feed", n=2)
+    assert list(df.from_time) == [datetime(2024, 2, 5, 2), datetime(2024, 2, 5, 8), datetime(2024, 2, 6, 2)]
+    assert list(df.time_interval.dropna()) == [timedelta(hours=6), timedelta(hours=18)]
+
+
+@pytest.mark.parametrize("per_day", [an.total_duration_per_day, an.avg_duration_per_day, an.count_per_day])
+def test_windowed_rollup_matches_resampling(db_conn, per_day):
+    create_days(db_conn, date(2024, 2, 1), 10)
+    window = {"from_time": datetime(2024, 2, 3, 6), "until": datetime(2024, 2, 7, 6)}
+    from_rollup = per_day(db_conn, "feed", **window)
+    # An offset other than 06:00 is not in the rollup and is resampled from the records.
+    resampled = per_day(db_conn, "feed", offset="6Hours0Minutes1Seconds", **window)
+    assert list(from_rollup.index) == [datetime(2024, 2, day, 6) for day in range(3, 7)]
+    assert len(resampled) == 4
+    assert list(from_rollup.squeeze()) == list(resampled.squeeze())
+
+
+def test_window_inside_a_day_is_resampled(db_conn):
+    create_days(db_conn, date(2024, 2, 1), 3)
+    df = an.total_duration_per_day(db_conn, "feed", from_time=datetime(2024, 2, 2, 12))
+    assert list(df.duration) == [20 * 60, 12 * 60 + 20 * 60]
+
+
+def test_weight_growth_df_window(db_conn):
+    for i in range(4):
+        db.create_weight(db_conn, (datetime(2024, 2, 1 + i, 9), 4000 + i))
+    df = an.weight_growth_df(db_conn, from_time=datetime(2024, 2, 3))
+    assert list(df.weight) == [4002, 4003]
+    assert list(df.age) == [10, 11]
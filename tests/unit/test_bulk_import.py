@@ -0,0 +1,112 @@
+from datetime import datetime
+
+import pytest
+
+from baby_tracker import bulk_import
+from baby_tracker import db
+from baby_tracker import rollup
+
+
+SLACK_RECORDS = """from_time,to_time,created_at
+NULL,2021-05-19 14:45,2021-05-19 16:29
+2021-05-19 16:50,2021-05-19 17:05,2021-05-19 18:04
+2021-05-20 23:30,2021-05-20 01:10,2021-05-21 01:15
+"""
+
+TABLE_DUMP = """id,from_time,to_time,duration,created_at,updated_at
+7,2021-05-19 17:30:00.000000,2021-05-19 17:40:00.000000,600,2021-05-19 17:45:00.000000,
+8,2021-05-20 08:00:00.000000,,,2021-05-20 08:01:00.000000,NULL
+9,2021-05-20 10:00:00.000000,2021-05-20 10:20:00.000000,1200,2021-05-20 10:30:00.000000,
+"""
+
+
+@pytest.fixture
+def csv_files(tmp_path):
+    slack_path = tmp_path / "feed_slack_records.csv"
+    slack_path.write_text(SLACK_RECORDS)
+    dump_path = tmp_path / "feed.csv"
+    dump_path.write_text(TABLE_DUMP)
+    return str(slack_path), str(dump_path)
+
+
+def test_parse_input_spec():
+    assert bulk_import.parse_input_spec("feed=./data/feed.csv") == ("feed", "./data/feed.csv", 1)
+    assert bulk_import.parse_input_spec("sleep=C:/data/sleep.csv:75") == ("sleep", "C:/data/sleep.csv", 75)
+    with pytest.raises(ValueError):
+        bulk_import.parse_input_spec("diaper=./data/diaper.csv")
+
+
+def test_read_rows_normalises_null_and_computes_durations(csv_files):
+    slack_path, _ = csv_files
+    rows = list(bulk_import.read_rows(slack_path, "feed"))
+    assert rows[0] == (None, datetime(2021, 5, 19, 14, 45), None, datetime(2021, 5, 19, 16, 29), None)
+    assert rows[1][2] == 15 * 60
+    # to_time entered with the date of from_time, but after midnight
+    assert rows[2][2] == 100 * 60
+
+
+def test_read_rows_keeps_duration_column_and_skips_rows(csv_files):
+    _, dump_path = csv_files
+    rows = list(bulk_import.read_rows(dump_path, "feed", first_row=2))
+    assert [row[2] for row in rows] == [None, 1200]
+    assert rows[0][4] is None
+
+
+def test_merge_inputs_orders_by_created_at(csv_files):
+    rows = list(bulk_import.merge_inputs([(path, 1) for path in csv_files], "feed"))
+    created_at = [row[3] for row in rows]
+    assert len(rows) == 6
+    assert created_at == sorted(created_at)
+
+
+@pytest.mark.parametrize("timestamp_storage", [db.TEXT_STORAGE, db.EPOCH_US_STORAGE])
+def test_main_loads_tables(csv_files, tmp_path, timestamp_storage):
+    db_file = str(tmp_path / "db.sqlite")
+    slack_path, dump_path = csv_files
+    argv = ["--db-file", db_file, "--timestamp-storage", timestamp_storage, "--batch-size", "2",
+            f"feed={slack_path}", f"feed={dump_path}"]
+    assert bulk_import.main(argv) == 0
+
+    conn = db.init_db(db_file=db_file, timestamp_storage=timestamp_storage)
+    records = db.list_feed_records(conn, 10)
+    assert len(records) == 6
+    cur = conn.cursor()
+    cur.execute("SELECT count(*) FROM sqlite_master WHERE type = 'index' AND tbl_name = 'feed'")
+    assert cur.fetchone()[0] == len([sql for sql in db.SCHEMA_MIGRATIONS[0] if " ON feed(" in sql])
+    assert rollup.check_consistency(conn, "feed") == []
+    assert db.get_table_versions(conn, ["feed"]) == {"feed": 1}
+
+    assert bulk_import.main(argv + ["--replace"]) == 0
+    assert len(db.list_feed_records(conn, 10)) == 6
+    conn.close()
+
+
+def test_failed_load_leaves_the_table_as_it_was(csv_files, db_conn):
+    slack_path, dump_path = csv_files
+    bulk_import.load_table(db_conn, "feed", bulk_import.read_rows(slack_path, "feed"))
+    rollup_before = rollup.read_rollup(db_conn, "feed")
+
+    def failing_rows():
+        yield from bulk_import.read_rows(dump_path, "feed")
+        raise ValueError("feed.csv:5: bad row")
+    with pytest.raises(ValueError, match="bad row"):
+        bulk_import.load_table(db_conn, "feed", failing_rows(), batch_size=1, replace=True)
+
+    assert len(db.list_feed_records(db_conn, 10)) == 3
+    cur = db_conn.cursor()
+    cur.execute("SELECT count(*) FROM sqlite_master WHERE type = 'index' AND tbl_name = 'feed'")
+    assert cur.fetchone()[0] == len([sql for sql in db.SCHEMA_MIGRATIONS[0] if " ON feed(" in sql])
+    assert rollup.read_rollup(db_conn, "feed") == rollup_before
+    assert db.get_table_versions(db_conn, ["feed"]) == {"feed": 1}
+
+
+def test_init_db_recreates_dropped_indexes(tmp_path):
+    db_file = str(tmp_path / "db.sqlite")
+    conn = db.init_db(db_file=db_file)
+    conn.execute("DROP INDEX feed_from_time_idx")
+    conn.close()
+    conn = db.init_db(db_file=db_file)
+    cur = conn.cursor()
+    cur.execute("SELECT count(*) FROM sqlite_master WHERE type = 'index' AND name = 'feed_from_time_idx'")
+    assert cur.fetchone()[0] == 1
+    conn.close()
@@ -46,7 +46,7 @@ def test_create_table():
 
 def test_init_db(db_conn):
     tables = list_tables(db_conn)
-    assert tables == ["feed", "sleep", "weight", "poop"]
+    assert tables == ["feed", "sleep", "weight", "poop", "daily_duration_rollup", "table_version", "database_info"]
     db_conn.close()
 
 
@@ -71,3 +71,94 @@ def test_get_feed_record(db_conn):
     assert _created_at < datetime.now()
     assert _created_at > datetime.now()-timedelta(seconds=1 )
     assert _updated_at is None
+
+
+def test_create_feeds_in_one_transaction(db_conn):
+    from baby_tracker import rollup
+    baby_tracker.feed.repository.create_feed(db_conn, make_feed_record())
+    commits = []
+    db_conn.set_trace_callback(lambda sql: commits.append(sql) if sql == "COMMIT" else None)
+    records = [
+        make_feed_record(datetime(2021, 5, 19, 1, 10), datetime(2021, 5, 19, 1, 40)),
+        make_feed_record(datetime(2021, 5, 19, 4, 15), datetime(2021, 5, 19, 4, 35)),
+        (datetime(2021, 5, 19, 7, 0), None, None),
+    ]
+    ids = baby_tracker.feed.repository.create_feeds(db_conn, records)
+    db_conn.set_trace_callback(None)
+    assert ids == [2, 3, 4]
+    assert len(commits) == 1
+    assert [db.get_feed_record_by_id(db_conn, id)[1:4] for id in ids] == records
+    assert rollup.check_consistency(db_conn, "feed") == []
+    assert db.get_table_versions(db_conn, ["feed"]) == {"feed": 2}
+
+
+def test_connection_pool_reuses_configured_connections(tmp_path):
+    pool = db.ConnectionPool(str(tmp_path / "db.sqlite"), size=2)
+    conn = pool.acquire()
+    assert list_tables(conn)[:4] == ["feed", "sleep", "weight", "poop"]
+    assert conn.execute("PRAGMA journal_mode;").fetchone()[0] == "wal"
+    assert conn.execute("PRAGMA synchronous;").fetchone()[0] == 1
+    pool.release(conn)
+    assert pool.acquire() is conn
+    pool.release(conn)
+    stats = pool.stats()
+    assert stats["size"] == 2
+    assert stats["in_use"] == 0
+    assert stats["acquired"] == 2
+    pool.close()
+
+
+def test_connection_pool_records_waits_and_timeouts(tmp_path):
+    pool = db.ConnectionPool(str(tmp_path / "db.sqlite"), size=1)
+    conn = pool.acquire()
+    with pytest.raises(db.PoolTimeoutError):
+        pool.acquire(timeout=0.01)
+    stats = pool.stats()
+    assert stats["waits"] == 0
+    assert stats["timeouts"] == 1
+    pool.release(conn)
+    pool.close()
+
+
+def test_connection_pool_in_memory_shares_one_database():
+    pool = db.ConnectionPool(":memory:", size=4)
+    assert pool.size == 1
+    conn = pool.acquire()
+    assert "feed" in list_tables(conn)
+    pool.release(conn)
+    pool.close()
+
+
+def test_epoch_us_storage_round_trips_timestamps():
+    conn = db.init_db(db_file=":memory:", timestamp_storage=db.EPOCH_US_STORAGE)
+    from_time, to_time, duration = make_feed_record()
+    feed_id = baby_tracker.feed.repository.create_feed(conn, (from_time, to_time, duration))
+    stored = conn.execute("SELECT typeof(from_time), from_time FROM feed WHERE id = ?", (feed_id,)).fetchone()
+    assert stored == ("integer", db.to_epoch_us(from_time))
+    _id, _from_time, _to_time, _duration, _created_at, _updated_at = db.get_feed_record_by_id(conn, feed_id)
+    assert (_from_time, _to_time, _duration) == (from_time, to_time, duration)
+    assert _created_at > datetime.now() - timedelta(seconds=1)
+    conn.close()
+
+
+def test_migrate_text_timestamps_to_epoch_us(tmp_path):
+    db_file = str(tmp_path / "db.sqlite")
+    conn = db.init_db(db_file=db_file, timestamp_storage=db.TEXT_STORAGE)
+    feed_id = baby_tracker.feed.repository.create_feed(conn, make_feed_record())
+    db.create_weight(conn, (datetime(2021, 5, 18, 6, 38), 3254))
+    text_record = db.get_feed_record_by_id(conn, feed_id)
+    conn.close()
+
+    conn = db.init_db(db_file=db_file, timestamp_storage=db.EPOCH_US_STORAGE)
+    assert conn.timestamp_storage == db.EPOCH_US_STORAGE
+    assert db.get_feed_record_by_id(conn, feed_id) == text_record
+    assert db.get_latest_weight_records(conn)[0][1] == datetime(2021, 5, 18, 6, 38)
+    types = conn.execute("SELECT DISTINCT typeof(from_time), typeof(created_at) FROM feed").fetchall()
+    assert types == [("integer", "integer")]
+    indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='index' AND tbl_name='feed'")}
+    assert "feed_open_created_at_idx" in indexes
+    conn.close()
+
+    conn = db.init_db(db_file=db_file, timestamp_storage=db.TEXT_STORAGE)
+    assert conn.timestamp_storage == db.EPOCH_US_STORAGE
+    conn.close()
@@ -0,0 +1,113 @@
+import csv
+import io
+import json
+import tracemalloc
+from datetime import datetime, timedelta
+
+import pytest
+
+from baby_tracker import bulk_import
+from baby_tracker import db
+from baby_tracker import export
+
+
+START = datetime(2024, 3, 1, 6, 0)
+
+
+@pytest.fixture
+def db_conn(db_conn):
+    db.create_sleeps(db_conn, [
+        (START + timedelta(hours=i), START + timedelta(hours=i, minutes=40), timedelta(minutes=40)) for i in range(5)
+    ])
+    db.create_sleep(db_conn, (START + timedelta(days=1), None, None))
+    return db_conn
+
+
+def test_export_rows_in_chunks(db_conn):
+    chunks = list(export.export_rows(db_conn, "sleep", chunk_size=4))
+    assert [len(chunk) for chunk in chunks] == [4, 2]
+    assert chunks[0][0] == [1, "2024-03-01 06:00:00.000000", "2024-03-01 06:40:00.000000", 2400, chunks[0][0][4], None]
+    assert chunks[1][1][2:4] == [None, None]
+
+
+def test_since_and_until(db_conn):
+    rows = [row for chunk in export.export_rows(db_conn, "sleep", since=START + timedelta(hours=1), until=START + timedelta(hours=3)) for row in chunk]
+    assert [row[0] for row in rows] == [2, 3]
+
+
+def test_csv_round_trips_through_bulk_import(db_conn, tmp_path):
+    path = tmp_path / "sleep.csv"
+    path.write_text("".join(export.stream(db_conn, "sleep", "csv", chunk_size=2)))
+    conn = db.init_db(db_file=":memory:")
+    bulk_import.load_table(conn, "sleep", bulk_import.read_rows(str(path), "sleep"))
+    assert db.get_latest_sleep_records(conn, 10) == db.get_latest_sleep_records(db_conn, 10)
+    conn.close()
+
+
+def test_ndjson(db_conn):
+    lines = "".join(export.stream(db_conn, "sleep", "ndjson")).splitlines()
+    assert len(lines) == 6
+    assert json.loads(lines[0])["duration"] == 2400
+    assert set(json.loads(lines[0])) == set(export.COLUMNS["sleep"])
+
+
+def peak_export_memory(n_rows):
+    conn = db.init_db(db_file=":memory:")
+    bulk_import.load_table(conn, "poop", ((START + timedelta(minutes=i), START, None) for i in range(n_rows)))
+    tracemalloc.start()
+    n_bytes = sum(len(chunk) for chunk in export.stream(conn, "poop", "csv", chunk_size=500))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    conn.close()
+    return n_bytes, peak
+
+
+def test_memory_does_not_grow_with_the_table():
+    small_bytes, small_peak = peak_export_memory(2_000)
+    large_bytes, large_peak = peak_export_memory(20_000)
+    assert large_bytes > 9 * small_bytes
+    assert large_peak < 1.5 * small_peak
+
+
+def test_cli(tmp_path, capsys):
+    db_file = str(tmp_path / "db.sqlite")
+    conn = db.init_db(db_file=db_file)
+    db.create_weight(conn, (START, 4000))
+    conn.close()
+    assert export.main(["--db-file", db_file, "weight"]) == 0
+    rows = list(csv.reader(io.StringIO(capsys.readouterr().out)))
+    assert rows[0] == list(export.COLUMNS["weight"])
+    assert rows[1][1:3] == ["2024-03-01 06:00:00.000000", "4000"]
+    output = tmp_path / "weight.ndjson"
+    assert export.main(["--db-file", db_file, "--format", "ndjson", "--since", "2024-03-02", "--output", str(output), "weight"]) == 0
+    assert output.read_text() == ""
+
+
+def test_export_route():
+    from baby_tracker import serve
+    pool = db.ConnectionPool(":memory:")
+    serve.app.extensions["db_pool"] = pool
+    client = serve.app.test_client()
+    try:
+        client.post("/babytracker/poop", data={"text": "2024-03-01"})
+        # Closing the response returns the connection to the pool, as a WSGI server does.
+        with client.get("/babytracker/export/poop") as resp:
+            assert resp.status_code == 200
+            assert resp.content_type == export.CONTENT_TYPES["csv"]
+            assert resp.get_data(as_text=True).splitlines()[1].startswith("1,2024-03-01 00:00:00.000000,")
+            etag, last_modified = resp.headers["ETag"], resp.headers["Last-Modified"]
+        assert client.get("/babytracker/export/poop", headers={"If-None-Match": etag}).status_code == 304
+        assert client.get("/babytracker/export/poop", headers={"If-Modified-Since": last_modified}).status_code == 304
+
+        client.post("/babytracker/poop", data={"text": "2024-03-02"})
+        with client.get("/babytracker/export/poop?format=ndjson&since=2024-03-02", headers={"If-None-Match": etag}) as resp:
+            assert resp.status_code == 200
+            assert [json.loads(line)["id"] for line in resp.get_data(as_text=True).splitlines()] == [2]
+
+        assert client.get("/babytracker/export/diaper").status_code == 404
+        assert client.get("/babytracker/export/poop?format=xml").status_code == 400
+        assert client.get("/babytracker/export/poop?since=sometime-ish").status_code == 400
+        assert pool.stats()["in_use"] == 0
+    finally:
+        serve.app.extensions.pop("db_pool")
+        pool.close()
@@ -0,0 +1,55 @@
+import pytest
+import numpy as np
+from datetime import datetime, timedelta
+
+from baby_tracker import db
+from baby_tracker import growth
+from baby_tracker import BIRTH_DATE
+from baby_tracker.router import weight
+
+
+@pytest.fixture
+def reference():
+    return growth.get_reference("weight", "boy")
+
+
+def test_reference_is_loaded_once():
+    assert growth.get_reference("weight", "girl") is growth.get_reference("weight", "girl")
+
+
+def test_median_and_z_scores_at_tabulated_ages(reference):
+    # WHO weight-for-age, boys, day 0: L=0.3487, M=3.3464, S=0.14602
+    assert reference.value_at_percentile(0, 50) == pytest.approx(3346.4)
+    assert reference.z_scores(0, 3346.4) == pytest.approx(0)
+    expected_sd1 = 3346.4 * (1 + 0.3487 * 0.14602) ** (1 / 0.3487)
+    assert reference.value_at_z(0, 1) == pytest.approx(expected_sd1)
+
+
+def test_percentiles_round_trip_for_arbitrary_ages(reference):
+    ages = np.array([0, 10.5, 100.25, 700])
+    for percentile in (5, 50, 97):
+        values = reference.value_at_percentile(ages, percentile)
+        np.testing.assert_allclose(reference.percentiles(ages, values), percentile)
+
+
+def test_restricted_z_scores_beyond_three_sd(reference):
+    sd2, sd3 = reference.value_at_z(30, 2), reference.value_at_z(30, 3)
+    assert reference.restricted_z_scores(30, sd3 + (sd3 - sd2)) == pytest.approx(4)
+    assert reference.restricted_z_scores(30, reference.value_at_z(30, 2.5)) == pytest.approx(2.5)
+
+
+def test_ages_outside_the_reference(reference):
+    with pytest.raises(ValueError):
+        reference.lms(reference.max_age + 1)
+
+
+def test_weight_z_command():
+    conn = db.init_db(db_file=":memory:")
+    assert "No weight records" in weight.handle_weight_request(["z"], conn)["text"]
+    timestamp = datetime.combine(BIRTH_DATE + timedelta(days=30), datetime.min.time())
+    median = growth.get_reference("weight", "boy").value_at_percentile(30, 50).item()
+    db.create_weight(conn, (timestamp, round(median)))
+    text = weight.handle_weight_request(["z"], conn)["text"]
+    assert "at 30 days" in text
+    assert "0.00*, percentile *50*" in text
+    conn.close()
@@ -0,0 +1,33 @@
+import os
+import re
+import subprocess
+import sys
+
+# Cumulative cold import time of baby_tracker.serve in milliseconds. Importing
+# the analytics stack (pandas, matplotlib) alone takes well over a second.
+IMPORT_TIME_BUDGET_MS = float(os.getenv("IMPORT_TIME_BUDGET_MS", 1000))
+HEAVY_MODULES = ["pandas", "matplotlib", "labellines", "dateparser"]
+
+
+def import_in_subprocess(code):
+    return subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True, text=True, check=True,
+    )
+
+
+def cumulative_import_ms(importtime_log, module):
+    pattern = re.compile(rf"import time:\s+\d+ \|\s+(\d+) \|\s*{re.escape(module)}$", re.MULTILINE)
+    return int(pattern.search(importtime_log).group(1)) / 1000
+
+
+def test_serve_cold_import_is_within_budget():
+    result = import_in_subprocess("import baby_tracker.serve")
+    import_ms = cumulative_import_ms(result.stderr, "baby_tracker.serve")
+    assert import_ms < IMPORT_TIME_BUDGET_MS, f"baby_tracker.serve imported in {import_ms:.0f} ms"
+
+
+def test_serve_does_not_import_analytics_stack():
+    code = f"import sys, baby_tracker.serve; print([m for m in {HEAVY_MODULES!r} if m in sys.modules])"
+    result = import_in_subprocess(code)
+    assert result.stdout.strip() == "[]"
@@ -0,0 +1,44 @@
+import threading
+import pytest
+
+from baby_tracker import jobs
+
+
+def test_job_queue_skips_duplicate_keys():
+    started, release = threading.Event(), threading.Event()
+    done = []
+    job_queue = jobs.JobQueue(max_workers=1, max_pending=5)
+    assert job_queue.submit(("C1", "sleep"), lambda: started.set() or release.wait()) == (True, 0)
+    started.wait()
+    # The running job is not ahead of later jobs in the queue, the waiting ones are.
+    assert job_queue.submit(("C1", "sleep"), release.wait) == (False, 0)
+    assert job_queue.submit(("C2", "sleep"), done.append, "C2") == (True, 0)
+    assert job_queue.submit(("C3", "sleep"), done.append, "C3") == (True, 1)
+    assert job_queue.stats()["running"] == 1
+    release.set()
+    job_queue.shutdown()
+    assert done == ["C2", "C3"]
+    stats = job_queue.stats()
+    assert stats["depth"] == 0
+    assert stats["running"] == 0
+    assert stats["submitted"] == 3
+    assert stats["duplicates"] == 1
+
+
+def test_job_queue_rejects_when_full():
+    release = threading.Event()
+    job_queue = jobs.JobQueue(max_workers=1, max_pending=1)
+    job_queue.submit("first", release.wait)
+    with pytest.raises(jobs.QueueFullError):
+        job_queue.submit("second", release.wait)
+    release.set()
+    job_queue.shutdown()
+    assert job_queue.stats()["rejected"] == 1
+
+
+def test_failing_job_is_counted_and_removed():
+    job_queue = jobs.JobQueue(max_workers=1)
+    job_queue.submit("failing", lambda: 1 / 0)
+    job_queue.shutdown()
+    assert job_queue.stats()["failed"] == 1
+    assert job_queue.depth() == 0
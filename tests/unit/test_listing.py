@@ -0,0 +1,101 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from baby_tracker import db
+from baby_tracker.router import listing
+from baby_tracker.router import poop
+from baby_tracker.feed import endpoints as feed
+from baby_tracker.sleep import endpoints as sleep
+
+
+START = datetime(2024, 3, 1, 6, 0)
+
+
+def next_args(text):
+    """The arguments of the next page command of a list message."""
+    return ["ls", *text.rsplit("`ls ", 1)[1].rstrip("`").split()]
+
+
+def test_list_page_args():
+    assert listing.list_page(["ls"]) == {"n": listing.DEFAULT_N_LIST}
+    assert listing.list_page(["ls", "10", "before", "2024-03-01"]) == {"n": 10, "before": (datetime(2024, 3, 1), None)}
+    token = listing.encode_token(datetime(2024, 3, 1, 6, 30, 0, 12), 71)
+    assert listing.list_page(["ls", "next", token]) == {"n": listing.DEFAULT_N_LIST, "before": (datetime(2024, 3, 1, 6, 30, 0, 12), 71)}
+    assert listing.list_page(["ls", "100000"])["n"] == listing.MAX_PAGE_SIZE
+    with pytest.raises(ValueError, match="at least 1"):
+        listing.list_page(["ls", "0"])
+    with pytest.raises(ValueError, match="page token"):
+        listing.list_page(["ls", "next", "2024-03-01"])
+    with pytest.raises(ValueError, match="Not a valid timestamp"):
+        listing.list_page(["ls", "before", "sometime-ish"])
+
+
+def test_pages_of_records_created_at_once(db_conn):
+    # A batch shares one created_at, the id breaks the tie.
+    db.create_sleeps(db_conn, [(START + timedelta(hours=i), None, None) for i in range(7)])
+    args, seen = ["ls", "3"], []
+    while True:
+        text = sleep.router.handle(args, db_conn)["text"]
+        seen.append(text.split("\n")[0])
+        if "Next page" not in text:
+            break
+        args = next_args(text)
+    assert seen == ["*3 latest sleeping records:*", "*3 latest sleeping records:*", "*1 latest sleeping records:*"]
+
+
+def test_list_zero_is_an_error_message(db_conn):
+    from baby_tracker import serve
+    db.create_poop(db_conn, START)
+    assert serve.handle_action("poop", ["ls", "0"], db_conn)["text"].startswith(":exclamation:")
+
+
+def test_pages_do_not_overlap(db_conn):
+    for i in range(5):
+        db.create_poop(db_conn, START + timedelta(days=i))
+    first = db.get_latest_poop_records(db_conn, 2)
+    second = db.get_latest_poop_records(db_conn, 2, before=listing.timestamp_key(first[-1]))
+    rest = db.get_latest_poop_records(db_conn, 10, before=listing.timestamp_key(second[-1]))
+    assert [record[0] for record in first + second + rest] == [5, 4, 3, 2, 1]
+    assert [record[0] for record in db.get_latest_poop_records(db_conn, 10, before=(START + timedelta(days=2), None))] == [2, 1]
+
+
+def test_poop_list_before(db_conn):
+    for i in range(5):
+        db.create_poop(db_conn, START + timedelta(days=i))
+    text = poop.router.handle(["ls", "2", "before", "2024-03-04"], db_conn)["text"]
+    assert "03/03-2024" in text and "02/03-2024" in text and "04/03-2024" not in text
+    text = poop.router.handle(next_args(text), db_conn)["text"]
+    assert text.startswith("*1 latest poop records:*") and "01/03-2024" in text
+    assert "Next page" not in text
+
+
+def activities(text):
+    return [line.rstrip("`").split()[-1] for line in text.split("\n")[2:] if line.startswith(" ")]
+
+
+def test_feed_list_pages_both_tables(db_conn):
+    db.create_sleeps(db_conn, [(START + timedelta(hours=2 * i), None, None) for i in range(3)])
+    feed.create_feeds(db_conn, [(START + timedelta(hours=2 * i + 1), None, None) for i in range(3)])
+    text = feed.router.handle(["ls", "4"], db_conn)["text"]
+    assert sorted(activities(text)) == ["feed", "feed", "feed", "sleep"]
+    text = feed.router.handle(next_args(text), db_conn)["text"]
+    assert activities(text) == ["sleep", "sleep"] and "Next page" not in text
+
+
+def test_message_size_is_capped(db_conn):
+    for i in range(50):
+        db.create_poop(db_conn, START + timedelta(days=i))
+    records = db.get_latest_poop_records(db_conn, 51)
+    text = listing.list_response("latest poop records", records, 50, poop.format_poop_row, ["date"], listing.timestamp_key, max_chars=300)["text"]
+    assert len(text) <= 300
+    n_listed = int(text.split()[0].lstrip("*"))
+    assert 0 < n_listed < 50
+    # The next page continues after the last record listed.
+    assert listing.decode_token(next_args(text)[-1]) == listing.timestamp_key(records[n_listed - 1])
+
+
+def test_list_records_are_the_latest(db_conn):
+    db.create_sleeps(db_conn, [(START + timedelta(hours=i), None, None) for i in range(3)])
+    db.create_sleep(db_conn, (START + timedelta(days=1), None, None))
+    assert db.list_sleep_records(db_conn, 1)[0][0] == db.to_db_timestamp(db_conn, START + timedelta(days=1))
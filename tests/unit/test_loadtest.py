@@ -0,0 +1,50 @@
+from baby_tracker import db
+from baby_tracker import slack
+from benchmarks import loadtest
+
+
+def test_command_label():
+    assert loadtest.command_label("feed", "12:30 12:45") == "feed create"
+    assert loadtest.command_label("feed", "ls 10") == "feed ls"
+    assert loadtest.command_label("sleep", "analyze avg 14") == "sleep analyze avg"
+    assert loadtest.command_label("poop", "") == "poop help"
+
+
+def test_percentile():
+    values = list(range(1, 101))
+    assert [loadtest.percentile(values, p) for p in (50, 95, 99)] == [50, 95, 99]
+    assert loadtest.percentile([7], 99) == 7
+
+
+def test_recorded_commands_repeat(tmp_path):
+    path = tmp_path / "commands.jsonl"
+    path.write_text('{"action": "feed", "text": "ls"}\n\n{"action": "poop"}\n')
+    assert list(loadtest.recorded_commands(str(path), 3)) == [("feed", "ls"), ("poop", ""), ("feed", "ls")]
+
+
+def test_post_file_goes_to_slack_api_url(stub):
+    slack.set_client(slack.SlackClient(api_url=stub.url))
+    try:
+        resp = slack.post_file("plot.png", b"png", oauth_token="xoxb", channel_id="C1")
+    finally:
+        slack.set_client(None)
+    assert resp.json() == {"ok": True}
+    assert stub.counts == {"/files.upload": 1}
+
+
+def test_run_load_in_process(tmp_path, stub):
+    from baby_tracker import serve
+    pool = db.ConnectionPool(str(tmp_path / "db.sqlite"))
+    serve.app.extensions["db_pool"] = pool
+    try:
+        commands = [("feed", "12:30 12:45"), ("feed", "ls 5"), ("sleep", "status"), ("nope", "x")] * 5
+        results, elapsed = loadtest.run_load(loadtest.InProcessTarget(serve.app), commands, rate=500, concurrency=4)
+    finally:
+        serve.app.extensions.pop("db_pool")
+        pool.close()
+    summary = loadtest.summarize(results, elapsed)
+    assert summary["overall"]["requests"] == 20
+    assert summary["by_command"]["feed create"]["errors"] == 0
+    assert summary["by_command"]["nope x"]["error_rate"] == 1
+    assert set(summary["overall"]) >= {"p50_ms", "p95_ms", "p99_ms"}
+    assert "all" in loadtest.format_report(summary)
@@ -0,0 +1,82 @@
+import inspect
+import time
+
+from baby_tracker import db
+from baby_tracker import metrics
+
+
+def test_histogram_text():
+    histogram = metrics.Histogram("test_seconds", "Test.", ("action",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.7, 3):
+        histogram.observe(("feed",), value)
+    lines = list(histogram.collect())
+    assert lines == [
+        "# HELP test_seconds Test.",
+        "# TYPE test_seconds histogram",
+        'test_seconds_bucket{action="feed",le="0.1"} 1',
+        'test_seconds_bucket{action="feed",le="1.0"} 3',
+        'test_seconds_bucket{action="feed",le="+Inf"} 4',
+        'test_seconds_sum{action="feed"} 4.25',
+        'test_seconds_count{action="feed"} 4',
+    ]
+
+
+def test_counter_escapes_labels():
+    counter = metrics.Counter("test_total", "Test.", ("command",))
+    counter.inc(('say "hi"',))
+    assert list(counter.collect())[-1] == 'test_total{command="say \\"hi\\""} 1'
+
+
+def test_timed_keeps_name_and_signature():
+    histogram = metrics.Histogram("test_seconds", "Test.", ("module", "function"))
+
+    def add(conn, a, b=1):
+        return a + b
+
+    timed_add = metrics.timed(add, histogram)
+    assert timed_add(None, 1) == 2
+    assert timed_add.__name__ == "add"
+    assert list(inspect.signature(timed_add).parameters) == ["conn", "a", "b"]
+    assert histogram.count(("test_metrics", "add")) == 1
+
+
+def test_db_functions_are_timed():
+    labels = ("db", "get_latest_poop_records")
+    before = metrics.FUNCTION_SECONDS.count(labels)
+    conn = db.init_db(db_file=":memory:")
+    db.get_latest_poop_records(conn)
+    conn.close()
+    assert metrics.FUNCTION_SECONDS.count(labels) == before + 1
+    assert not getattr(db.to_iso, "_timed", False)
+
+
+def test_metrics_route():
+    from baby_tracker import serve
+    pool = db.ConnectionPool(":memory:")
+    serve.app.extensions["db_pool"] = pool
+    client = serve.app.test_client()
+    try:
+        client.post("/babytracker/poop", data={"text": "2021-05-18"})
+        client.post("/babytracker/poop", data={"text": "ls"})
+        client.post("/babytracker/diaper", data={"text": "ls"})
+        resp = client.get("/metrics")
+    finally:
+        serve.app.extensions.pop("db_pool")
+        pool.close()
+    assert resp.content_type == metrics.CONTENT_TYPE
+    text = resp.get_data(as_text=True)
+    assert 'baby_tracker_request_seconds_count{action="poop",command="create"}' in text
+    assert 'baby_tracker_request_seconds_count{action="poop",command="list"}' in text
+    assert 'baby_tracker_request_errors_total{action="unknown",command="list"}' in text
+    assert 'baby_tracker_function_seconds_count{module="timeparse",function="parse"}' in text
+
+
+def test_timing_overhead_is_small():
+    histogram = metrics.Histogram("test_seconds", "Test.", ("module", "function"))
+    noop = metrics.timed(lambda: None, histogram, labels=("test", "noop"))
+    n_calls = 20_000
+    start = time.perf_counter()
+    for _ in range(n_calls):
+        noop()
+    per_call = (time.perf_counter() - start) / n_calls
+    assert per_call < 50e-6
@@ -0,0 +1,96 @@
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+from baby_tracker import analyze as an
+from baby_tracker import db
+from baby_tracker import plot_cache
+from baby_tracker import render
+from baby_tracker.feed.repository import create_feed
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = plot_cache.PlotCache(str(tmp_path), max_bytes=1000)
+    monkeypatch.setattr(plot_cache, "_plot_cache", cache)
+    monkeypatch.setattr(render, "RENDER_WORKERS", 0)
+    return cache
+
+
+@pytest.fixture
+def db_conn():
+    conn = db.init_db(db_file=":memory:")
+    yield conn
+    conn.close()
+
+
+def test_table_versions_count_writes(db_conn):
+    assert db.get_table_versions(db_conn, ["feed", "poop"]) == {"feed": 0, "poop": 0}
+    feed_id = create_feed(db_conn, (datetime(2024, 1, 24, 7), datetime(2024, 1, 24, 7, 30), timedelta(seconds=1800)))
+    db.update_feed(db_conn, feed_id, (datetime(2024, 1, 24, 7), datetime(2024, 1, 24, 7, 20), timedelta(seconds=1200)))
+    db.delete_feed(db_conn, feed_id)
+    db.create_poop(db_conn, datetime(2024, 1, 24, 8))
+    assert db.get_table_versions(db_conn, ["feed", "poop"]) == {"feed": 3, "poop": 1}
+
+
+def test_get_put(cache):
+    key = cache.key("plot", {"title": "a"}, {"feed": 1})
+    assert cache.get(key) is None
+    cache.put(key, b"png")
+    assert cache.get(key) == b"png"
+    assert cache.key("plot", {"title": "a"}, {"feed": 2}) != key
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"], stats["bytes"]) == (1, 1, 1, 3)
+
+
+def test_evicts_least_recently_used(cache):
+    for i, key in enumerate(["a", "b"]):
+        cache.put(key, bytes(400))
+        os.utime(cache._path(key), (i, i))
+    cache.get("a")
+    cache.put("c", bytes(400))
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_render_cached_skips_load_until_table_changes(cache, db_conn, monkeypatch):
+    loads = []
+
+    def load(conn, table):
+        loads.append(table)
+        return an.total_duration_per_day(conn, table)
+
+    create_feed(db_conn, (datetime(2024, 1, 24, 7), datetime(2024, 1, 24, 7, 30), timedelta(seconds=1800)))
+    cache.max_bytes = 10 ** 7
+    first = plot_cache.render_cached(db_conn, ["feed"], load, ("feed",), an.duration_plot, title="Total")
+    second = plot_cache.render_cached(db_conn, ["feed"], load, ("feed",), an.duration_plot, title="Total")
+    assert first == second
+    assert loads == ["feed"]
+
+    db.create_sleep(db_conn, (datetime(2024, 1, 24, 9), datetime(2024, 1, 24, 10), timedelta(seconds=3600)))
+    plot_cache.render_cached(db_conn, ["feed"], load, ("feed",), an.duration_plot, title="Total")
+    assert loads == ["feed"]
+
+    create_feed(db_conn, (datetime(2024, 1, 25, 7), datetime(2024, 1, 25, 7, 30), timedelta(seconds=1800)))
+    plot_cache.render_cached(db_conn, ["feed"], load, ("feed",), an.duration_plot, title="Total")
+    assert loads == ["feed", "feed"]
+
+
+def test_databases_with_equal_versions_do_not_share_plots(cache, db_conn, monkeypatch):
+    loads = []
+
+    def load(conn, table):
+        loads.append(table)
+        return an.total_duration_per_day(conn, table)
+
+    cache.max_bytes = 10 ** 7
+    other_conn = db.init_db(db_file=":memory:")
+    for conn in (db_conn, other_conn):
+        create_feed(conn, (datetime(2024, 1, 24, 7), datetime(2024, 1, 24, 7, 30), timedelta(seconds=1800)))
+        plot_cache.render_cached(conn, ["feed"], load, ("feed",), an.duration_plot, title="Total")
+    other_conn.close()
+    assert db.get_table_versions(db_conn, ["feed"]) == {"feed": 1}
+    assert loads == ["feed", "feed"]
@@ -0,0 +1,89 @@
+import os
+import time
+
+from baby_tracker import db
+from baby_tracker import profiling
+
+
+def slow_function():
+    time.sleep(0.05)
+
+
+def test_profiled_action_saves_pstats(tmp_path):
+    profiler = profiling.Profiler(str(tmp_path), actions=["sleep analyze"])
+    assert profiler.is_profiled_action("sleep", "analyze")
+    assert not profiler.is_profiled_action("sleep", "list")
+    with profiler.profile("sleep", "analyze", ["analyze", "avg"]):
+        slow_function()
+    [meta] = profiling.list_profiles(str(tmp_path))
+    assert meta["action"] == "sleep"
+    assert meta["args"] == ["analyze", "avg"]
+    assert meta["elapsed_ms"] >= 50
+    assert meta["profile"].endswith(profiling.PSTATS_SUFFIX)
+
+
+def test_analyze_subcommands_can_be_profiled(tmp_path):
+    # Registers the sleep router.
+    from baby_tracker.sleep import endpoints
+    profiler = profiling.Profiler(str(tmp_path), actions=["sleep analyze tl"])
+    assert profiler.is_profiled_action("sleep", "analyze", ["analyze", "tl", "7"])
+    assert profiler.is_profiled_action("sleep", "analyze", ["analyze", "timeline"])
+    assert not profiler.is_profiled_action("sleep", "analyze", ["analyze", "avg"])
+    assert not profiler.is_profiled_action("sleep", "analyze", ["analyze", "nonsense"])
+    assert not profiler.is_profiled_action("feed", "analyze", ["analyze", "tl"])
+
+
+def test_a_running_cprofile_does_not_fail_the_command(tmp_path):
+    profiler = profiling.Profiler(str(tmp_path), actions=["poop"])
+    with profiler.profile("poop", "list", ["ls"]):
+        # A second profiled command, e.g. in another thread, runs unprofiled.
+        with profiler.profile("poop", "list", ["ls"]):
+            slow_function()
+    assert len(profiling.list_profiles(str(tmp_path))) == 1
+    with profiler.profile("poop", "list", ["ls"]):
+        pass
+    assert len(profiling.list_profiles(str(tmp_path))) == 2
+
+
+def test_slow_commands_are_sampled(tmp_path):
+    profiler = profiling.Profiler(str(tmp_path), threshold_ms=30, sample_interval_ms=1)
+    with profiler.profile("feed", "list", ["ls"]):
+        pass
+    assert profiling.list_profiles(str(tmp_path)) == []
+    with profiler.profile("feed", "list", ["ls"]):
+        slow_function()
+    [meta] = profiling.list_profiles(str(tmp_path))
+    samples = profiling.read_collapsed(os.path.join(str(tmp_path), meta["profile"]))
+    assert any("slow_function" in stack for stack in samples)
+    assert "Own samples:" in profiling.summarize_collapsed(samples)
+
+
+def test_rotate_keeps_newest(tmp_path):
+    profiler = profiling.Profiler(str(tmp_path), actions=["poop"], max_files=2)
+    for i in range(4):
+        with profiler.profile("poop", "list", [str(i)]):
+            pass
+    profiles = profiling.list_profiles(str(tmp_path))
+    assert [meta["args"] for meta in profiles] == [["2"], ["3"]]
+    assert len(os.listdir(str(tmp_path))) == 4
+
+
+def test_handle_action_is_profiled(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "_profiler", profiling.Profiler(str(tmp_path), actions=["poop"]))
+    from baby_tracker import serve
+    conn = db.init_db(db_file=":memory:")
+    serve.handle_action("poop", ["ls"], conn)
+    serve.handle_action("feed", ["ls"], conn)
+    conn.close()
+    assert [(meta["action"], meta["command"]) for meta in profiling.list_profiles(str(tmp_path))] == [("poop", "list")]
+
+
+def test_cli(tmp_path, capsys):
+    profiler = profiling.Profiler(str(tmp_path), actions=["weight"])
+    with profiler.profile("weight", "z", ["z"]):
+        slow_function()
+    [meta] = profiling.list_profiles(str(tmp_path))
+    assert profiling.main(["--dir", str(tmp_path), "list"]) == 0
+    assert meta["profile"] in capsys.readouterr().out
+    assert profiling.main(["--dir", str(tmp_path), "show", meta["profile"], "--limit", "5"]) == 0
+    assert "slow_function" in capsys.readouterr().out
@@ -0,0 +1,151 @@
+import inspect
+import re
+import pytest
+from datetime import datetime, timedelta
+
+from baby_tracker import db
+from baby_tracker import rollup
+from baby_tracker import analyze as an
+
+
+# Statements that read a whole table on purpose, with the reason why.
+FULL_SCAN_ALLOWED = {
+    r"SELECT (\*|id, [\w, ]+) FROM (feed|sleep|weight) ;": "analysis over the whole history",
+    r"INSERT INTO daily_duration_rollup.*GROUP BY 2": "rollup rebuild aggregates every record",
+}
+
+# Functions taking a connection that only touch the schema or compose the functions below.
+NOT_QUERIES = {
+    "create_table", "configure_connection", "get_schema_version", "migrate_schema", "create_indexes", "get_timestamp_storage",
+    "migrate_timestamps_to_epoch", "to_db_timestamp", "rollup_exists", "check_consistency",
+}
+
+NOW = datetime(2024, 2, 10, 12, 0)
+
+
+def duration_record(from_time, minutes=None):
+    duration = timedelta(minutes=minutes) if minutes is not None else None
+    to_time = from_time + duration if duration is not None else None
+    return (from_time, to_time, duration)
+
+
+DB_QUERIES = {
+    "create_sleep": lambda conn: db.create_sleep(conn, duration_record(NOW, 30)),
+    "create_sleeps": lambda conn: db.create_sleeps(conn, [duration_record(NOW, 30), duration_record(NOW + timedelta(hours=1))]),
+    "create_weight": lambda conn: db.create_weight(conn, (NOW, 4000)),
+    "create_poop": lambda conn: db.create_poop(conn, NOW),
+    "get_latest_feed_records": lambda conn: db.get_latest_feed_records(conn, 5),
+    "get_latest_sleep_records": lambda conn: db.get_latest_sleep_records(conn, 5),
+    "get_latest_weight_records": lambda conn: db.get_latest_weight_records(conn, 5),
+    "get_latest_poop_records": lambda conn: db.get_latest_poop_records(conn, 5),
+    "get_latest_sleep_records_page": lambda conn: db.get_latest_sleep_records(conn, 5, before=(NOW, 3)),
+    "get_latest_poop_records_page": lambda conn: db.get_latest_poop_records(conn, 5, before=(NOW, None)),
+    "get_feed_record_by_id": lambda conn: db.get_feed_record_by_id(conn, 1),
+    "get_sleep_record_by_id": lambda conn: db.get_sleep_record_by_id(conn, 1),
+    "get_latest_feed_record_with_null_to_time": lambda conn: db.get_latest_feed_record_with_null_to_time(conn),
+    "get_latest_sleep_record_with_null_to_time": lambda conn: db.get_latest_sleep_record_with_null_to_time(conn),
+    "update_feed": lambda conn: db.update_feed(conn, 1, duration_record(NOW, 20)),
+    "update_sleep": lambda conn: db.update_sleep(conn, 1, duration_record(NOW, 20)),
+    "list_feed_records": lambda conn: db.list_feed_records(conn, 5),
+    "list_sleep_records": lambda conn: db.list_sleep_records(conn, 5),
+    "delete_feed": lambda conn: db.delete_feed(conn, 2),
+    "delete_sleep": lambda conn: db.delete_sleep(conn, 2),
+    "delete_weight_record": lambda conn: db.delete_weight_record(conn, 2),
+    "delete_poop_record": lambda conn: db.delete_poop_record(conn, 2),
+    "bump_table_version": lambda conn: db.bump_table_version(conn, "feed"),
+    "get_table_versions": lambda conn: db.get_table_versions(conn, ["feed", "sleep"]),
+    "get_table_modified": lambda conn: db.get_table_modified(conn, "feed"),
+    "get_database_id": lambda conn: db.get_database_id(conn),
+}
+
+ANALYZE_QUERIES = {
+    "total_duration_per_day": lambda conn: an.total_duration_per_day(conn, "feed"),
+    "latest_daily_total_duration": lambda conn: an.latest_daily_total_duration(conn, "feed"),
+    "avg_duration_per_day": lambda conn: an.avg_duration_per_day(conn, "feed"),
+    "count_per_day": lambda conn: an.count_per_day(conn, "feed"),
+    "rollup_per_day": lambda conn: an.rollup_per_day(conn, "sleep"),
+    "resample_duration_table": lambda conn: an.resample_duration_table(conn, "sleep", "sum", from_time=NOW),
+    "latest_n_intervals": lambda conn: an.latest_n_intervals(conn, "feed"),
+    "df_from_db_table": lambda conn: an.df_from_db_table(conn, "sleep", from_time=NOW - timedelta(days=2), until=NOW),
+    "merge_duration_tables": lambda conn: an.merge_duration_tables(conn, ["feed", "sleep"]),
+    "get_duration_table": lambda conn: an.get_duration_table(conn, "feed", n_weeks=2),
+    "weight_growth_df": lambda conn: an.weight_growth_df(conn, from_time=NOW),
+}
+
+ROLLUP_QUERIES = {
+    "apply_record": lambda conn: rollup.apply_record(conn, "feed", NOW, 60, sign=-1),
+    "apply_records": lambda conn: rollup.apply_records(conn, "feed", [(NOW, 60), (NOW + timedelta(days=1), None)]),
+    "rebuild": lambda conn: rollup.rebuild(conn, "feed"),
+    "read_rollup": lambda conn: rollup.read_rollup(conn, "feed"),
+    "latest_day": lambda conn: rollup.latest_day(conn, "feed"),
+    "latest_daily_total": lambda conn: rollup.latest_daily_total(conn, "feed"),
+}
+
+
+@pytest.fixture
+def db_conn(db_conn):
+    for i in range(3):
+        db._create_duration_record(db_conn, duration_record(NOW + timedelta(hours=i), 15), "feed")
+        db.create_sleep(db_conn, duration_record(NOW + timedelta(hours=i), 45))
+        db.create_weight(db_conn, (NOW + timedelta(days=i), 4000 + i))
+        db.create_poop(db_conn, NOW + timedelta(days=i))
+    db._create_duration_record(db_conn, duration_record(NOW + timedelta(hours=5)), "feed")
+    db.create_sleep(db_conn, duration_record(NOW + timedelta(hours=5)))
+    return db_conn
+
+
+def trace_statements(conn, query):
+    statements = []
+    conn.set_trace_callback(lambda sql: statements.append(" ".join(sql.split())))
+    try:
+        query(conn)
+    finally:
+        conn.set_trace_callback(None)
+    return [
+        sql for sql in statements
+        if re.match(r"(SELECT|UPDATE|DELETE|INSERT|WITH)\b", sql, re.IGNORECASE) and "sqlite_master" not in sql
+    ]
+
+
+def full_scans(conn, sql):
+    plan = conn.execute("EXPLAIN QUERY PLAN " + sql).fetchall()
+    details = [row[3] for row in plan]
+    return [d for d in details if re.fullmatch(r"SCAN \w+", d) or d.startswith("USE TEMP B-TREE FOR ORDER BY")]
+
+
+def is_allowed_full_scan(sql):
+    return any(re.fullmatch(pattern, sql) for pattern in FULL_SCAN_ALLOWED)
+
+
+def query_functions(module):
+    functions = inspect.getmembers(module, inspect.isfunction)
+    return {
+        name for name, func in functions
+        if func.__module__ == module.__name__
+        and list(inspect.signature(func).parameters)[:1] in (["conn"], ["db_conn"])
+        and not name.startswith("_")
+        and name not in NOT_QUERIES
+    }
+
+
+@pytest.mark.parametrize("module,queries", [(db, DB_QUERIES), (an, ANALYZE_QUERIES), (rollup, ROLLUP_QUERIES)])
+def test_every_query_function_is_exercised(module, queries):
+    assert query_functions(module) - set(queries) == set()
+
+
+@pytest.mark.parametrize(
+    "name,query",
+    list(DB_QUERIES.items()) + list(ANALYZE_QUERIES.items()) + list(ROLLUP_QUERIES.items())
+)
+def test_query_uses_index(db_conn, name, query):
+    statements = trace_statements(db_conn, query)
+    assert statements, f"{name} ran no statements"
+    for sql in statements:
+        scans = full_scans(db_conn, sql)
+        if scans and not is_allowed_full_scan(sql):
+            pytest.fail(f"{name}: {sql!r} does a full scan: {scans}")
+
+
+def test_schema_version_is_current(db_conn):
+    assert db.get_schema_version(db_conn) == len(db.SCHEMA_MIGRATIONS)
+    assert db.migrate_schema(db_conn) == len(db.SCHEMA_MIGRATIONS)
@@ -0,0 +1,74 @@
+import pandas as pd
+import pytest
+
+from baby_tracker import analyze as an
+from baby_tracker import render
+
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+def daily_df():
+    index = pd.date_range("2024-01-24 06:00", periods=5, freq="D", name="from_time")
+    return pd.DataFrame({"duration": [3600, 5400, 0, 7200, 1800]}, index=index)
+
+
+def timeline_df():
+    from_time = pd.to_datetime(["2024-01-24 07:00", "2024-01-24 09:00", "2024-01-25 01:00"])
+    duration = pd.Series([1800, 3600, 900])
+    return pd.DataFrame({
+        "from_time": from_time,
+        "to_time": from_time + pd.to_timedelta(duration, unit="s"),
+        "duration": duration,
+        "activity": ["feed", "sleep", "feed"],
+    })
+
+
+def test_render_inline(monkeypatch):
+    monkeypatch.setattr(render, "RENDER_WORKERS", 0)
+    png = render.render(an.duration_plot, daily_df(), title="Total", scale=1/3600)
+    assert png.startswith(PNG_SIGNATURE)
+
+
+def test_render_in_worker_processes(monkeypatch):
+    monkeypatch.setattr(render, "RENDER_WORKERS", 2)
+    try:
+        render.warm_up()
+        executor = render.get_executor()
+        futures = [
+            executor.submit(render._render, an.duration_plot, (daily_df(),), {"title": "Total"}),
+            executor.submit(render._render, an.timeline_plot, (timeline_df(),), {}),
+        ]
+        for future in futures:
+            assert future.result().startswith(PNG_SIGNATURE)
+        assert render.render(an.duration_plot, daily_df()).startswith(PNG_SIGNATURE)
+    finally:
+        render.shutdown()
+
+
+def test_plots_do_not_use_pyplot_figures():
+    import matplotlib.pyplot as plt
+    n_figures = len(plt.get_fignums())
+    an.duration_plot(daily_df())
+    an.timeline_plot(timeline_df())
+    assert len(plt.get_fignums()) == n_figures
+
+
+def test_timeline_plot_labels_only_the_longest_segments(monkeypatch):
+    figures = []
+    monkeypatch.setattr(an, "plot_to_buffer", figures.append)
+    n = 1000
+    from_time = pd.Series(pd.date_range("2024-01-24 06:00", periods=n, freq="40min"))
+    duration = pd.Series(range(60, 60 * (n + 1), 60))
+    df = pd.DataFrame({
+        "from_time": from_time,
+        "to_time": from_time + pd.to_timedelta(duration, unit="s"),
+        "duration": duration,
+        "activity": ["feed", "sleep"] * (n // 2),
+    })
+    an.timeline_plot(df, max_labels=10)
+    ax = figures[0].axes[0]
+    labels = [text.get_text() for text in ax.texts]
+    assert len(labels) == 10
+    assert labels[0] == "16:40"
+    assert len(ax.collections[0].get_paths()) == n
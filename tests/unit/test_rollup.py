@@ -0,0 +1,89 @@
+import pytest
+from datetime import datetime, timedelta
+
+from baby_tracker import db
+from baby_tracker import rollup
+from baby_tracker import analyze as an
+
+
+def make_record(from_time, minutes):
+    duration = timedelta(minutes=minutes) if minutes is not None else None
+    to_time = from_time + duration if duration is not None else None
+    return (from_time, to_time, duration)
+
+
+def create_records(db_conn, table="sleep"):
+    ids = [
+        db._create_duration_record(db_conn, make_record(datetime(2024, 1, 24, 7, 0), 30), table),
+        db._create_duration_record(db_conn, make_record(datetime(2024, 1, 25, 5, 30), 20), table),
+        db._create_duration_record(db_conn, make_record(datetime(2024, 1, 27, 12, 0), 45), table),
+        db._create_duration_record(db_conn, make_record(datetime(2024, 1, 27, 13, 0), None), table),
+    ]
+    return ids
+
+
+def test_rollup_day_starts_at_six():
+    assert rollup.rollup_day(datetime(2024, 1, 25, 5, 59)) == "2024-01-24"
+    assert rollup.rollup_day(datetime(2024, 1, 25, 6, 0)) == "2024-01-25"
+
+
+def test_create_records_updates_rollup(db_conn):
+    create_records(db_conn)
+    rows = rollup.read_rollup(db_conn, "sleep")
+    assert [(day.isoformat(), duration, n, n_dur) for day, duration, n, n_dur in rows] == [
+        ("2024-01-24", 3000, 2, 2),
+        ("2024-01-27", 2700, 2, 1),
+    ]
+    assert rollup.read_rollup(db_conn, "feed") == []
+
+
+def test_update_and_delete_keep_rollup_consistent(db_conn):
+    ids = create_records(db_conn)
+    db.update_sleep(db_conn, ids[3], make_record(datetime(2024, 1, 28, 8, 0), 15))
+    db.delete_sleep(db_conn, ids[2])
+    db.delete_sleep(db_conn, str(ids[0]))
+    assert rollup.check_consistency(db_conn, "sleep") == []
+    days = [row[0].isoformat() for row in rollup.read_rollup(db_conn, "sleep")]
+    assert days == ["2024-01-24", "2024-01-28"]
+
+
+@pytest.mark.parametrize("table", rollup.DURATION_TABLES)
+def test_rollup_matches_pandas_path(db_conn, table):
+    create_records(db_conn, table)
+    assert rollup.check_consistency(db_conn, table) == []
+    counts = an.count_per_day(db_conn, table)
+    assert list(counts) == [2, 0, 0, 2]
+
+
+def test_latest_daily_total_duration(db_conn):
+    create_records(db_conn)
+    last_date, last_duration = an.latest_daily_total_duration(db_conn, "sleep")
+    assert last_date == datetime(2024, 1, 27, 6, 0)
+    assert last_duration == timedelta(minutes=45)
+
+
+def test_init_db_rebuilds_missing_rollup(tmp_path):
+    db_file = str(tmp_path / "db.sqlite")
+    conn = db.init_db(db_file=db_file)
+    create_records(conn)
+    conn.execute(f"DROP TABLE {rollup.ROLLUP_TABLE}")
+    conn.commit()
+    conn.close()
+
+    conn = db.init_db(db_file=db_file)
+    assert len(rollup.read_rollup(conn, "sleep")) == 2
+    assert rollup.check_consistency(conn, "sleep") == []
+    conn.close()
+
+
+def test_rebuild_command(tmp_path, capsys):
+    db_file = str(tmp_path / "db.sqlite")
+    conn = db.init_db(db_file=db_file)
+    create_records(conn)
+    conn.execute(f"DELETE FROM {rollup.ROLLUP_TABLE}")
+    conn.commit()
+    conn.close()
+
+    assert rollup.main(["check", "--db-file", db_file]) == 1
+    assert rollup.main(["rebuild", "--db-file", db_file]) == 0
+    assert rollup.main(["check", "--db-file", db_file]) == 0
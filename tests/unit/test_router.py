@@ -0,0 +1,77 @@
+import pytest
+
+from baby_tracker import db
+from baby_tracker import timeparse
+from baby_tracker.router import listing
+from baby_tracker.router import registry
+from baby_tracker.router import poop, weight
+from baby_tracker.feed import endpoints as feed
+from baby_tracker.sleep import endpoints as sleep
+
+
+def test_aliases_resolve_to_one_command():
+    for word in ("d", "del", "delete"):
+        route = feed.router.resolve([word, "71"])
+        assert route.name == "delete"
+        assert route.handler is feed.handle_delete_feed
+        assert route.kwargs == {"record_id": "71"}
+
+
+def test_help_and_list_count():
+    assert feed.router.resolve(None).name == "help"
+    assert feed.router.resolve(["help"]).name == "help"
+    assert feed.router.resolve(["ls"]).kwargs == {"n": listing.DEFAULT_N_LIST}
+    assert feed.router.resolve(["ls", "10"]).kwargs == {"n": 10}
+
+
+def test_analyze_subcommands():
+    route = feed.router.resolve(["analyze", "tot", "14"])
+    assert route.name == "analyze"
+    sub_route = feed.analyze_router.resolve(["analyze", "tot", "14"])
+    assert sub_route.handler is feed.analyze_feed_total
+    assert sub_route.kwargs == {"n_days": 14}
+    with pytest.raises(ValueError, match="Not valid args"):
+        feed.analyze_router.resolve(["analyze", "nonsense"])
+    # Without a subcommand the analyses are listed.
+    for analyze_router in (feed.analyze_router, sleep.analyze_router):
+        assert analyze_router.resolve(["analyze"]).name == "help"
+        assert "tot|avg|cnt [days]" in analyze_router.handle(["analyze"], None)["text"]
+    assert feed.router.command_path(["analyze"]) == ("analyze", "help")
+
+
+def test_create_parses_the_timestamp_once(monkeypatch):
+    calls = []
+    parse = timeparse.parse
+    monkeypatch.setattr(timeparse, "parse", lambda text, *args: calls.append(text) or parse(text, *args))
+    conn = db.init_db(db_file=":memory:")
+    resp = poop.handle_poop_request(["2021-05-18"], conn)
+    assert "poop record created" in resp["text"]
+    assert calls == ["2021-05-18"]
+    assert db.get_latest_poop_records(conn, 1)[0][1].date().isoformat() == "2021-05-18"
+    conn.close()
+
+
+def test_invalid_args():
+    with pytest.raises(ValueError, match="Not valid args"):
+        poop.router.resolve(["nonsense"])
+    with pytest.raises(ValueError, match="Missing the record id"):
+        poop.router.resolve(["d"])
+    with pytest.raises(ValueError, match="not recognized"):
+        registry.get_router("diaper")
+
+
+def test_duplicate_commands_are_rejected():
+    router = registry.Router("test", "Help")
+    router.command("list", "ls")(lambda args, db_conn: None)
+    with pytest.raises(ValueError, match="already a command"):
+        router.command("ls")(lambda args, db_conn: None)
+    with pytest.raises(ValueError, match="already registered"):
+        registry.register(registry.Router("poop"))
+
+
+def test_command_names():
+    assert registry.command_name(None) == "help"
+    assert registry.command_name(["ls", "5"]) == "list"
+    assert registry.command_name(["e"]) == "end"
+    assert registry.command_name(["z"]) == "z"
+    assert registry.command_name(["12:30"]) == "create"
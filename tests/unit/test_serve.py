@@ -16,3 +16,95 @@ def test_handle_feed_request_no_end_time():
     resp = endpoints.handle_feed_request(args, db_conn)
     print(resp)
     db_conn.close()
+
+
+def test_create_returns_connection_to_pool():
+    from baby_tracker import serve
+    pool = db.ConnectionPool(":memory:")
+    serve.app.extensions["db_pool"] = pool
+    client = serve.app.test_client()
+    resp = client.post("/babytracker/poop", data={"text": "2021-05-18"})
+    assert resp.status_code == 200
+    assert "error" not in resp.get_json()["text"]
+    stats = client.get("/babytracker/pool").get_json()
+    assert stats["in_use"] == 0
+    assert stats["acquired"] == 1
+    serve.app.extensions.pop("db_pool")
+    pool.close()
+
+
+def test_analyze_is_acknowledged_and_answered_through_response_url(monkeypatch):
+    from baby_tracker import serve, slack, jobs
+    posted = []
+    monkeypatch.setattr(slack, "post_response", lambda url, resp: posted.append((url, resp)))
+    pool = db.ConnectionPool(":memory:")
+    job_queue = jobs.JobQueue(max_workers=1)
+    serve.app.extensions["db_pool"] = pool
+    serve.app.extensions["job_queue"] = job_queue
+    client = serve.app.test_client()
+    form = {"text": "analyze nonsense", "response_url": "https://hooks.example/1", "channel_id": "C1"}
+    resp = client.post("/babytracker/sleep", data=form)
+    assert resp.get_json()["response_type"] == "ephemeral"
+    assert "Working on it" in resp.get_json()["text"]
+    job_queue.shutdown()
+    assert len(posted) == 1
+    url, delayed_resp = posted[0]
+    assert url == "https://hooks.example/1"
+    assert "Failed with error" in delayed_resp["text"]
+    assert pool.stats()["in_use"] == 0
+    serve.app.extensions.pop("db_pool")
+    serve.app.extensions.pop("job_queue")
+    pool.close()
+
+
+def test_deferred_failures_and_duplicates_are_followed_up(monkeypatch):
+    import threading
+    from baby_tracker import serve, slack, jobs
+    posted, release = [], threading.Event()
+    monkeypatch.setattr(slack, "post_response", lambda url, resp: posted.append((url, resp)))
+    monkeypatch.setattr(serve, "handle_action", lambda action, args, db_conn: release.wait() and slack.response("Done"))
+    pool = db.ConnectionPool(":memory:")
+    job_queue = jobs.JobQueue(max_workers=1)
+    serve.app.extensions["db_pool"] = pool
+    serve.app.extensions["job_queue"] = job_queue
+    client = serve.app.test_client()
+    try:
+        for i in (1, 2):
+            form = {"text": "analyze tl", "response_url": f"https://hooks.example/{i}", "channel_id": "C1"}
+            resp = client.post("/babytracker/sleep", data=form)
+        assert resp.get_json() is None
+        release.set()
+        job_queue.shutdown()
+        # A command failing outside of its handler is followed up with the error.
+        monkeypatch.setattr(pool, "acquire", lambda: 1 / 0)
+        job_queue = serve.app.extensions["job_queue"] = jobs.JobQueue(max_workers=1)
+        client.post("/babytracker/sleep", data={"text": "analyze tot", "response_url": "https://hooks.example/3", "channel_id": "C1"})
+        job_queue.shutdown()
+        answers = {url: resp["text"] for url, resp in posted}
+        assert answers["https://hooks.example/1"] == "Done"
+        assert "already being rendered" in answers["https://hooks.example/2"]
+        assert "ZeroDivisionError" in answers["https://hooks.example/3"]
+    finally:
+        serve.app.extensions.pop("db_pool")
+        serve.app.extensions.pop("job_queue")
+        pool.close()
+
+
+def test_batch_api():
+    from baby_tracker import serve
+    pool = db.ConnectionPool(":memory:")
+    serve.app.extensions["db_pool"] = pool
+    client = serve.app.test_client()
+    try:
+        records = ["01:10-01:40", {"from_time": "2024-02-10 04:15", "to_time": "2024-02-10 04:35"}, {"to_time": "05:00"}]
+        resp = client.post("/babytracker/feed/batch", json={"records": records})
+        assert resp.status_code == 200
+        result = resp.get_json()
+        assert result["created"] == [1, 2]
+        assert [error["index"] for error in result["errors"]] == [2]
+        assert "Total duration" in result["text"]
+        assert client.post("/babytracker/feed/batch", json=records).status_code == 400
+        assert client.post("/babytracker/poop/batch", json={"records": records}).status_code == 404
+    finally:
+        serve.app.extensions.pop("db_pool")
+        pool.close()
@@ -1,3 +1,9 @@
+import io
+import socket
+
+import pytest
+import requests
+
 from baby_tracker import slack
 
 
@@ -8,4 +14,114 @@ def test_table():
 
     ]
     table_str = slack.table(rows, ["Name", "Numeric value", "Other numeric value"])
-    print(table_str)
\ No newline at end of file
+    print(table_str)
+
+
+@pytest.fixture
+def client(stub):
+    _client = slack.SlackClient(api_url=stub.url, backoff=0.01)
+    yield _client
+    _client.close()
+
+
+def test_uploads_share_a_connection(stub, client):
+    for _ in range(3):
+        client.post_file("plot.png", io.BytesIO(b"png"), oauth_token="xoxb", channel_id="C1")
+    assert stub.counts == {"/files.upload": 3}
+    assert len(stub.connections) == 1
+
+
+def test_retries_honour_retry_after(stub, client, monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(slack.time, "sleep", sleeps.append)
+    stub.respond_next(429, {"Retry-After": "2"})
+    stub.respond_next(429)
+    resp = client.post_file("plot.png", b"png", oauth_token="xoxb", channel_id="C1")
+    assert resp.json() == {"ok": True}
+    assert sleeps == [2.0, 0.02]
+    assert stub.counts == {"/files.upload": 3}
+
+
+def test_gives_up_after_max_retries(stub):
+    client = slack.SlackClient(api_url=stub.url, max_retries=1, backoff=0.01)
+    for _ in range(3):
+        stub.respond_next(429)
+    with pytest.raises(requests.HTTPError):
+        client.post_file("plot.png", b"png", oauth_token="xoxb", channel_id="C1")
+    client.close()
+    assert stub.counts == {"/files.upload": 2}
+
+
+def test_server_errors_are_only_retried_when_idempotent(stub, client):
+    stub.respond_next(500)
+    with pytest.raises(requests.HTTPError):
+        client.post_file("plot.png", b"png", oauth_token="xoxb", channel_id="C1")
+    # Slack may have posted the file before the error, so it is not uploaded twice.
+    assert stub.counts == {"/files.upload": 1}
+    stub.respond_next(500)
+    assert client.request("POST", f"{stub.url}/chat.update", idempotent=True).status_code == 200
+    assert stub.counts["/chat.update"] == 2
+
+
+def test_slack_errors_are_raised(stub, client):
+    stub.respond_next(200, body={"ok": False, "error": "not_authed"})
+    with pytest.raises(slack.SlackError, match="not_authed"):
+        client.post_file("plot.png", b"png", oauth_token="", channel_id="C1")
+
+
+def test_read_timeout_is_not_retried(stub):
+    stub.latency = 0.3
+    client = slack.SlackClient(api_url=stub.url, read_timeout=0.05, backoff=0.01)
+    with pytest.raises(requests.ReadTimeout):
+        client.post_file("plot.png", b"png", oauth_token="xoxb", channel_id="C1")
+    client.close()
+    assert stub.counts == {"/files.upload": 1}
+
+
+def test_refused_connections_are_retried(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(slack.time, "sleep", sleeps.append)
+    with socket.socket() as unused:
+        unused.bind(("127.0.0.1", 0))
+        port = unused.getsockname()[1]
+    client = slack.SlackClient(api_url=f"http://127.0.0.1:{port}", max_retries=2, backoff=0.01)
+    with pytest.raises(requests.ConnectionError):
+        client.post_file("plot.png", b"png", oauth_token="xoxb", channel_id="C1")
+    client.close()
+    assert sleeps == [0.01, 0.02]
+
+
+def test_dropped_connections_are_not_retried(client, monkeypatch):
+    calls = []
+
+    def drop(*args, **kwargs):
+        calls.append(args)
+        raise requests.ConnectionError(ConnectionResetError("Connection reset by peer"))
+    monkeypatch.setattr(client.session, "request", drop)
+    with pytest.raises(requests.ConnectionError):
+        client.post_file("plot.png", b"png", oauth_token="xoxb", channel_id="C1")
+    assert len(calls) == 1
+
+
+def test_shutdown_can_leave_uploads_queued(monkeypatch):
+    closed = []
+    client = slack.SlackClient()
+    monkeypatch.setattr(client, "close", lambda wait=True: closed.append(wait))
+    slack.set_client(client)
+    slack.shutdown(wait=False)
+    assert closed == [False]
+
+
+def test_queued_uploads(stub):
+    client = slack.SlackClient(api_url=stub.url, backoff=0.01)
+    stub.respond_next(200, body={"ok": False, "error": "invalid_auth"})
+    for i in range(3):
+        client.submit_file(f"plot{i}.png", io.BytesIO(b"png"), oauth_token="xoxb", channel_id="C1")
+    client.close(wait=True)
+    assert stub.counts == {"/files.upload": 3}
+    assert client.uploads.stats()["failed"] == 1
+
+
+def test_acknowledgement_counts_the_jobs_ahead():
+    assert slack.acknowledgement(0)["text"] == ":hourglass_flowing_sand: Working on it."
+    assert "2 job(s) ahead in the queue." in slack.acknowledgement(2)["text"]
@@ -0,0 +1,111 @@
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+pa = pytest.importorskip("pyarrow")
+
+from baby_tracker import analyze
+from baby_tracker import db
+from baby_tracker import snapshot
+
+
+START = datetime(2024, 1, 30, 6, 0)
+
+
+@pytest.fixture
+def db_conn(db_conn):
+    # Every other day from January to March.
+    db.create_sleeps(db_conn, [
+        (START + timedelta(days=2 * i), START + timedelta(days=2 * i, minutes=40), timedelta(minutes=40)) for i in range(20)
+    ])
+    db.create_weight(db_conn, (START, 4000))
+    return db_conn
+
+
+def test_tables_are_partitioned_by_month(db_conn, tmp_path):
+    written = snapshot.snapshot(db_conn, str(tmp_path))
+    assert written == {"feed": [], "sleep": ["2024-01", "2024-02", "2024-03"], "weight": ["2024-01"], "poop": []}
+    assert sorted(os.listdir(tmp_path / "sleep")) == ["_manifest.json", "month=2024-01", "month=2024-02", "month=2024-03"]
+    february = pa.parquet.read_table(snapshot.partition_path(str(tmp_path), "sleep", "2024-02", "parquet"))
+    assert february.num_rows == 15
+    assert february.schema.field("from_time").type == pa.timestamp("us")
+    assert february.schema.field("duration").type == pa.duration("s")
+    assert february["from_time"][0].as_py() == datetime(2024, 2, 1, 6, 0)
+    assert february["duration"][0].as_py() == timedelta(minutes=40)
+
+
+def test_only_changed_months_are_rewritten(db_conn, tmp_path):
+    snapshot.snapshot_table(db_conn, str(tmp_path), "sleep")
+    assert snapshot.snapshot_table(db_conn, str(tmp_path), "sleep") == []
+    assert snapshot.is_current(db_conn, str(tmp_path), "sleep")
+
+    db.create_sleep(db_conn, (datetime(2024, 4, 2, 6, 0), None, None))
+    assert not snapshot.is_current(db_conn, str(tmp_path), "sleep")
+    assert snapshot.snapshot_table(db_conn, str(tmp_path), "sleep") == ["2024-04"]
+
+    db.delete_sleep(db_conn, 2)
+    assert snapshot.snapshot_table(db_conn, str(tmp_path), "sleep") == ["2024-02"]
+    assert snapshot.read_snapshot(str(tmp_path), "sleep").num_rows == 20
+
+
+def test_months_without_records_are_removed(db_conn, tmp_path):
+    snapshot.snapshot_table(db_conn, str(tmp_path), "weight", format="arrow")
+    db.delete_weight_record(db_conn, 1)
+    assert snapshot.snapshot_table(db_conn, str(tmp_path), "weight", format="arrow") == []
+    assert os.listdir(tmp_path / "weight") == ["_manifest.json"]
+    assert snapshot.read_snapshot(str(tmp_path), "weight").num_rows == 0
+
+
+def round_timestamps(column):
+    return column.dt.round("us") if column.name in analyze.TIMESTAMP_COLUMNS else column
+
+
+@pytest.mark.parametrize("format", list(snapshot.FORMATS))
+def test_loader_matches_the_database(db_conn, tmp_path, format):
+    snapshot.snapshot(db_conn, str(tmp_path), format=format)
+    from_time, until = datetime(2024, 2, 10, 6, 0), datetime(2024, 3, 4, 6, 0)
+    for kwargs in [{}, {"columns": ["from_time", "duration"], "from_time": from_time, "until": until}]:
+        # The database loader goes through float microseconds, the snapshot keeps them exact.
+        expected = analyze.df_from_db_table(db_conn, "sleep", **kwargs).apply(round_timestamps)
+        actual = analyze.df_from_snapshot(str(tmp_path), "sleep", **kwargs)
+        assert actual.dtypes.to_dict() == expected.dtypes.to_dict()
+        assert actual.equals(expected)
+    assert analyze.df_from_snapshot(str(tmp_path), "weight").equals(analyze.df_from_db_table(db_conn, "weight").apply(round_timestamps))
+
+
+def test_df_from_db_table_uses_a_current_snapshot(db_conn, tmp_path):
+    snapshot.snapshot(db_conn, str(tmp_path), format="arrow")
+    df = analyze.df_from_db_table(db_conn, "sleep", columns=["from_time"], from_time=datetime(2024, 3, 1), snapshot_dir=str(tmp_path))
+    assert list(df.index) == [17, 18, 19, 20]
+    # Changes not in the snapshot yet are read from the database.
+    db.create_sleep(db_conn, (datetime(2024, 3, 30, 6, 0), None, None))
+    df = analyze.df_from_db_table(db_conn, "sleep", columns=["from_time"], from_time=datetime(2024, 3, 1), snapshot_dir=str(tmp_path))
+    assert list(df.index) == [17, 18, 19, 20, 21]
+
+
+def test_unchanged_months_are_read_from_the_snapshot(db_conn, tmp_path, monkeypatch):
+    snapshot.snapshot(db_conn, str(tmp_path))
+    db.create_sleep(db_conn, (datetime(2024, 2, 20, 7, 0), None, None))
+    snapshot_months = []
+    read_snapshot = snapshot.read_snapshot
+    monkeypatch.setattr(snapshot, "read_snapshot", lambda *args: snapshot_months.append(args[-1]) or read_snapshot(*args))
+    for kwargs in [{}, {"columns": ["from_time", "duration"], "from_time": datetime(2024, 1, 31), "until": datetime(2024, 3, 5)}]:
+        snapshot_months.clear()
+        expected = analyze.df_from_db_table(db_conn, "sleep", **kwargs).apply(round_timestamps)
+        actual = analyze.df_from_db_table(db_conn, "sleep", snapshot_dir=str(tmp_path), **kwargs).apply(round_timestamps)
+        # Only February changed since the snapshot.
+        assert snapshot_months == [["2024-01"], ["2024-03"]]
+        assert actual.sort_index().equals(expected.sort_index())
+
+
+def test_cli(tmp_path, capsys):
+    db_file = str(tmp_path / "db.sqlite")
+    conn = db.init_db(db_file=db_file)
+    db.create_weight(conn, (START, 4000))
+    conn.close()
+    assert snapshot.main(["--db-file", db_file, "--dir", str(tmp_path / "snapshots"), "--format", "arrow", "weight"]) == 0
+    assert "weight: 1 months written 2024-01" in capsys.readouterr().out
+    assert snapshot.read_manifest(str(tmp_path / "snapshots"), "weight")["format"] == "arrow"
+    with pytest.raises(SystemExit):
+        snapshot.main(["--db-file", db_file, "diaper"])
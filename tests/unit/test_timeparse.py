@@ -0,0 +1,72 @@
+import pytest
+from datetime import datetime, timedelta
+
+from baby_tracker import timeparse
+
+
+NOW = datetime(2024, 3, 2, 14, 20, 11, 500)
+
+
+@pytest.mark.parametrize("text,expected", [
+    ("12:30", datetime(2024, 3, 2, 12, 30)),
+    ("8:05", datetime(2024, 3, 2, 8, 5)),
+    ("1230", datetime(2024, 3, 2, 12, 30)),
+    ("12.30", datetime(2024, 3, 2, 12, 30)),
+    ("2021-05-18", datetime(2021, 5, 18)),
+    ("2021-05-18 12:30", datetime(2021, 5, 18, 12, 30)),
+    ("now", NOW),
+    ("Now", NOW),
+    ("-15m", NOW - timedelta(minutes=15)),
+    ("-2h", NOW - timedelta(hours=2)),
+])
+def test_fast_path_formats(text, expected, monkeypatch):
+    monkeypatch.setattr(timeparse, "_parse_fallback", lambda *args: pytest.fail("used the fallback"))
+    assert timeparse.parse(text, now=NOW) == expected
+
+
+def test_parse_range():
+    assert timeparse.parse_range("01:10-02:40", now=NOW) == (datetime(2024, 3, 2, 1, 10), datetime(2024, 3, 2, 2, 40))
+    assert timeparse.parse_range("23:10-01:40", now=NOW) == (datetime(2024, 3, 1, 23, 10), datetime(2024, 3, 2, 1, 40))
+    assert timeparse.parse_range("2021-05-18", now=NOW) is None
+    assert timeparse.parse_range("-15m", now=NOW) is None
+    assert timeparse.parse_range("12:30", now=NOW) is None
+
+
+@pytest.mark.parametrize("text", ["12:30", "12.30", "2021-05-18", "2021-05-18 12:30"])
+def test_fast_path_agrees_with_dateparser(text):
+    import dateparser as dp
+    assert timeparse.parse(text) == dp.parse(text)
+
+
+def test_falls_back_to_dateparser():
+    assert timeparse.parse("yesterday").date() == (datetime.now() - timedelta(days=1)).date()
+
+
+def test_not_a_timestamp():
+    assert timeparse.parse("analyze") is None
+    assert not timeparse.is_timestamp("analyze")
+
+
+def test_datetime_passes_through():
+    assert timeparse.parse(NOW) is NOW
+
+
+def test_results_are_cached():
+    timeparse._match_fast.cache_clear()
+    timeparse.parse("07:45", now=NOW)
+    timeparse.parse("07:45", now=NOW + timedelta(days=1))
+    assert timeparse.cache_info()["fast"].hits == 1
+
+
+def test_dispatch_parses_the_timestamp_once(monkeypatch):
+    from baby_tracker import db
+    from baby_tracker.router import poop
+
+    calls = []
+    parse = timeparse.parse
+    monkeypatch.setattr(timeparse, "parse", lambda text, now=None: calls.append(text) or parse(text, now))
+    db_conn = db.init_db(db_file=":memory:")
+    poop.handle_poop_request(["2021-05-18"], db_conn)
+    assert calls == ["2021-05-18"]
+    assert db.get_latest_poop_records(db_conn, 1)[0][1] == datetime(2021, 5, 18)
+    db_conn.close()